@@ -0,0 +1,1016 @@
+"""
+Almacén en memoria con la interfaz del cliente y del recurso de DynamoDB de boto3
+que usan las funciones Lambda, para ejecutarlas en local (servidor_local.py) sin red.
+
+Implementa lo que usan los handlers: get_item, put_item, update_item, delete_item,
+query y scan (con Limit, ExclusiveStartKey, Segment/TotalSegments, ProjectionExpression
+y FilterExpression), batch_get_item, batch_write_item y transact_write_items, con sus
+expresiones de condición, de clave, de proyección y de actualización. Las consultas a
+un índice devuelven solo los atributos que este proyecta. tests/test_almacen_local.py
+comprueba que las páginas, los contadores y los errores coinciden con los de moto.
+
+El recurso trabaja con tipos de Python (los números como Decimal) y el cliente con el
+formato de cable ({'S': ...}, {'N': ...}), igual que boto3. Todas las operaciones se
+hacen bajo un mismo lock, así que también son atómicas entre hilos.
+
+`consumo` acumula los items leídos y escritos y la capacidad que DynamoDB cobraría por
+ellos (RCU y WCU en modo bajo demanda), para los benchmarks. Cada llamada emite los
+eventos provide-client-params y after-call de botocore en `meta.events` y, con
+ReturnConsumedCapacity, devuelve ConsumedCapacity como DynamoDB.
+"""
+import re
+import bisect
+import hashlib
+import itertools
+import threading
+import functools
+from decimal import Decimal
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+
+
+def _excepcion(codigo):
+    return type(codigo, (ClientError,), {})
+
+
+EXCEPCIONES = SimpleNamespace(**{codigo: _excepcion(codigo) for codigo in (
+    'ConditionalCheckFailedException',
+    'TransactionCanceledException',
+    'ResourceNotFoundException',
+    'ValidationException',
+)})
+
+
+def error(codigo, mensaje, operacion, **extra):
+    respuesta = {'Error': {'Code': codigo, 'Message': mensaje}, **extra}
+    return getattr(EXCEPCIONES, codigo)(respuesta, operacion)
+
+
+# 📌 Valores
+
+def normalizar(valor):
+    """Valor de Python tal y como lo guarda DynamoDB: números como Decimal, contenedores copiados."""
+    if isinstance(valor, bool) or valor is None or isinstance(valor, (str, Decimal)):
+        return valor
+    if isinstance(valor, (int, float)):
+        return Decimal(str(valor))
+    if isinstance(valor, dict):
+        return {nombre: normalizar(v) for nombre, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [normalizar(v) for v in valor]
+    if isinstance(valor, (set, frozenset)):
+        return {normalizar(v) for v in valor}
+    return valor
+
+
+def copiar(valor):
+    """Copia de un item para que quien lo lee no modifique el almacén."""
+    if isinstance(valor, dict):
+        return {nombre: copiar(v) for nombre, v in valor.items()}
+    if isinstance(valor, list):
+        return [copiar(v) for v in valor]
+    if isinstance(valor, set):
+        return set(valor)
+    return valor
+
+
+def tipo(valor):
+    """Tipo de DynamoDB de un valor, para comparar solo valores del mismo tipo."""
+    if isinstance(valor, bool):
+        return 'BOOL'
+    if isinstance(valor, Decimal):
+        return 'N'
+    if isinstance(valor, str):
+        return 'S'
+    if isinstance(valor, (bytes, bytearray)):
+        return 'B'
+    if isinstance(valor, dict):
+        return 'M'
+    if isinstance(valor, list):
+        return 'L'
+    if isinstance(valor, set):
+        return 'SS' if all(isinstance(v, str) for v in valor) else 'NS'
+    return 'NULL'
+
+
+def tamano(valor):
+    """Tamaño aproximado en bytes de un valor, con las reglas con que DynamoDB calcula la capacidad."""
+    if isinstance(valor, str):
+        return len(valor.encode('utf-8'))
+    if isinstance(valor, Decimal):
+        return len(valor.as_tuple().digits) // 2 + 2
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, dict):
+        return 3 + sum(len(nombre.encode('utf-8')) + tamano(v) + 1 for nombre, v in valor.items())
+    if isinstance(valor, (list, set)):
+        return 3 + sum(tamano(v) + 1 for v in valor)
+    return 1
+
+
+def tamano_item(item):
+    return sum(len(nombre.encode('utf-8')) + tamano(valor) for nombre, valor in item.items())
+
+
+MAXIMO_BYTES_ITEM = 400 * 1024
+
+
+def comprobar_tamano(item, operacion):
+    """DynamoDB rechaza con ValidationException los items de más de 400 KB."""
+    if tamano_item(item) > MAXIMO_BYTES_ITEM:
+        raise error('ValidationException', "Item size has exceeded the maximum allowed size", operacion)
+
+
+def unidades(bytes_, bloque):
+    """Unidades de capacidad: una por bloque empezado (4 KB las lecturas, 1 KB las escrituras)."""
+    return max(1, -(-bytes_ // bloque))
+
+
+# 📌 Expresiones
+
+TOKEN = re.compile(r'\s*(?:(<>|<=|>=|[=<>(),.\[\]+-])|(:[\w-]+)|(#[\w-]+)|(\d+)|([A-Za-z_][\w-]*))')
+
+
+def tokens(expresion):
+    resultado = []
+    posicion = 0
+    expresion = expresion.strip()
+    while posicion < len(expresion):
+        encontrado = TOKEN.match(expresion, posicion)
+        if not encontrado or encontrado.end() == posicion:
+            raise ValueError(f"Expresión no válida: {expresion!r}")
+        simbolo, valor, nombre, numero, palabra = encontrado.groups()
+        if simbolo:
+            resultado.append(('simbolo', simbolo))
+        elif valor:
+            resultado.append(('valor', valor))
+        elif nombre:
+            resultado.append(('nombre', nombre))
+        elif numero:
+            resultado.append(('numero', int(numero)))
+        else:
+            resultado.append(('palabra', palabra))
+        posicion = encontrado.end()
+    return resultado
+
+
+class Parser:
+    """Analizador descendente de las expresiones de DynamoDB; produce tuplas que evalúa Contexto."""
+
+    def __init__(self, expresion):
+        self.tokens = tokens(expresion)
+        self.posicion = 0
+
+    def ver(self, desplazamiento=0):
+        indice = self.posicion + desplazamiento
+        return self.tokens[indice] if indice < len(self.tokens) else (None, None)
+
+    def es(self, valor, desplazamiento=0):
+        tipo_token, texto = self.ver(desplazamiento)
+        if tipo_token == 'palabra':
+            return texto.upper() == valor
+        return texto == valor
+
+    def tomar(self, valor=None):
+        token = self.ver()
+        if token[0] is None or (valor is not None and not self.es(valor)):
+            raise ValueError(f"Se esperaba {valor or 'más expresión'} y se encontró {token[1]!r}")
+        self.posicion += 1
+        return token
+
+    def fin(self):
+        if self.ver()[0] is not None:
+            raise ValueError(f"Sobra {self.ver()[1]!r} en la expresión")
+
+    # Rutas y operandos
+    def ruta(self):
+        tipo_token, texto = self.tomar()
+        if tipo_token not in ('nombre', 'palabra'):
+            raise ValueError(f"Se esperaba un atributo y se encontró {texto!r}")
+        partes = [texto]
+        while self.es('.') or self.es('['):
+            if self.tomar()[1] == '.':
+                partes.append(self.tomar()[1])
+            else:
+                partes.append(self.tomar()[1])
+                self.tomar(']')
+        return ('ruta', tuple(partes))
+
+    def operando(self):
+        tipo_token, texto = self.ver()
+        if tipo_token == 'valor':
+            self.tomar()
+            return ('valor', texto)
+        if tipo_token == 'palabra' and self.es('(', 1):
+            funcion = texto.lower()
+            self.tomar()
+            self.tomar('(')
+            argumentos = [self.operando()]
+            while self.es(','):
+                self.tomar(',')
+                argumentos.append(self.operando())
+            self.tomar(')')
+            return ('funcion', funcion, tuple(argumentos))
+        return self.ruta()
+
+    # Condiciones
+    def condicion(self):
+        resultado = self.conjuncion()
+        while self.es('OR'):
+            self.tomar()
+            resultado = ('or', resultado, self.conjuncion())
+        return resultado
+
+    def conjuncion(self):
+        resultado = self.negacion()
+        while self.es('AND'):
+            self.tomar()
+            resultado = ('and', resultado, self.negacion())
+        return resultado
+
+    def negacion(self):
+        if self.es('NOT'):
+            self.tomar()
+            return ('not', self.negacion())
+        return self.comparacion()
+
+    def comparacion(self):
+        if self.es('('):
+            self.tomar('(')
+            resultado = self.condicion()
+            self.tomar(')')
+            return resultado
+        izquierda = self.operando()
+        if izquierda[0] == 'funcion' and izquierda[1] != 'size':
+            return izquierda
+        if self.es('BETWEEN'):
+            self.tomar()
+            desde = self.operando()
+            self.tomar('AND')
+            return ('between', izquierda, desde, self.operando())
+        if self.es('IN'):
+            self.tomar()
+            self.tomar('(')
+            opciones = [self.operando()]
+            while self.es(','):
+                self.tomar(',')
+                opciones.append(self.operando())
+            self.tomar(')')
+            return ('in', izquierda, tuple(opciones))
+        operador = self.tomar()[1]
+        if operador not in ('=', '<>', '<', '<=', '>', '>='):
+            raise ValueError(f"Operador no válido: {operador!r}")
+        return ('comparar', operador, izquierda, self.operando())
+
+    # Proyecciones
+    def proyeccion(self):
+        rutas = [self.ruta()]
+        while self.es(','):
+            self.tomar(',')
+            rutas.append(self.ruta())
+        self.fin()
+        return tuple(rutas)
+
+    # Actualizaciones
+    def actualizacion(self):
+        acciones = []
+        while self.ver()[0] is not None:
+            clausula = self.tomar()[1].upper()
+            while True:
+                if clausula == 'SET':
+                    destino = self.ruta()
+                    self.tomar('=')
+                    valor = self.operando()
+                    if self.es('+') or self.es('-'):
+                        valor = ('aritmetica', self.tomar()[1], valor, self.operando())
+                    acciones.append(('set', destino, valor))
+                elif clausula == 'REMOVE':
+                    acciones.append(('remove', self.ruta()))
+                elif clausula in ('ADD', 'DELETE'):
+                    acciones.append((clausula.lower(), self.ruta(), self.operando()))
+                else:
+                    raise ValueError(f"Cláusula de actualización no válida: {clausula!r}")
+                if not self.es(','):
+                    break
+                self.tomar(',')
+        return tuple(acciones)
+
+
+@functools.lru_cache(maxsize=512)
+def analizar(expresion, regla):
+    parser = Parser(expresion)
+    if regla == 'condicion':
+        resultado = parser.condicion()
+        parser.fin()
+        return resultado
+    return getattr(parser, regla)()
+
+
+class Contexto:
+    """Evalúa expresiones analizadas con sus ExpressionAttributeNames y ExpressionAttributeValues."""
+
+    def __init__(self, nombres=None, valores=None):
+        self.nombres = nombres or {}
+        self.valores = valores or {}
+
+    def partes(self, ruta):
+        return [self.nombres[parte] if isinstance(parte, str) and parte.startswith('#') else parte
+                for parte in ruta[1]]
+
+    def leer(self, item, ruta):
+        """Valor de una ruta dentro del item, o None si no existe."""
+        valor = item
+        for parte in self.partes(ruta):
+            if isinstance(parte, int):
+                if not isinstance(valor, list) or parte >= len(valor):
+                    return None
+            elif not isinstance(valor, dict) or parte not in valor:
+                return None
+            valor = valor[parte]
+        return valor
+
+    def escribir(self, item, ruta, valor):
+        *camino, ultima = self.partes(ruta)
+        destino = item
+        for parte in camino:
+            destino = destino[parte]
+        if isinstance(ultima, int) and ultima >= len(destino):
+            destino.append(valor)
+        else:
+            destino[ultima] = valor
+
+    def quitar(self, item, ruta):
+        *camino, ultima = self.partes(ruta)
+        destino = item
+        for parte in camino:
+            destino = destino.get(parte) if isinstance(destino, dict) else (
+                destino[parte] if parte < len(destino) else None)
+            if destino is None:
+                return
+        if isinstance(destino, dict):
+            destino.pop(ultima, None)
+        elif ultima < len(destino):
+            del destino[ultima]
+
+    def operando(self, item, nodo):
+        if nodo[0] == 'valor':
+            return self.valores[nodo[1]]
+        if nodo[0] == 'ruta':
+            return self.leer(item, nodo)
+        funcion, argumentos = nodo[1], nodo[2]
+        if funcion == 'size':
+            valor = self.operando(item, argumentos[0])
+            return None if valor is None else Decimal(len(valor))
+        if funcion == 'if_not_exists':
+            valor = self.operando(item, argumentos[0])
+            return self.operando(item, argumentos[1]) if valor is None else valor
+        if funcion == 'list_append':
+            return list(self.operando(item, argumentos[0]) or []) + list(self.operando(item, argumentos[1]) or [])
+        raise ValueError(f"Función no válida como operando: {funcion}")
+
+    def cumple(self, item, nodo):
+        clase = nodo[0]
+        if clase == 'and':
+            return self.cumple(item, nodo[1]) and self.cumple(item, nodo[2])
+        if clase == 'or':
+            return self.cumple(item, nodo[1]) or self.cumple(item, nodo[2])
+        if clase == 'not':
+            return not self.cumple(item, nodo[1])
+        if clase == 'funcion':
+            return self.funcion(item, nodo[1], nodo[2])
+        if clase == 'between':
+            valor, desde, hasta = (self.operando(item, n) for n in nodo[1:])
+            return comparar('>=', valor, desde) and comparar('<=', valor, hasta)
+        if clase == 'in':
+            valor = self.operando(item, nodo[1])
+            return any(comparar('=', valor, self.operando(item, opcion)) for opcion in nodo[2])
+        return comparar(nodo[1], self.operando(item, nodo[2]), self.operando(item, nodo[3]))
+
+    def funcion(self, item, funcion, argumentos):
+        if funcion == 'attribute_exists':
+            return self.operando(item, argumentos[0]) is not None
+        if funcion == 'attribute_not_exists':
+            return self.operando(item, argumentos[0]) is None
+        valor, otro = (self.operando(item, argumento) for argumento in argumentos[:2])
+        if funcion == 'begins_with':
+            return isinstance(valor, str) and isinstance(otro, str) and valor.startswith(otro)
+        if funcion == 'contains':
+            if isinstance(valor, str):
+                return isinstance(otro, str) and otro in valor
+            return isinstance(valor, (list, set)) and otro in valor
+        if funcion == 'attribute_type':
+            return valor is not None and tipo(valor) == otro
+        raise ValueError(f"Función no válida: {funcion}")
+
+    def proyectar(self, item, rutas):
+        """Copia del item con solo las rutas indicadas (las listas quedan compactadas)."""
+        resultado = {}
+        for ruta in rutas:
+            valor = self.leer(item, ruta)
+            if valor is None:
+                continue
+            partes = self.partes(ruta)
+            destino = resultado
+            for parte, siguiente in zip(partes, partes[1:]):
+                destino = destino.setdefault(parte, {})
+            destino[partes[-1]] = copiar(valor)
+        return _compactar(resultado, item)
+
+    def actualizar(self, item, acciones):
+        for accion in acciones:
+            if accion[0] == 'set':
+                valor = accion[2]
+                if valor[0] == 'aritmetica':
+                    _, operador, izquierda, derecha = valor
+                    izquierda, derecha = self.operando(item, izquierda), self.operando(item, derecha)
+                    valor = izquierda + derecha if operador == '+' else izquierda - derecha
+                else:
+                    valor = self.operando(item, valor)
+                self.escribir(item, accion[1], copiar(valor))
+            elif accion[0] == 'remove':
+                self.quitar(item, accion[1])
+            elif accion[0] == 'add':
+                actual, valor = self.leer(item, accion[1]), self.operando(item, accion[2])
+                if isinstance(valor, set):
+                    valor = (actual or set()) | valor
+                else:
+                    valor = (actual or Decimal(0)) + valor
+                self.escribir(item, accion[1], valor)
+            elif accion[0] == 'delete':
+                actual = self.leer(item, accion[1])
+                if actual is not None:
+                    restante = actual - self.operando(item, accion[2])
+                    if restante:
+                        self.escribir(item, accion[1], restante)
+                    else:
+                        self.quitar(item, accion[1])
+
+
+def _compactar(proyectado, original):
+    """Convierte los diccionarios {índice: valor} de las rutas con [n] en listas ordenadas."""
+    if isinstance(original, list) and isinstance(proyectado, dict):
+        return [_compactar(proyectado[i], original[i]) for i in sorted(proyectado)]
+    if isinstance(proyectado, dict) and isinstance(original, dict):
+        return {nombre: _compactar(valor, original.get(nombre)) for nombre, valor in proyectado.items()}
+    return proyectado
+
+
+def comparar(operador, a, b):
+    if a is None or b is None or tipo(a) != tipo(b):
+        return operador == '<>' and not (a is None and b is None)
+    if operador == '=':
+        return a == b
+    if operador == '<>':
+        return a != b
+    if tipo(a) not in ('N', 'S', 'B'):
+        return False
+    if operador == '<':
+        return a < b
+    if operador == '<=':
+        return a <= b
+    if operador == '>':
+        return a > b
+    return a >= b
+
+
+def igualdades(nodo):
+    """Pares (ruta, valor) de las igualdades unidas por AND (para la KeyConditionExpression)."""
+    if nodo[0] == 'and':
+        return igualdades(nodo[1]) + igualdades(nodo[2])
+    if nodo[0] == 'comparar' and nodo[1] == '=' and nodo[2][0] == 'ruta' and nodo[3][0] == 'valor':
+        return [(nodo[2], nodo[3])]
+    return []
+
+
+def limites_rango(nodo, contexto, rango):
+    """
+    (desde, incluido, hasta, incluido) de la clave de rango según la KeyConditionExpression,
+    para localizar el tramo de la partición sin recorrerla entera.
+    """
+    desde = hasta = None
+    incluir_desde = incluir_hasta = True
+    nodos = [nodo]
+    while nodos:
+        nodo = nodos.pop()
+        if nodo[0] == 'and':
+            nodos.extend(nodo[1:])
+            continue
+        if nodo[0] in ('comparar', 'between') and contexto.partes(nodo[2] if nodo[0] == 'comparar' else nodo[1]) == [rango]:
+            if nodo[0] == 'between':
+                desde, hasta = contexto.operando({}, nodo[2]), contexto.operando({}, nodo[3])
+            else:
+                valor = contexto.operando({}, nodo[3])
+                if nodo[1] in ('=', '>', '>='):
+                    desde, incluir_desde = valor, nodo[1] != '>'
+                if nodo[1] in ('=', '<', '<='):
+                    hasta, incluir_hasta = valor, nodo[1] != '<'
+        elif nodo[0] == 'funcion' and nodo[1] == 'begins_with' and contexto.partes(nodo[2][0]) == [rango]:
+            desde = contexto.operando({}, nodo[2][1])
+    return desde, incluir_desde, hasta, incluir_hasta
+
+
+# 📌 Tablas
+
+def orden_particion(clave):
+    """Posición de una partición en el espacio de hash (el orden de los scan)."""
+    return int.from_bytes(hashlib.md5(str(clave).encode()).digest(), 'big')
+
+
+class TablaMemoria:
+    def __init__(self, nombre, esquema, indices=()):
+        self.nombre = nombre
+        self.hash = next(k['AttributeName'] for k in esquema if k['KeyType'] == 'HASH')
+        self.rango = next((k['AttributeName'] for k in esquema if k['KeyType'] == 'RANGE'), None)
+        # Índices secundarios globales: nombre -> (clave hash, clave de rango)
+        self.indices = {
+            indice['IndexName']: (
+                next(k['AttributeName'] for k in indice['KeySchema'] if k['KeyType'] == 'HASH'),
+                next((k['AttributeName'] for k in indice['KeySchema'] if k['KeyType'] == 'RANGE'), None)
+            ) for indice in indices
+        }
+        # Atributos que copia cada índice además de las claves; None si los copia todos (ALL)
+        self.proyecciones = {
+            indice['IndexName']: (
+                None if indice.get('Projection', {}).get('ProjectionType', 'ALL') == 'ALL'
+                else set(indice['Projection'].get('NonKeyAttributes', ()))
+            ) for indice in indices
+        }
+        self.particiones = {}   # valor hash -> {valor rango: item}
+        self.claves = {}        # valor hash -> valores de rango ordenados
+        self._orden = None      # [(posición en el hash, valor hash)] en orden de scan
+        # Entradas de cada índice: índice -> valor hash -> [(orden del rango, orden de la clave, clave)]
+        # ordenadas, como la partición del índice en DynamoDB
+        self.entradas = {nombre: {} for nombre in self.indices}
+
+    def clave(self, item):
+        return (item.get(self.hash), item.get(self.rango) if self.rango else None)
+
+    def clave_de(self, item):
+        clave = {self.hash: item[self.hash]}
+        if self.rango:
+            clave[self.rango] = item[self.rango]
+        return clave
+
+    def obtener(self, clave):
+        hash_, rango = self.clave(clave)
+        return self.particiones.get(hash_, {}).get(rango)
+
+    def entradas_de(self, item):
+        """(índice, valor hash, entrada) de un item en cada índice en el que aparece."""
+        for nombre, (hash_, rango) in self.indices.items():
+            if hash_ in item and (rango is None or rango in item):
+                clave = self.clave(item)
+                yield nombre, item[hash_], (_orden_valor(item.get(rango)), _orden_valor(clave), clave)
+
+    def indexar(self, item):
+        for nombre, valor, entrada in self.entradas_de(item):
+            bisect.insort(self.entradas[nombre].setdefault(valor, []), entrada)
+
+    def desindexar(self, item):
+        for nombre, valor, entrada in self.entradas_de(item):
+            entradas = self.entradas[nombre][valor]
+            del entradas[bisect.bisect_left(entradas, entrada)]
+            if not entradas:
+                del self.entradas[nombre][valor]
+
+    def guardar(self, item):
+        hash_, rango = self.clave(item)
+        if hash_ not in self.particiones:
+            self.particiones[hash_] = {}
+            self.claves[hash_] = []
+            self._orden = None
+        anterior = self.particiones[hash_].get(rango)
+        if anterior is None:
+            bisect.insort(self.claves[hash_], rango)
+        else:
+            self.desindexar(anterior)
+        self.particiones[hash_][rango] = item
+        self.indexar(item)
+
+    def borrar(self, clave):
+        hash_, rango = self.clave(clave)
+        particion = self.particiones.get(hash_)
+        anterior = particion.pop(rango, None) if particion is not None else None
+        if anterior is None:
+            return
+        self.desindexar(anterior)
+        claves = self.claves[hash_]
+        del claves[bisect.bisect_left(claves, rango)]
+        if not particion:
+            del self.particiones[hash_], self.claves[hash_]
+            self._orden = None
+
+    def orden(self):
+        if self._orden is None:
+            self._orden = sorted((orden_particion(hash_), hash_) for hash_ in self.particiones)
+        return self._orden
+
+    def consultar(self, hash_, limites=(None, True, None, True), adelante=True, despues_de=None):
+        """
+        Items de una partición en orden de clave de rango, solo los del tramo `limites`
+        (ver limites_rango) y, si se indica, a continuación de la clave de rango `despues_de`.
+        """
+        claves = self.claves.get(hash_, [])
+        desde, incluir_desde, hasta, incluir_hasta = limites
+        primero, ultimo = 0, len(claves)
+        if desde is not None:
+            primero = (bisect.bisect_left if incluir_desde else bisect.bisect_right)(claves, desde)
+        if hasta is not None:
+            ultimo = (bisect.bisect_right if incluir_hasta else bisect.bisect_left)(claves, hasta)
+        if despues_de is not None and adelante:
+            primero = max(primero, bisect.bisect_right(claves, despues_de))
+        elif despues_de is not None:
+            ultimo = min(ultimo, bisect.bisect_left(claves, despues_de))
+        particion = self.particiones.get(hash_, {})
+        indices = range(primero, ultimo) if adelante else range(ultimo - 1, primero - 1, -1)
+        for indice in indices:
+            yield particion[claves[indice]]
+
+    def recorrer(self, segmento=0, total_segmentos=1, inicio=None):
+        """
+        Items en el orden de un scan, a continuación de la clave `inicio` si se indica.
+        Cada segmento es un tramo contiguo del espacio de hash.
+        """
+        orden = self.orden()
+        primero = bisect.bisect_left(orden, (-(-segmento << 128) // total_segmentos,))
+        if inicio is not None:
+            hash_, rango = self.clave(inicio)
+            primero = bisect.bisect_left(orden, (orden_particion(hash_),))
+            if primero < len(orden) and orden[primero][1] == hash_:
+                # Sin clave de rango la partición es el propio item de inicio: ya se devolvió
+                if self.rango is not None:
+                    yield from self.consultar(hash_, despues_de=rango)
+                primero += 1
+        for posicion, hash_ in itertools.islice(orden, primero, None):
+            if posicion * total_segmentos >> 128 != segmento:
+                break
+            yield from self.consultar(hash_)
+
+    def indice(self, indice, valor):
+        """
+        Items con ese valor de clave hash en un índice, ordenados por su clave de rango y con
+        solo los atributos que proyecta el índice (las claves de la tabla y del índice van siempre).
+        """
+        items = [self.particiones[hash_][rango] for _, _, (hash_, rango) in self.entradas[indice].get(valor, [])]
+        proyectados = self.proyecciones[indice]
+        if proyectados is None:
+            return items
+        incluidos = proyectados | {self.hash, self.rango, *self.indices[indice]}
+        return [{nombre: valor for nombre, valor in item.items() if nombre in incluidos} for item in items]
+
+
+def _orden_valor(valor):
+    if isinstance(valor, tuple):
+        return tuple(_orden_valor(v) for v in valor)
+    return (0, valor) if isinstance(valor, Decimal) else (1, '' if valor is None else valor)
+
+
+# 📌 Operaciones (con valores de Python, como el recurso)
+
+OPERACIONES = ('get_item', 'put_item', 'update_item', 'delete_item', 'query', 'scan',
+               'batch_get_item', 'batch_write_item', 'transact_write_items')
+OPERACIONES_TABLA = OPERACIONES[:6]
+
+
+class Eventos:
+    """Registro de eventos con la interfaz de client.meta.events de botocore (register/emit)."""
+
+    def __init__(self):
+        self.manejadores = {}
+
+    def register(self, nombre, manejador):
+        manejadores = self.manejadores.setdefault(nombre, [])
+        if manejador not in manejadores:
+            manejadores.append(manejador)
+
+    def emit(self, nombre, **kwargs):
+        return [(manejador, manejador(event_name=nombre, **kwargs)) for manejador in self.manejadores.get(nombre, ())]
+
+
+class AlmacenMemoria:
+    """Tablas en memoria. `recurso` y `cliente` imitan a los de boto3 sobre los mismos datos."""
+
+    def __init__(self):
+        self.tablas = {}
+        self.lock = threading.RLock()
+        self.consumo = {'items_leidos': 0, 'items_escritos': 0, 'rcu': 0.0, 'wcu': 0.0}
+        self.meta = SimpleNamespace(events=Eventos())
+        self.recurso = RecursoMemoria(self)
+        self.cliente = ClienteMemoria(self)
+
+    def crear_tabla(self, TableName, KeySchema, GlobalSecondaryIndexes=(), **kwargs):
+        with self.lock:
+            self.tablas[TableName] = TablaMemoria(TableName, KeySchema, GlobalSecondaryIndexes)
+
+    def llamar(self, operacion, **kwargs):
+        """
+        Una operación pedida desde las fachadas, con los eventos de botocore alrededor.
+        Las operaciones internas (las de transact_write_items) no pasan por aquí.
+        """
+        nombre = ''.join(parte.capitalize() for parte in operacion.split('_'))
+        modelo = SimpleNamespace(name=nombre)
+        self.meta.events.emit(f'provide-client-params.dynamodb.{nombre}', params=kwargs, model=modelo)
+        with self.lock:
+            antes = self.consumo['rcu'] + self.consumo['wcu']
+            respuesta = getattr(self, operacion)(**kwargs)
+            consumida = self.consumo['rcu'] + self.consumo['wcu'] - antes
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            if 'TableName' in kwargs:
+                respuesta['ConsumedCapacity'] = {'TableName': kwargs['TableName'], 'CapacityUnits': consumida}
+            else:
+                respuesta['ConsumedCapacity'] = [{'CapacityUnits': consumida}]
+        self.meta.events.emit(f'after-call.dynamodb.{nombre}', http_response=None, parsed=respuesta, model=modelo)
+        return respuesta
+
+    def leido(self, items, bytes_, consistente):
+        """Lecturas: 4 KB por RCU, la mitad si la lectura es eventualmente consistente."""
+        self.consumo['items_leidos'] += items
+        self.consumo['rcu'] += unidades(bytes_, 4096) * (1 if consistente else 0.5)
+
+    def escrito(self, anterior, nuevo):
+        """Escrituras: 1 KB por WCU, del mayor de los tamaños anterior y nuevo del item."""
+        self.consumo['items_escritos'] += 1
+        self.consumo['wcu'] += unidades(max(tamano_item(anterior or {}), tamano_item(nuevo or {})), 1024)
+
+    def tabla(self, nombre, operacion):
+        if nombre not in self.tablas:
+            raise error('ResourceNotFoundException', f"Requested resource not found: {nombre}", operacion)
+        return self.tablas[nombre]
+
+    def comprobar(self, item, kwargs, operacion):
+        """Evalúa la ConditionExpression sobre el item actual (None si no existe)."""
+        if 'ConditionExpression' not in kwargs:
+            return True
+        contexto = Contexto(kwargs.get('ExpressionAttributeNames'), normalizar(kwargs.get('ExpressionAttributeValues')))
+        return contexto.cumple(item or {}, analizar(kwargs['ConditionExpression'], 'condicion'))
+
+    def proyectar(self, item, kwargs):
+        if 'ProjectionExpression' not in kwargs:
+            return copiar(item)
+        contexto = Contexto(kwargs.get('ExpressionAttributeNames'))
+        return contexto.proyectar(item, analizar(kwargs['ProjectionExpression'], 'proyeccion'))
+
+    def get_item(self, TableName, Key, **kwargs):
+        with self.lock:
+            item = self.tabla(TableName, 'GetItem').obtener(normalizar(Key))
+            self.leido(item is not None, tamano_item(item or {}), kwargs.get('ConsistentRead'))
+            return {} if item is None else {'Item': self.proyectar(item, kwargs)}
+
+    def put_item(self, TableName, Item, **kwargs):
+        with self.lock:
+            tabla = self.tabla(TableName, 'PutItem')
+            item = normalizar(Item)
+            anterior = tabla.obtener(item)
+            if not self.comprobar(anterior, kwargs, 'PutItem'):
+                raise error('ConditionalCheckFailedException', "The conditional request failed", 'PutItem')
+            comprobar_tamano(item, 'PutItem')
+            self.escrito(anterior, item)
+            tabla.guardar(item)
+            return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, **kwargs):
+        with self.lock:
+            tabla = self.tabla(TableName, 'UpdateItem')
+            clave = normalizar(Key)
+            actual = tabla.obtener(clave)
+            if not self.comprobar(actual, kwargs, 'UpdateItem'):
+                raise error('ConditionalCheckFailedException', "The conditional request failed", 'UpdateItem')
+            item = copiar(actual) if actual is not None else dict(clave)
+            contexto = Contexto(kwargs.get('ExpressionAttributeNames'), normalizar(kwargs.get('ExpressionAttributeValues')))
+            contexto.actualizar(item, analizar(UpdateExpression, 'actualizacion'))
+            comprobar_tamano(item, 'UpdateItem')
+            self.escrito(actual, item)
+            tabla.guardar(item)
+            if kwargs.get('ReturnValues') == 'ALL_NEW':
+                return {'Attributes': copiar(item)}
+            return {}
+
+    def delete_item(self, TableName, Key, **kwargs):
+        with self.lock:
+            tabla = self.tabla(TableName, 'DeleteItem')
+            clave = normalizar(Key)
+            anterior = tabla.obtener(clave)
+            if not self.comprobar(anterior, kwargs, 'DeleteItem'):
+                raise error('ConditionalCheckFailedException', "The conditional request failed", 'DeleteItem')
+            self.escrito(anterior, None)
+            tabla.borrar(clave)
+            return {}
+
+    def paginar(self, items, kwargs):
+        """Aplica Limit, FilterExpression y la proyección a una secuencia de items."""
+        limite = kwargs.get('Limit')
+        filtro = None
+        if 'FilterExpression' in kwargs:
+            filtro = analizar(kwargs['FilterExpression'], 'condicion')
+            contexto = Contexto(kwargs.get('ExpressionAttributeNames'), normalizar(kwargs.get('ExpressionAttributeValues')))
+        resultado = []
+        evaluados = 0
+        bytes_ = 0
+        ultimo = None
+        for item in items:
+            if limite is not None and evaluados >= limite:
+                break
+            evaluados += 1
+            bytes_ += tamano_item(item)
+            ultimo = item
+            if filtro is None or contexto.cumple(item, filtro):
+                resultado.append(self.proyectar(item, kwargs))
+        else:
+            ultimo = None
+        # Se cobra lo evaluado, no lo devuelto: ni el filtro ni la proyección ahorran capacidad
+        self.leido(evaluados, bytes_, kwargs.get('ConsistentRead'))
+        return resultado, evaluados, ultimo
+
+    def respuesta_pagina(self, tabla, resultado, evaluados, ultimo, indice, seleccion=None):
+        respuesta = {'Items': resultado, 'Count': len(resultado), 'ScannedCount': evaluados}
+        # Select='COUNT' solo devuelve los contadores
+        if seleccion == 'COUNT':
+            del respuesta['Items']
+        if ultimo is not None:
+            clave = tabla.clave_de(ultimo)
+            if indice is not None:
+                clave.update({nombre: ultimo[nombre] for nombre in tabla.indices[indice] if nombre})
+            respuesta['LastEvaluatedKey'] = copiar(clave)
+        return respuesta
+
+    def query(self, TableName, KeyConditionExpression, **kwargs):
+        with self.lock:
+            tabla = self.tabla(TableName, 'Query')
+            indice = kwargs.get('IndexName')
+            hash_ = tabla.indices[indice][0] if indice else tabla.hash
+            contexto = Contexto(kwargs.get('ExpressionAttributeNames'), normalizar(kwargs.get('ExpressionAttributeValues')))
+            condicion = analizar(KeyConditionExpression, 'condicion')
+            valor = next((contexto.operando({}, v) for ruta, v in igualdades(condicion)
+                          if contexto.partes(ruta) == [hash_]), None)
+            if valor is None:
+                raise error('ValidationException', "Query condition missed key schema element", 'Query')
+            adelante = kwargs.get('ScanIndexForward', True)
+            inicio = normalizar(kwargs.get('ExclusiveStartKey'))
+            if indice is None:
+                limites = limites_rango(condicion, contexto, tabla.rango) if tabla.rango else (None, True, None, True)
+                items = tabla.consultar(valor, limites, adelante, inicio and tabla.clave(inicio)[1])
+            else:
+                items = tabla.indice(indice, valor)
+                if not adelante:
+                    items.reverse()
+                if inicio is not None:
+                    items = itertools.dropwhile(lambda item: tabla.clave(item) != tabla.clave(inicio), items)
+                    next(items, None)
+            items = (item for item in items if contexto.cumple(item, condicion))
+            resultado, evaluados, ultimo = self.paginar(items, kwargs)
+            return self.respuesta_pagina(tabla, resultado, evaluados, ultimo, indice, kwargs.get('Select'))
+
+    def scan(self, TableName, **kwargs):
+        with self.lock:
+            tabla = self.tabla(TableName, 'Scan')
+            items = tabla.recorrer(kwargs.get('Segment', 0), kwargs.get('TotalSegments', 1),
+                                   normalizar(kwargs.get('ExclusiveStartKey')))
+            resultado, evaluados, ultimo = self.paginar(items, kwargs)
+            return self.respuesta_pagina(tabla, resultado, evaluados, ultimo, None, kwargs.get('Select'))
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        with self.lock:
+            respuestas = {}
+            for nombre, peticion in RequestItems.items():
+                tabla = self.tabla(nombre, 'BatchGetItem')
+                respuestas[nombre] = []
+                for clave in peticion['Keys']:
+                    item = tabla.obtener(normalizar(clave))
+                    self.leido(item is not None, tamano_item(item or {}), peticion.get('ConsistentRead'))
+                    if item is not None:
+                        respuestas[nombre].append(self.proyectar(item, peticion))
+            return {'Responses': respuestas, 'UnprocessedKeys': {}}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        with self.lock:
+            # Un solo item demasiado grande hace fallar el lote entero, sin escribir nada
+            for nombre, peticiones in RequestItems.items():
+                self.tabla(nombre, 'BatchWriteItem')
+                for peticion in peticiones:
+                    if 'PutRequest' in peticion:
+                        comprobar_tamano(normalizar(peticion['PutRequest']['Item']), 'BatchWriteItem')
+            for nombre, peticiones in RequestItems.items():
+                tabla = self.tabla(nombre, 'BatchWriteItem')
+                for peticion in peticiones:
+                    if 'PutRequest' in peticion:
+                        item = normalizar(peticion['PutRequest']['Item'])
+                        self.escrito(tabla.obtener(item), item)
+                        tabla.guardar(item)
+                    else:
+                        clave = normalizar(peticion['DeleteRequest']['Key'])
+                        self.escrito(tabla.obtener(clave), None)
+                        tabla.borrar(clave)
+            return {'UnprocessedItems': {}}
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        with self.lock:
+            motivos = []
+            for accion in TransactItems:
+                (operacion, datos), = accion.items()
+                tabla = self.tabla(datos['TableName'], 'TransactWriteItems')
+                clave = normalizar(datos['Item'] if operacion == 'Put' else datos['Key'])
+                cumple = self.comprobar(tabla.obtener(clave), datos, 'TransactWriteItems')
+                motivos.append({'Code': 'None'} if cumple else
+                               {'Code': 'ConditionalCheckFailed', 'Message': "The conditional request failed"})
+            if any(motivo['Code'] != 'None' for motivo in motivos):
+                raise error('TransactionCanceledException', "Transaction cancelled", 'TransactWriteItems',
+                            CancellationReasons=motivos)
+            # Las escrituras transaccionales cuestan el doble: se cuentan dos veces
+            wcu = self.consumo['wcu']
+            for accion in TransactItems:
+                (operacion, datos), = accion.items()
+                sin_condicion = {k: v for k, v in datos.items() if k != 'ConditionExpression'}
+                if operacion == 'Put':
+                    self.put_item(**sin_condicion)
+                elif operacion == 'Update':
+                    self.update_item(**sin_condicion)
+                elif operacion == 'Delete':
+                    self.delete_item(**sin_condicion)
+            self.consumo['wcu'] += self.consumo['wcu'] - wcu
+            return {}
+
+
+# 📌 Fachadas con la forma del recurso y del cliente de boto3
+
+class TablaRecurso:
+    """Equivalente a recurso.Table(nombre): las operaciones sin TableName."""
+
+    def __init__(self, almacen, nombre):
+        self.almacen = almacen
+        self.name = nombre
+        self.table_name = nombre
+        self.meta = SimpleNamespace(client=almacen.recurso.meta.client)
+
+    def __getattr__(self, operacion):
+        if operacion not in OPERACIONES_TABLA:
+            raise AttributeError(operacion)
+        return functools.partial(self.almacen.llamar, operacion, TableName=self.name)
+
+
+class ClienteRecurso:
+    """Equivalente a recurso.meta.client: valores de Python y las excepciones de boto3."""
+
+    exceptions = EXCEPCIONES
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self.meta = almacen.meta
+
+    def __getattr__(self, operacion):
+        if operacion not in OPERACIONES:
+            raise AttributeError(operacion)
+        return functools.partial(self.almacen.llamar, operacion)
+
+
+class RecursoMemoria:
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self.meta = SimpleNamespace(client=ClienteRecurso(almacen))
+
+    def Table(self, nombre):
+        return TablaRecurso(self.almacen, nombre)
+
+    def batch_get_item(self, **kwargs):
+        return self.almacen.llamar('batch_get_item', **kwargs)
+
+    def batch_write_item(self, **kwargs):
+        return self.almacen.llamar('batch_write_item', **kwargs)
+
+
+class ClienteMemoria:
+    """Equivalente al cliente de bajo nivel: convierte de y a formato de cable."""
+
+    exceptions = EXCEPCIONES
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self.meta = almacen.meta
+
+    def a_python(self, valores):
+        return {nombre: self.deserializer.deserialize(valor) for nombre, valor in valores.items()}
+
+    def a_cable(self, item):
+        return {nombre: self.serializer.serialize(valor) for nombre, valor in item.items()}
+
+    def __getattr__(self, operacion):
+        if operacion not in OPERACIONES:
+            raise AttributeError(operacion)
+        funcion = functools.partial(self.almacen.llamar, operacion)
+
+        def llamar(**kwargs):
+            for nombre in ('Key', 'Item', 'ExclusiveStartKey', 'ExpressionAttributeValues'):
+                if nombre in kwargs:
+                    kwargs[nombre] = self.a_python(kwargs[nombre])
+            respuesta = funcion(**kwargs)
+            if 'Item' in respuesta:
+                respuesta['Item'] = self.a_cable(respuesta['Item'])
+            if 'Items' in respuesta:
+                respuesta['Items'] = [self.a_cable(item) for item in respuesta['Items']]
+            if 'LastEvaluatedKey' in respuesta:
+                respuesta['LastEvaluatedKey'] = self.a_cable(respuesta['LastEvaluatedKey'])
+            return respuesta
+        return llamar
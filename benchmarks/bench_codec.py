@@ -0,0 +1,81 @@
+"""
+Micro-benchmark de serialización: tiempo de CPU por cada 1.000 anuncios con el
+json estándar (como hacían los handlers), con codec_json usando el módulo estándar
+y con codec_json usando orjson (si está instalado).
+
+    python benchmarks/bench_codec.py --items 10000 --repeticiones 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'funciones_lambda'))
+
+import codec_json
+
+
+def anuncios_de_prueba(cantidad):
+    """Anuncios con la forma de los de DynamoDB: números como Decimal y un resumen de comentarios."""
+    return [{
+        'id': f'{i:08x}-0000-4000-8000-000000000000',
+        'titulo': f'Anuncio de prueba número {i}',
+        'descripcion': 'Descripción con acentos: ñandú, camión, pingüino. ' * 4,
+        'num_comentarios': Decimal(i % 50),
+        'precio': Decimal('1999.95'),
+        'etiquetas': {'venta', 'madrid', 'piso'},
+        'ultimos_comentarios': [{
+            'comentario_id': f'01HK153X00M5K6EJQXQ9GAJX{j:02d}',
+            'usuario': 'pepe',
+            'mensaje': 'Comentario de prueba',
+            'fecha': '2024-01-01T00:00:00'
+        } for j in range(3)]
+    } for i in range(cantidad)]
+
+
+def medir(funcion, datos, repeticiones):
+    """Mejor tiempo de CPU (segundos) de `repeticiones` ejecuciones."""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        funcion(datos)
+        mejor = min(mejor, time.process_time() - inicio)
+    return mejor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de serialización JSON de las respuestas.")
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--json', dest='salida_json', help="guardar los resultados en este fichero")
+    args = parser.parse_args(argv)
+
+    datos = anuncios_de_prueba(args.items)
+    variantes = {
+        'json estándar (default=str)': lambda d: json.dumps(d, default=str),
+        'codec_json estándar': codec_json.dumps_estandar,
+    }
+    if codec_json.orjson is not None:
+        variantes['codec_json orjson'] = codec_json.dumps
+    else:
+        print("⚠️ orjson no está instalado: solo se mide el módulo estándar")
+
+    resultados = {}
+    for nombre, funcion in variantes.items():
+        segundos = medir(funcion, datos, args.repeticiones)
+        resultados[nombre] = {
+            'ms_cpu_por_1000': round(segundos * 1000 * 1000 / args.items, 3),
+            'bytes': len(funcion(datos).encode()),
+        }
+        print(f"{nombre:<36} {resultados[nombre]['ms_cpu_por_1000']:>9.3f} ms CPU / 1.000 items"
+              f"  ({resultados[nombre]['bytes']} bytes)")
+
+    if args.salida_json:
+        with open(args.salida_json, 'w', encoding='utf-8') as f:
+            json.dump({'items': args.items, 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
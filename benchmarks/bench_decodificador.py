@@ -0,0 +1,94 @@
+"""
+Benchmark de la ruta rápida de lectura: items/segundo y pico de memoria al pasar
+una página de Anuncios en formato de cable a JSON, con el TypeDeserializer del
+recurso de boto3 frente a decodificador.decodificar_anuncio.
+
+    python benchmarks/bench_decodificador.py --items 20000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'funciones_lambda'))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+import codec_json
+import decodificador
+
+
+def pagina_de_prueba(cantidad):
+    """Items de Anuncios tal y como llegan del cliente de bajo nivel."""
+    serializer = TypeSerializer()
+    items = []
+    for i in range(cantidad):
+        anuncio = {
+            'id': f'{i:08x}-0000-4000-8000-000000000000',
+            'titulo': f'Anuncio de prueba número {i}',
+            'descripcion': 'Descripción de prueba con algo de texto. ' * 4,
+            'num_comentarios': Decimal(i % 50),
+            'ultimos_comentarios': [{
+                'comentario_id': f'01HK153X00M5K6EJQXQ9GAJX{j:02d}',
+                'usuario': 'pepe',
+                'mensaje': 'Comentario de prueba',
+                'fecha': '2024-01-01T00:00:00'
+            } for j in range(3)]
+        }
+        items.append({nombre: serializer.serialize(v) for nombre, v in anuncio.items()})
+    return items
+
+
+def ruta_recurso(items):
+    deserializer = TypeDeserializer()
+    decodificados = [{nombre: deserializer.deserialize(v) for nombre, v in item.items()} for item in items]
+    return codec_json.dumps(decodificados)
+
+
+def ruta_rapida(items):
+    return codec_json.dumps([decodificador.decodificar_anuncio(item) for item in items])
+
+
+def medir(funcion, items, repeticiones):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(items)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    tracemalloc.start()
+    funcion(items)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'items_por_segundo': round(len(items) / mejor), 'pico_memoria_kb': round(pico / 1024)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del decodificador de items de DynamoDB.")
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--json', dest='salida_json', help="guardar los resultados en este fichero")
+    args = parser.parse_args(argv)
+
+    items = pagina_de_prueba(args.items)
+    if ruta_recurso(items) != ruta_rapida(items):
+        print("❌ Las dos rutas no producen el mismo JSON")
+        sys.exit(1)
+
+    resultados = {
+        'recurso (TypeDeserializer)': medir(ruta_recurso, items, args.repeticiones),
+        'ruta rápida (decodificador)': medir(ruta_rapida, items, args.repeticiones),
+    }
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:<30} {resultado['items_por_segundo']:>10} items/s"
+              f"  pico {resultado['pico_memoria_kb']:>8} KB")
+
+    if args.salida_json:
+        with open(args.salida_json, 'w', encoding='utf-8') as f:
+            json.dump({'items': args.items, 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
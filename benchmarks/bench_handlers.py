@@ -0,0 +1,240 @@
+"""
+Benchmark de los handlers frente al tamaño de las tablas: para cada tamaño de Anuncios
+rellena las tablas en memoria de almacen_local.py (con comentarios repartidos de forma
+sesgada, como en la realidad: pocos anuncios acumulan la mayoría) y lanza cada handler
+con la concurrencia indicada. Mide latencia p50/p95/p99, peticiones por segundo, pico
+de memoria de una invocación, items leídos/escritos y capacidad consumida por petición.
+
+    python benchmarks/bench_handlers.py --anuncios 1000,100000 --concurrencia 1,8 --json resultados.json
+    python benchmarks/bench_handlers.py --anuncios 1000000 --peticiones 2000 --funciones ver_anuncio
+
+Guardar el JSON de cada versión permite comparar resultados entre versiones.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+import tracemalloc
+import importlib
+import itertools
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'funciones_lambda'))
+
+# Las funciones leen su configuración del entorno al importarse
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+os.environ.setdefault('CURSOR_SECRET', 'benchmark')
+
+import comun
+from almacen_local import AlmacenMemoria, normalizar
+from servidor_local import TABLAS
+
+FUNCIONES = ['listar_anuncios', 'listar_recientes', 'ver_anuncio', 'crear_anuncio', 'crear_comentario',
+             'listar_comentarios']
+# Variantes de un mismo handler que se miden por separado
+MODULOS = {'listar_recientes': 'listar_anuncios'}
+
+# Invocaciones (una detrás de otra) con las que se mide el pico de memoria
+MUESTRAS_MEMORIA = 20
+
+# Sin caché: se mide el acceso a las tablas, no la caché del contenedor
+SIN_CACHE = {'Cache-Control': 'no-cache'}
+
+
+def pesos_sesgados(cantidad, sesgo):
+    """Pesos tipo Zipf: el anuncio de rango r recibe comentarios en proporción a 1/r^sesgo."""
+    return list(itertools.accumulate(1 / (rango ** sesgo) for rango in range(1, cantidad + 1)))
+
+
+def rellenar(almacen, num_anuncios, comentarios_por_anuncio, sesgo, aleatorio):
+    """
+    Crea los anuncios y comentarios directamente en el almacén, con la misma forma que
+    los que escriben crear_anuncio y crear_comentario (resumen de comentarios incluido).
+    Devuelve los IDs de los anuncios y los pesos acumulados para elegirlos con el mismo sesgo.
+    """
+    for nombre, definicion in TABLAS.items():
+        almacen.crear_tabla(TableName=nombre, **definicion)
+    anuncios = almacen.tablas['Anuncios']
+    comentarios = almacen.tablas['Comentarios']
+
+    ids = [f'{i:08x}-0000-4000-8000-{aleatorio.getrandbits(48):012x}' for i in range(num_anuncios)]
+    pesos = pesos_sesgados(num_anuncios, sesgo)
+    total_comentarios = num_anuncios * comentarios_por_anuncio
+    por_anuncio = [0] * num_anuncios
+    for indice in aleatorio.choices(range(num_anuncios), cum_weights=pesos, k=total_comentarios):
+        por_anuncio[indice] += 1
+
+    inicio = datetime(2024, 1, 1)
+    for anuncio_id, cuantos in zip(ids, por_anuncio):
+        resumen = []
+        for j in range(cuantos):
+            fecha = inicio + timedelta(seconds=j)
+            comentario = {
+                'anuncio_id': anuncio_id,
+                'comentario_id': comun.generar_ulid(fecha),
+                'usuario': f'usuario{aleatorio.randrange(1000)}',
+                'mensaje': 'Comentario de prueba ' * 3,
+                'fecha': fecha.isoformat()
+            }
+            comentarios.guardar(normalizar(comentario))
+            resumen.insert(0, {k: comentario[k] for k in ('comentario_id', 'usuario', 'mensaje', 'fecha')})
+            del resumen[5:]
+        anuncio = {
+            'id': anuncio_id,
+            'titulo': f'Anuncio {anuncio_id[:8]}',
+            'descripcion': 'Descripción de prueba con algo de texto. ' * 6,
+            'version': 1 + cuantos,
+            # fecha_creacion y particion_fecha: los anuncios también están en PorFecha
+            **comun.atributos_creacion(anuncio_id)
+        }
+        if cuantos:
+            anuncio.update(num_comentarios=cuantos, ultimos_comentarios=resumen)
+        anuncios.guardar(normalizar(anuncio))
+    return ids, pesos
+
+
+def eventos(funcion, ids, pesos, aleatorio):
+    """Generador de eventos para cada handler; los anuncios se eligen con el sesgo de los comentarios."""
+    def elegido():
+        return aleatorio.choices(ids, cum_weights=pesos)[0]
+    while True:
+        if funcion == 'listar_anuncios':
+            yield {'queryStringParameters': {'limit': '50'}}
+        elif funcion == 'listar_recientes':
+            yield {'queryStringParameters': {'limit': '50', 'order': 'recent'}}
+        elif funcion == 'ver_anuncio':
+            yield {'pathParameters': {'id': elegido()}, 'headers': SIN_CACHE}
+        elif funcion == 'crear_anuncio':
+            yield {'body': {'titulo': 'Nuevo anuncio', 'descripcion': 'Descripción del anuncio nuevo'}}
+        elif funcion == 'crear_comentario':
+            yield {'pathParameters': {'id': elegido()}, 'body': {'usuario': 'bench', 'mensaje': 'Comentario nuevo'}}
+        elif funcion == 'listar_comentarios':
+            yield {'pathParameters': {'id': elegido()}, 'queryStringParameters': {'order': 'desc', 'limit': '20'},
+                   'headers': SIN_CACHE}
+
+
+def pico_memoria(handler, lista_eventos):
+    """
+    Mayor pico de memoria (KB) reservada durante una sola invocación, con tracemalloc. Se mide
+    aparte, con las invocaciones una detrás de otra: tracemalloc ralentiza mucho y, con varios
+    hilos, los picos de unas invocaciones se sumarían a los de otras.
+    """
+    pico = 0
+    tracemalloc.start()
+    try:
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            for evento in lista_eventos:
+                tracemalloc.reset_peak()
+                inicial = tracemalloc.get_traced_memory()[0]
+                handler(evento, None)
+                pico = max(pico, tracemalloc.get_traced_memory()[1] - inicial)
+    finally:
+        tracemalloc.stop()
+    return round(pico / 1024, 1)
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def medir(handler, lista_eventos, concurrencia, almacen):
+    """Lanza los eventos con `concurrencia` hilos y resume latencias, rendimiento y consumo."""
+    consumo_inicial = dict(almacen.consumo)
+
+    def llamar(evento):
+        inicio = time.perf_counter()
+        respuesta = handler(evento, None)
+        if respuesta['statusCode'] >= 400:
+            raise RuntimeError(f"{respuesta['statusCode']}: {respuesta['body']}")
+        return time.perf_counter() - inicio
+
+    # Las líneas de métricas EMF que escribe cada invocación no se muestran
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            latencias = sorted(pool.map(llamar, lista_eventos))
+    total = time.perf_counter() - inicio
+
+    peticiones = len(latencias)
+    consumo = {nombre: almacen.consumo[nombre] - consumo_inicial[nombre] for nombre in consumo_inicial}
+    memoria = pico_memoria(handler, lista_eventos[:MUESTRAS_MEMORIA])
+    return {
+        'peticiones': peticiones,
+        'p50_ms': round(percentil(latencias, 50) * 1000, 3),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 3),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 3),
+        'peticiones_por_segundo': round(peticiones / total, 1),
+        'memoria_pico_kb': memoria,
+        'items_leidos_por_peticion': round(consumo['items_leidos'] / peticiones, 2),
+        'items_escritos_por_peticion': round(consumo['items_escritos'] / peticiones, 2),
+        'rcu_por_peticion': round(consumo['rcu'] / peticiones, 3),
+        'wcu_por_peticion': round(consumo['wcu'] / peticiones, 3),
+    }
+
+
+def lista_enteros(texto):
+    return [int(valor) for valor in texto.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de los handlers con tablas de distintos tamaños.")
+    parser.add_argument('--anuncios', type=lista_enteros, default=[1000, 10000],
+                        help="tamaños de la tabla Anuncios, separados por comas (hasta 1000000)")
+    parser.add_argument('--comentarios-por-anuncio', type=int, default=5, help="media de comentarios por anuncio")
+    parser.add_argument('--sesgo', type=float, default=1.1, help="exponente Zipf del reparto de comentarios")
+    parser.add_argument('--concurrencia', type=lista_enteros, default=[1, 8])
+    parser.add_argument('--peticiones', type=int, default=1000, help="peticiones por handler y concurrencia")
+    parser.add_argument('--funciones', default=','.join(FUNCIONES))
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--json', dest='salida_json', help="guardar los resultados en este fichero")
+    args = parser.parse_args(argv)
+
+    funciones = args.funciones.split(',')
+    almacen = AlmacenMemoria()
+    comun.usar_almacen(almacen)
+    handlers = {funcion: importlib.import_module(MODULOS.get(funcion, funcion)).lambda_handler
+                for funcion in funciones}
+
+    resultados = []
+    for num_anuncios in args.anuncios:
+        aleatorio = random.Random(args.semilla)
+        inicio = time.perf_counter()
+        ids, pesos = rellenar(almacen, num_anuncios, args.comentarios_por_anuncio, args.sesgo, aleatorio)
+        print(f"🔹 {num_anuncios} anuncios y {num_anuncios * args.comentarios_por_anuncio} comentarios "
+              f"creados en {time.perf_counter() - inicio:.1f} s")
+
+        for funcion in funciones:
+            for concurrencia in args.concurrencia:
+                lista_eventos = list(itertools.islice(eventos(funcion, ids, pesos, aleatorio), args.peticiones))
+                resultado = medir(handlers[funcion], lista_eventos, concurrencia, almacen)
+                resultado.update(anuncios=num_anuncios, funcion=funcion, concurrencia=concurrencia)
+                resultados.append(resultado)
+                print(f"{funcion:<20} c={concurrencia:<3} p50 {resultado['p50_ms']:>8.3f} ms"
+                      f"  p95 {resultado['p95_ms']:>8.3f} ms  p99 {resultado['p99_ms']:>8.3f} ms"
+                      f"  {resultado['peticiones_por_segundo']:>8.1f} pet/s"
+                      f"  {resultado['memoria_pico_kb']:>8.1f} KB"
+                      f"  {resultado['items_leidos_por_peticion']:>7.2f} leídos"
+                      f"  {resultado['rcu_por_peticion']:>6.3f} RCU  {resultado['wcu_por_peticion']:>6.3f} WCU")
+
+    if args.salida_json:
+        with open(args.salida_json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fecha': datetime.utcnow().isoformat(),
+                'parametros': {
+                    'comentarios_por_anuncio': args.comentarios_por_anuncio,
+                    'sesgo': args.sesgo,
+                    'peticiones': args.peticiones,
+                    'semilla': args.semilla,
+                },
+                'resultados': resultados
+            }, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
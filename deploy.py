@@ -3,684 +3,1403 @@ import json
 import zipfile
 import os
 import time
-import uuid
+import io
+import base64
+import hashlib
+import argparse
+import secrets
+import builtins
+import threading
+import subprocess
+import sys
+import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 AWS_REGION = "eu-west-1"
 IAM_ROLE_NAME = "LambdaDynamoDBRole"
 LAMBDA_FOLDER = "funciones_lambda"
 API_NAME = "AnunciosAPI"
+LAMBDA_RUNTIME = "python3.12"
 
-# Crear clientes AWS
+# Clave para firmar los cursores de paginación. Si no se fija en el entorno, se mantiene
+# la de la función ya desplegada (o se genera una nueva), y los cursores emitidos siguen
+# siendo válidos tras un nuevo despliegue.
+CURSOR_SECRET = os.environ.get("CURSOR_SECRET")
+
+# Caché en memoria de ver_anuncio y listar_comentarios: segundos que una lectura
+# puede servirse sin volver a DynamoDB (0 la desactiva) y tamaño máximo por contenedor.
+CACHE_TTL_SEGUNDOS = os.environ.get("CACHE_TTL_SEGUNDOS", "5")
+CACHE_MAX_BYTES = os.environ.get("CACHE_MAX_BYTES", str(8 * 1024 * 1024))
+
+# Listados con el cliente de bajo nivel y el decodificador propio ("0" vuelve al recurso de boto3)
+DYNAMODB_RUTA_RAPIDA = os.environ.get("DYNAMODB_RUTA_RAPIDA", "1")
+
+# Tamaño mínimo (bytes) a partir del cual API Gateway comprime las respuestas con
+# gzip/deflate si el cliente lo pide en Accept-Encoding ("-1" desactiva la compresión)
+MINIMUM_COMPRESSION_SIZE = int(os.environ.get("MINIMUM_COMPRESSION_SIZE", "1024"))
+
+# Caché de la etapa 'prod' de la API REST (la HTTP API no tiene): tamaño en GB ("0.5",
+# "1.6", "6.1"...; vacío, sin caché). Crearla o cambiar su tamaño tarda unos minutos y se
+# paga por hora, haya tráfico o no.
+API_CACHE_SIZE = os.environ.get("API_CACHE_SIZE", "")
+
+# GET que guarda la caché de la etapa: segundos que vale cada respuesta y parámetros de la
+# petición que forman su clave. Las escrituras no vacían la caché, así que los TTL son
+# cortos; tras escribir, el cliente puede pedir la versión actual con Cache-Control: max-age=0.
+# If-None-Match va en la clave para no servir un 304 a quien no tiene esa versión.
+CACHED_ROUTES = {
+    ("GET", "/anuncios"): (10, ["querystring.limit", "querystring.cursor", "querystring.fields",
+                                "querystring.ids", "querystring.order"]),
+    ("GET", "/anuncios/search"): (30, ["querystring.q", "querystring.limit", "querystring.fields"]),
+    ("GET", "/anuncios/{id}"): (30, ["path.id", "querystring.include", "querystring.fields",
+                                     "header.If-None-Match"]),
+    ("GET", "/anuncios/{id}/comentarios"): (10, ["path.id", "querystring.order", "querystring.limit",
+                                                 "querystring.since", "querystring.before",
+                                                 "querystring.fields", "header.If-None-Match"]),
+    ("GET", "/usuarios/{usuario}/comentarios"): (10, ["path.usuario", "querystring.order", "querystring.limit",
+                                                      "querystring.cursor"]),
+}
+
+# Tipo de API: "rest" (API REST con plantillas de mapeo, la de siempre) o "http" (HTTP API
+# con integración proxy y payload 2.0: menos latencia y coste por petición y CORS integrado,
+# pero sin compresión de respuestas). Se puede cambiar también con --api.
+API_TYPE = os.environ.get("API_TYPE", "rest")
+
+# CORS de la HTTP API (en la API REST lo responde un método OPTIONS por recurso)
+HTTP_API_CORS = {
+    "AllowOrigins": ["*"],
+    "AllowMethods": ["GET", "OPTIONS", "POST"],
+    "AllowHeaders": ["authorization", "content-type", "x-amz-date", "x-amz-security-token", "x-api-key"],
+    "ExposeHeaders": ["etag", "x-next-cursor"],
+}
+
+# Pasos del despliegue que se ejecutan a la vez (los que no dependen unos de otros)
+DEPLOY_CONCURRENCY = int(os.environ.get("DEPLOY_CONCURRENCY", "8"))
+
+# Un rol recién creado tarda unos segundos en poder ser asumido por Lambda: se reintenta
+# la creación de la función durante este tiempo como máximo, en lugar de esperar siempre
+ROLE_PROPAGATION_TIMEOUT = 90
+
+# Esperas de los waiters: consultas cada pocos segundos en lugar de los 20 por defecto de DynamoDB
+WAITER_CONFIG = {"Delay": 2, "MaxAttempts": 60}
+
+# Tablas de DynamoDB (servidor_local.py crea las mismas)
+TABLES = {
+    "Anuncios": {
+        "KeySchema": [{"AttributeName": "id", "KeyType": "HASH"}],
+        "AttributeDefinitions": [{"AttributeName": "id", "AttributeType": "S"},
+                                 {"AttributeName": "particion_fecha", "AttributeType": "N"},
+                                 {"AttributeName": "fecha_creacion", "AttributeType": "S"}],
+        # GET /anuncios?order=recent: los anuncios de cada partición ordenados por fecha
+        # (ver PARTICIONES_FECHA en funciones_lambda/comun.py). Proyecta todos los atributos
+        # para que el listado no tenga que leer después cada anuncio de la tabla.
+        "GlobalSecondaryIndexes": [{
+            "IndexName": "PorFecha",
+            "KeySchema": [{"AttributeName": "particion_fecha", "KeyType": "HASH"},
+                          {"AttributeName": "fecha_creacion", "KeyType": "RANGE"}],
+            "Projection": {"ProjectionType": "ALL"},
+        }],
+    },
+    "Comentarios": {
+        "KeySchema": [{"AttributeName": "anuncio_id", "KeyType": "HASH"},
+                      {"AttributeName": "comentario_id", "KeyType": "RANGE"}],
+        "AttributeDefinitions": [{"AttributeName": "anuncio_id", "AttributeType": "S"},
+                                 {"AttributeName": "comentario_id", "AttributeType": "S"},
+                                 {"AttributeName": "usuario", "AttributeType": "S"},
+                                 {"AttributeName": "fecha", "AttributeType": "S"}],
+        # GET /usuarios/{usuario}/comentarios: los comentarios de un usuario ordenados por
+        # fecha, sin recorrer la tabla. Solo proyecta el mensaje (las claves van siempre):
+        # es lo que muestra el perfil y mantiene el índice pequeño.
+        "GlobalSecondaryIndexes": [{
+            "IndexName": "PorUsuario",
+            "KeySchema": [{"AttributeName": "usuario", "KeyType": "HASH"},
+                          {"AttributeName": "fecha", "KeyType": "RANGE"}],
+            "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": ["mensaje"]},
+        }],
+    },
+    # Índice invertido de la búsqueda: un término -> los anuncios que lo contienen
+    "IndiceAnuncios": {
+        "KeySchema": [{"AttributeName": "termino", "KeyType": "HASH"},
+                      {"AttributeName": "anuncio_id", "KeyType": "RANGE"}],
+        "AttributeDefinitions": [{"AttributeName": "termino", "AttributeType": "S"},
+                                 {"AttributeName": "anuncio_id", "AttributeType": "S"}],
+    },
+}
+
+# Rutas de la API: (método, ruta, función, partes del evento, responde con statusCode y ETag).
+# Las partes del evento forman su plantilla de mapeo: path, body, querystring y headers.
+# servidor_local.py sirve estas mismas rutas.
+ROUTES = [
+    ("GET", "/anuncios", "listar_anuncios", ("body", "querystring"), False),
+    ("POST", "/anuncios", "crear_anuncio", ("body",), False),
+    ("GET", "/anuncios/export", "exportar_anuncios", ("querystring",), False),
+    ("GET", "/anuncios/search", "buscar_anuncios", ("querystring",), False),
+    ("POST", "/anuncios/batch", "crear_anuncios_lote", ("body",), False),
+    ("GET", "/anuncios/{id}", "ver_anuncio", ("path", "querystring", "headers"), True),
+    ("GET", "/anuncios/{id}/comentarios", "listar_comentarios", ("path", "querystring", "headers"), True),
+    ("POST", "/anuncios/{id}/comentarios", "crear_comentario", ("path", "body"), False),
+    ("GET", "/usuarios/{usuario}/comentarios", "listar_comentarios_usuario", ("path", "querystring"), False),
+]
+
+# Crear clientes AWS (API Gateway limita las llamadas de configuración por segundo:
+# con los pasos en paralelo conviene reintentar con espera adaptativa)
 iam_client = boto3.client("iam", region_name=AWS_REGION)
 lambda_client = boto3.client("lambda", region_name=AWS_REGION)
 dynamodb_client = boto3.client("dynamodb", region_name=AWS_REGION)
-apigateway_client = boto3.client("apigateway", region_name=AWS_REGION)
-sts_client = boto3.client('sts')
+apigateway_client = boto3.client(
+    "apigateway", region_name=AWS_REGION,
+    config=Config(retries={"mode": "adaptive", "max_attempts": 10}))
+apigatewayv2_client = boto3.client(
+    "apigatewayv2", region_name=AWS_REGION,
+    config=Config(retries={"mode": "adaptive", "max_attempts": 10}))
+sts_client = boto3.client('sts', region_name=AWS_REGION)
+
+_print_lock = threading.Lock()
+
+def print(*args, **kwargs):
+    """print() que no mezcla las líneas de los pasos que se ejecutan a la vez."""
+    with _print_lock:
+        builtins.print(*args, **kwargs)
+
+# 📌 Plan de cambios: cada paso compara lo desplegado con lo deseado y solo cambia lo distinto
+PLAN_ONLY = False          # --plan: mostrar los cambios sin aplicarlos
+PENDING = "(pendiente)"    # ID de lo que aún no existe, en el modo --plan
+_changes = []
 
-# Obtener ID de cuenta dinámicamente
-account_id = sts_client.get_caller_identity()['Account']
+def apply_change(symbol, description, action, api=False):
+    """
+    Anota un cambio del plan ('+' crear, '~' actualizar, '-' quitar) y lo aplica con
+    `action()`, salvo en el modo --plan. `api` marca los cambios que obligan a desplegar
+    de nuevo la etapa de API Gateway. Devuelve lo que devuelve `action` (o PENDING).
+    """
+    with _print_lock:
+        _changes.append((symbol, description, api))
+        builtins.print(f"   {symbol} {description}")
+    if PLAN_ONLY:
+        return PENDING
+    return action()
+
+# 📌 0️⃣ Planificador: ejecuta los pasos en paralelo respetando sus dependencias
+def run_steps(steps, max_workers=DEPLOY_CONCURRENCY):
+    """
+    Ejecuta los pasos del despliegue en un pool de hilos. `steps` es
+    {nombre: (dependencias, función)} o {nombre: (dependencias, función, después_de)}:
+    cada función empieza en cuanto terminan sus dependencias y recibe un dict con sus
+    resultados. Un resultado None o False es un fallo, y los pasos que dependen de uno
+    fallido no se ejecutan; los de `después_de` solo tienen que haber terminado.
+    Devuelve {nombre: resultado} de todos los pasos (None en los fallidos u omitidos).
+    """
+    results = {}
+    pending = dict(steps)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Lanzar los pasos listos y descartar los que ya no pueden ejecutarse
+            changed = True
+            while changed:
+                changed = False
+                for name, (deps, function, *after) in list(pending.items()):
+                    if any(dep in results and results[dep] in (None, False) for dep in deps):
+                        print(f"⚠️ Paso {name} omitido: ha fallado una de sus dependencias.")
+                        results[name] = None
+                    elif all(dep in results for dep in deps + tuple(*after)):
+                        running[pool.submit(function, {dep: results[dep] for dep in deps})] = name
+                    else:
+                        continue
+                    del pending[name]
+                    changed = True
+
+            if not running:
+                raise ValueError(f"Dependencias desconocidas o circulares en: {', '.join(sorted(pending))}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"❌ Error en el paso {name}: {e}")
+                    results[name] = None
+    return results
 
 # 📌 1️⃣ Crear Tablas en DynamoDB
-def create_dynamodb_table(table_name, key_schema, attribute_definitions):
+def create_dynamodb_table(table_name, definition):
     try:
-        print(f"🔹 Creando tabla {table_name}...")
-        response = dynamodb_client.create_table(
-            TableName=table_name,
-            KeySchema=key_schema,
-            AttributeDefinitions=attribute_definitions,
-            BillingMode="PAY_PER_REQUEST",
-        )
-        print(f"✅ Tabla {table_name} creada. Esperando hasta que esté activa...")
-        
-        # Esperar hasta que la tabla esté activa
-        waiter = dynamodb_client.get_waiter('table_exists')
-        waiter.wait(TableName=table_name)
-        
-        print(f"✅ Tabla {table_name} activa y lista para usar.")
-        return True
-    except dynamodb_client.exceptions.ResourceInUseException:
-        print(f"⚠️ Tabla {table_name} ya existe.")
+        try:
+            table = dynamodb_client.describe_table(TableName=table_name)["Table"]
+            existing = {index["IndexName"] for index in table.get("GlobalSecondaryIndexes", [])}
+            # Los índices nuevos de una tabla ya creada, de uno en uno (DynamoDB no admite más)
+            for index in definition.get("GlobalSecondaryIndexes", []):
+                if index["IndexName"] not in existing:
+                    apply_change("+", f"índice {index['IndexName']} de la tabla {table_name}",
+                                 lambda index=index: create_index(table_name, definition, index))
+            return True
+        except dynamodb_client.exceptions.ResourceNotFoundException:
+            pass
+
+        def create():
+            print(f"🔹 Creando tabla {table_name}...")
+            dynamodb_client.create_table(
+                TableName=table_name,
+                BillingMode="PAY_PER_REQUEST",
+                **definition
+            )
+            print(f"✅ Tabla {table_name} creada. Esperando hasta que esté activa...")
+
+            # Esperar hasta que la tabla esté activa
+            waiter = dynamodb_client.get_waiter('table_exists')
+            waiter.wait(TableName=table_name, WaiterConfig=WAITER_CONFIG)
+
+            print(f"✅ Tabla {table_name} activa y lista para usar.")
+
+        apply_change("+", f"tabla {table_name}", create)
         return True
     except Exception as e:
         print(f"❌ Error al crear tabla {table_name}: {e}")
         return False
 
-# Crear tablas y verificar creación exitosa
-tables_created = True
-tables_created &= create_dynamodb_table(
-    "Anuncios", 
-    [{"AttributeName": "id", "KeyType": "HASH"}], 
-    [{"AttributeName": "id", "AttributeType": "S"}]
-)
-tables_created &= create_dynamodb_table(
-    "Comentarios", 
-    [{"AttributeName": "anuncio_id", "KeyType": "HASH"}, {"AttributeName": "comentario_id", "KeyType": "RANGE"}], 
-    [{"AttributeName": "anuncio_id", "AttributeType": "S"}, {"AttributeName": "comentario_id", "AttributeType": "S"}]
-)
-
-if not tables_created:
-    print("❌ Error al crear tablas DynamoDB. Abortando despliegue.")
-    exit(1)
+def create_index(table_name, definition, index):
+    """Añade un índice secundario global a una tabla existente y espera a que esté activo."""
+    print(f"🔹 Creando índice {index['IndexName']} de {table_name} (DynamoDB lo rellena con los items existentes)...")
+    dynamodb_client.update_table(
+        TableName=table_name,
+        AttributeDefinitions=definition["AttributeDefinitions"],
+        GlobalSecondaryIndexUpdates=[{"Create": index}]
+    )
+    for _ in range(WAITER_CONFIG["MaxAttempts"]):
+        indexes = dynamodb_client.describe_table(TableName=table_name)["Table"].get("GlobalSecondaryIndexes", [])
+        if any(i["IndexName"] == index["IndexName"] and i["IndexStatus"] == "ACTIVE" for i in indexes):
+            print(f"✅ Índice {index['IndexName']} de {table_name} activo.")
+            return
+        time.sleep(WAITER_CONFIG["Delay"])
+    print(f"⚠️ El índice {index['IndexName']} de {table_name} sigue creándose; "
+          "las consultas que lo usan fallarán hasta que esté activo.")
 
 # 📌 2️⃣ Crear un Rol IAM para Lambda con manejo de errores mejorado
+ROLE_POLICIES = [
+    "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole",
+    "arn:aws:iam::aws:policy/AmazonDynamoDBReadOnlyAccess",
+    "arn:aws:iam::aws:policy/AmazonDynamoDBFullAccess"
+]
+
 def create_iam_role():
-    role_arn = None
     try:
         # Verificar si el rol ya existe
         try:
-            role = iam_client.get_role(RoleName=IAM_ROLE_NAME)
-            role_arn = role['Role']['Arn']
-            print(f"⚠️ Rol {IAM_ROLE_NAME} ya existe.")
+            role_arn = iam_client.get_role(RoleName=IAM_ROLE_NAME)['Role']['Arn']
+            attached = iam_client.list_attached_role_policies(RoleName=IAM_ROLE_NAME)['AttachedPolicies']
+            attached = {policy['PolicyArn'] for policy in attached}
         except iam_client.exceptions.NoSuchEntityException:
             # Crear el rol si no existe
-            assume_role_policy = {
-                "Version": "2012-10-17",
-                "Statement": [
-                    {
-                        "Effect": "Allow",
-                        "Principal": {"Service": "lambda.amazonaws.com"},
-                        "Action": "sts:AssumeRole",
-                    }
-                ],
-            }
-            
-            print(f"🔹 Creando rol IAM {IAM_ROLE_NAME}...")
-            response = iam_client.create_role(
-                RoleName=IAM_ROLE_NAME, 
-                AssumeRolePolicyDocument=json.dumps(assume_role_policy)
-            )
-            role_arn = response["Role"]["Arn"]
-            print(f"✅ Rol {IAM_ROLE_NAME} creado con ARN: {role_arn}")
-            
-            # Agregar tiempo para propagación de roles
-            print(f"⏳ Esperando 45 segundos para propagación del rol...")
-            time.sleep(45)
-        
-        # Añadir políticas necesarias
-        print("🔹 Asignando políticas básicas al rol...")
-        policies = [
-            "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole",
-            "arn:aws:iam::aws:policy/AmazonDynamoDBReadOnlyAccess",
-            "arn:aws:iam::aws:policy/AmazonDynamoDBFullAccess"
-        ]
-        
-        for policy in policies:
+            def create():
+                assume_role_policy = {
+                    "Version": "2012-10-17",
+                    "Statement": [
+                        {
+                            "Effect": "Allow",
+                            "Principal": {"Service": "lambda.amazonaws.com"},
+                            "Action": "sts:AssumeRole",
+                        }
+                    ],
+                }
+
+                print(f"🔹 Creando rol IAM {IAM_ROLE_NAME}...")
+                response = iam_client.create_role(
+                    RoleName=IAM_ROLE_NAME,
+                    AssumeRolePolicyDocument=json.dumps(assume_role_policy)
+                )
+                print(f"✅ Rol {IAM_ROLE_NAME} creado con ARN: {response['Role']['Arn']}")
+
+                # El rol existe para IAM; que Lambda pueda asumirlo se comprueba al crear
+                # cada función (ver create_function_when_role_ready)
+                iam_client.get_waiter('role_exists').wait(RoleName=IAM_ROLE_NAME, WaiterConfig=WAITER_CONFIG)
+                return response["Role"]["Arn"]
+
+            role_arn = apply_change("+", f"rol IAM {IAM_ROLE_NAME}", create)
+            attached = set()
+
+        # Añadir las políticas necesarias que falten
+        def attach(policy):
             try:
                 iam_client.attach_role_policy(RoleName=IAM_ROLE_NAME, PolicyArn=policy)
             except Exception as e:
                 print(f"⚠️ Error al adjuntar política {policy}: {e}")
-        
-        print("✅ Políticas adjuntadas al rol.")
-        
+
+        for policy in ROLE_POLICIES:
+            if policy not in attached:
+                apply_change("+", f"política {policy.rsplit('/', 1)[1]} del rol {IAM_ROLE_NAME}",
+                             lambda policy=policy: attach(policy))
+
         return role_arn
     except Exception as e:
         print(f"❌ Error al crear rol IAM: {e}")
         return None
 
-role_arn = create_iam_role()
-if not role_arn:
-    print("❌ Error al crear/obtener rol IAM. Abortando despliegue.")
-    exit(1)
+# 📌 3️⃣ Crear Funciones Lambda con manejo de errores mejorado
+def create_function_when_role_ready(**kwargs):
+    """
+    create_function reintentado mientras Lambda todavía no pueda asumir un rol recién
+    creado, con esperas crecientes y como mucho ROLE_PROPAGATION_TIMEOUT segundos.
+    """
+    deadline = time.monotonic() + ROLE_PROPAGATION_TIMEOUT
+    delay = 1
+    while True:
+        try:
+            return lambda_client.create_function(**kwargs)
+        except lambda_client.exceptions.InvalidParameterValueException as e:
+            if "cannot be assumed" not in str(e) or time.monotonic() + delay > deadline:
+                raise
+            print(f"⏳ El rol aún no se puede asumir desde {kwargs['FunctionName']}; reintentando en {delay} s...")
+            time.sleep(delay)
+            delay = min(delay * 2, 8)
 
-# 📌 3️⃣ Crear Funciones Lambda con manejo de errores mejorado - CORREGIDO PARA WINDOWS
-def create_lambda_function(function_name, lambda_code):
+def build_zip(lambda_code):
+    """
+    Zip del código en memoria, con los mismos bytes siempre que el código sea el mismo
+    (ficheros en orden, fecha y permisos fijos), para compararlo con el CodeSha256 de Lambda.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        for file_name in sorted(lambda_code):
+            info = zipfile.ZipInfo(file_name, date_time=(1980, 1, 1, 0, 0, 0))
+            info.external_attr = 0o644 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            z.writestr(info, lambda_code[file_name])
+    return buffer.getvalue()
+
+def code_sha256(zipped_code):
+    """El CodeSha256 que Lambda calcula de un zip: su SHA-256 en base64."""
+    return base64.b64encode(hashlib.sha256(zipped_code).digest()).decode("ascii")
+
+def resolve_environment(environment, current):
+    """
+    Variables de entorno que se despliegan. Sin CURSOR_SECRET en el entorno se mantiene
+    la clave de la función ya desplegada (o se genera una si es nueva): así un despliegue
+    sin cambios no toca la configuración ni invalida los cursores emitidos.
+    """
+    environment = dict(environment or {})
+    if "CURSOR_SECRET" in environment and not environment["CURSOR_SECRET"]:
+        deployed = (current or {}).get("Environment", {}).get("Variables", {})
+        environment["CURSOR_SECRET"] = deployed.get("CURSOR_SECRET") or secrets.token_urlsafe(32)
+    return environment
+
+def create_lambda_function(function_name, lambda_code, role_arn, account_id, profile):
     try:
-        print(f"🔹 Creando función Lambda {function_name}...")
-        
+        zipped_code = build_zip(lambda_code)
+
         # Verificar si la función ya existe
         try:
-            lambda_client.get_function(FunctionName=function_name)
-            print(f"⚠️ Función Lambda {function_name} ya existe. Actualizando código...")
-            
-            # Crear directorio temporal usando tempfile para compatibilidad multiplataforma
-            temp_dir = tempfile.gettempdir()
-            zip_file = os.path.join(temp_dir, f"{function_name}_{uuid.uuid4()}.zip")
-            
-            # Crear archivo ZIP
-            with zipfile.ZipFile(zip_file, "w") as z:
-                z.writestr("lambda_function.py", lambda_code)
-            
-            # Leer el archivo ZIP
-            with open(zip_file, "rb") as f:
-                zipped_code = f.read()
-            
-            # Actualizar la función Lambda
-            lambda_client.update_function_code(
-                FunctionName=function_name,
-                ZipFile=zipped_code
-            )
-            
-            # Limpiar archivo temporal
-            try:
-                os.remove(zip_file)
-            except Exception as e:
-                print(f"⚠️ No se pudo eliminar el archivo temporal {zip_file}: {e}")
-                
-            print(f"✅ Función Lambda {function_name} actualizada.")
-            
+            current = lambda_client.get_function_configuration(FunctionName=function_name)
         except lambda_client.exceptions.ResourceNotFoundException:
+            current = None
+        environment = resolve_environment(profile["environment"], current)
+        configuration = {
+            "Timeout": profile["timeout"],
+            "MemorySize": profile["memory"],
+            "EphemeralStorage": {"Size": profile["ephemeral_storage"]},
+            "Environment": {"Variables": environment},
+        }
+
+        if current is None:
             # Crear nueva función Lambda
-            temp_dir = tempfile.gettempdir()
-            zip_file = os.path.join(temp_dir, f"{function_name}_{uuid.uuid4()}.zip")
-            
-            # Crear archivo ZIP
-            with zipfile.ZipFile(zip_file, "w") as z:
-                z.writestr("lambda_function.py", lambda_code)
-            
-            # Leer el archivo ZIP
-            with open(zip_file, "rb") as f:
-                zipped_code = f.read()
-            
-            # Crear la función Lambda
-            lambda_client.create_function(
-                FunctionName=function_name,
-                Runtime="python3.12",
-                Role=role_arn,
-                Handler="lambda_function.lambda_handler",
-                Code={"ZipFile": zipped_code},
-                Timeout=10,
-                MemorySize=128,
-            )
-            
-            # Limpiar archivo temporal
-            try:
-                os.remove(zip_file)
-            except Exception as e:
-                print(f"⚠️ No se pudo eliminar el archivo temporal {zip_file}: {e}")
-                
-            print(f"✅ Función Lambda {function_name} creada.")
-            
-            # Esperar a que la función sea creada y esté lista
-            print(f"⏳ Esperando a que la función {function_name} esté lista...")
-            time.sleep(5)
-        
-        # Dar permiso a API Gateway para invocar Lambda
-        try:
-            lambda_client.add_permission(
-                FunctionName=function_name,
-                StatementId=f"apigateway-invoke-{function_name}-{int(time.time())}",
-                Action="lambda:InvokeFunction",
-                Principal="apigateway.amazonaws.com",
-                SourceArn=f"arn:aws:execute-api:{AWS_REGION}:{account_id}:*/*/*/*"
-            )
-            print(f"✅ Permisos de invocación añadidos a {function_name}.")
-        except lambda_client.exceptions.ResourceConflictException:
-            print(f"⚠️ Los permisos de invocación ya existen para {function_name}.")
-        
+            def create():
+                print(f"🔹 Creando función Lambda {function_name}...")
+                create_function_when_role_ready(
+                    FunctionName=function_name,
+                    Runtime=LAMBDA_RUNTIME,
+                    Role=role_arn,
+                    Handler="lambda_function.lambda_handler",
+                    Code={"ZipFile": zipped_code},
+                    Architectures=[profile["architecture"]],
+                    **configuration
+                )
+                print(f"✅ Función Lambda {function_name} creada.")
+
+                # Esperar a que la función esté activa (Pending -> Active)
+                print(f"⏳ Esperando a que la función {function_name} esté lista...")
+                lambda_client.get_waiter('function_active_v2').wait(FunctionName=function_name)
+
+            apply_change("+", f"función Lambda {function_name} ({profile['memory']} MB, {profile['architecture']})", create)
+            changed = True
+        else:
+            # Subir el código solo si el zip es distinto del desplegado (la arquitectura
+            # también se cambia al subir el código)
+            architecture = (current.get("Architectures") or ["x86_64"])[0]
+            code_changes = []
+            if current["CodeSha256"] != code_sha256(zipped_code):
+                code_changes.append("código")
+            if architecture != profile["architecture"]:
+                code_changes.append(f"arquitectura {architecture} -> {profile['architecture']}")
+            if code_changes:
+                def update_code():
+                    print(f"🔹 Actualizando código de {function_name}...")
+                    lambda_client.update_function_code(
+                        FunctionName=function_name,
+                        ZipFile=zipped_code,
+                        Architectures=[profile["architecture"]]
+                    )
+                    lambda_client.get_waiter('function_updated_v2').wait(FunctionName=function_name)
+                    print(f"✅ Código de {function_name} actualizado.")
+
+                apply_change("~", f"{' y '.join(code_changes)} de {function_name}", update_code)
+
+            # Y la configuración, solo si ha cambiado (de las variables se muestran los nombres)
+            changes = []
+            for name, label in (("Timeout", "Timeout"), ("MemorySize", "memoria")):
+                if current.get(name) != configuration[name]:
+                    changes.append(f"{label} {current.get(name)} -> {configuration[name]}")
+            storage = current.get("EphemeralStorage", {}).get("Size", 512)
+            if storage != profile["ephemeral_storage"]:
+                changes.append(f"/tmp {storage} -> {profile['ephemeral_storage']} MB")
+            deployed = current.get("Environment", {}).get("Variables", {})
+            changed_variables = sorted(name for name in set(deployed) | set(environment)
+                                       if deployed.get(name) != environment.get(name))
+            if changed_variables:
+                changes.append(f"variables {', '.join(changed_variables)}")
+            if changes:
+                def update_configuration():
+                    lambda_client.get_waiter('function_updated_v2').wait(FunctionName=function_name)
+                    lambda_client.update_function_configuration(FunctionName=function_name, **configuration)
+                    lambda_client.get_waiter('function_updated_v2').wait(FunctionName=function_name)
+                    print(f"✅ Configuración de {function_name} actualizada.")
+
+                apply_change("~", f"configuración de {function_name}: {'; '.join(changes)}", update_configuration)
+            changed = bool(code_changes or changes)
+
+        configure_concurrency(function_name, profile, current is not None, changed)
+        put_invoke_permission(function_name, account_id, current is not None)
+        if profile["provisioned_concurrency"]:
+            put_invoke_permission(function_name, account_id, current is not None, LIVE_ALIAS)
         return True
     except Exception as e:
         print(f"❌ Error al crear/actualizar función Lambda {function_name}: {e}")
         return False
 
-# Código de cada función Lambda
-lambda_functions = {
-    "listar_anuncios": '''
-import json
-import boto3
-
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Anuncios')
+def configure_concurrency(function_name, profile, exists, changed):
+    """
+    Concurrencia reservada y aprovisionada del perfil. La aprovisionada se configura sobre
+    el alias LIVE_ALIAS, que pasa a la versión recién publicada cuando cambian el código o
+    la configuración (Lambda prepara los entornos de la versión nueva antes de usarla).
+    """
+    reserved = profile["reserved_concurrency"]
+    current = lambda_client.get_function_concurrency(FunctionName=function_name) if exists else {}
+    current = current.get("ReservedConcurrentExecutions")
+    if current != reserved:
+        if reserved is None:
+            apply_change("-", f"concurrencia reservada de {function_name} ({current})",
+                         lambda: lambda_client.delete_function_concurrency(FunctionName=function_name))
+        else:
+            apply_change("~", f"concurrencia reservada de {function_name}: {current} -> {reserved}",
+                         lambda: lambda_client.put_function_concurrency(
+                             FunctionName=function_name, ReservedConcurrentExecutions=reserved))
 
-def lambda_handler(event, context):
-    response = table.scan()
-    return {
-        "statusCode": 200,
-        "body": json.dumps(response['Items'])
-    }
-''',
-    "ver_anuncio": '''
-import json
-import boto3
+    provisioned = profile["provisioned_concurrency"]
+    alias = None
+    if exists:
+        try:
+            alias = lambda_client.get_alias(FunctionName=function_name, Name=LIVE_ALIAS)
+        except lambda_client.exceptions.ResourceNotFoundException:
+            pass
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Anuncios')
+    if provisioned:
+        if alias is None or changed:
+            def publish():
+                version = lambda_client.publish_version(FunctionName=function_name)["Version"]
+                if alias is None:
+                    lambda_client.create_alias(FunctionName=function_name, Name=LIVE_ALIAS, FunctionVersion=version)
+                else:
+                    lambda_client.update_alias(FunctionName=function_name, Name=LIVE_ALIAS, FunctionVersion=version)
+                print(f"✅ Alias {LIVE_ALIAS} de {function_name} en la versión {version}.")
 
-def lambda_handler(event, context):
-    try:
-        # Verificar si 'pathParameters' está presente antes de acceder a 'id'
-        anuncio_id = event.get('pathParameters', {}).get('id')
-
-        if not anuncio_id:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "El ID del anuncio no fue proporcionado correctamente"})
-            }
-
-        # Buscar el anuncio en DynamoDB
-        response = table.get_item(Key={'id': anuncio_id})
-
-        # Si no existe, devolver un error 404
-        if 'Item' not in response:
-            return {
-                "statusCode": 404,
-                "body": json.dumps({"error": "Anuncio no encontrado"})
-            }
-
-        return {
-            "statusCode": 200,
-            "body": json.dumps(response['Item'])
-        }
+            apply_change("+" if alias is None else "~", f"versión publicada de {function_name} (alias {LIVE_ALIAS})", publish)
 
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
-''',
-    "crear_anuncio": '''
-import json
-import boto3
-import uuid
+    current = 0
+    if alias is not None:
+        try:
+            config = lambda_client.get_provisioned_concurrency_config(FunctionName=function_name, Qualifier=LIVE_ALIAS)
+            current = config["RequestedProvisionedConcurrentExecutions"]
+        except lambda_client.exceptions.ProvisionedConcurrencyConfigNotFoundException:
+            pass
+    if current != provisioned:
+        if provisioned:
+            apply_change("~", f"concurrencia aprovisionada de {function_name}: {current} -> {provisioned}",
+                         lambda: lambda_client.put_provisioned_concurrency_config(
+                             FunctionName=function_name, Qualifier=LIVE_ALIAS,
+                             ProvisionedConcurrentExecutions=provisioned))
+        else:
+            apply_change("-", f"concurrencia aprovisionada de {function_name} ({current})",
+                         lambda: lambda_client.delete_provisioned_concurrency_config(
+                             FunctionName=function_name, Qualifier=LIVE_ALIAS))
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Anuncios')
+def function_arn(account_id, function_name):
+    """ARN que invoca API Gateway: el alias LIVE_ALIAS si la función tiene concurrencia aprovisionada."""
+    arn = f"arn:aws:lambda:{AWS_REGION}:{account_id}:function:{function_name}"
+    return f"{arn}:{LIVE_ALIAS}" if lambda_profile(function_name)["provisioned_concurrency"] else arn
 
-def lambda_handler(event, context):
-    try:
-        # Revisar si el body ya es un diccionario o si es string JSON
-        if isinstance(event['body'], str):
-            data = json.loads(event['body'])  # Si es string, convertir a diccionario
-        else:
-            data = event['body']  # Si ya es diccionario, usarlo directamente
+# Permiso de API Gateway para invocar cada función, siempre con el mismo StatementId
+INVOKE_STATEMENT_ID = "apigateway-invoke"
 
-        # Crear anuncio con ID único
-        anuncio = {
-            'id': str(uuid.uuid4()),
-            'titulo': data.get('titulo', 'Sin título'),
-            'descripcion': data.get('descripcion', 'Sin descripción')
-        }
+def put_invoke_permission(function_name, account_id, exists, qualifier=None):
+    """
+    Da permiso a API Gateway para invocar la función (o su alias `qualifier`) si aún no lo
+    tiene, y quita los permisos repetidos (StatementId con fecha) de despliegues anteriores.
+    """
+    target = f"{function_name}:{qualifier}" if qualifier else function_name
+    extra = {"Qualifier": qualifier} if qualifier else {}
+    statement_ids = set()
+    if exists:
+        try:
+            policy = json.loads(lambda_client.get_policy(FunctionName=function_name, **extra)["Policy"])
+            statement_ids = {statement["Sid"] for statement in policy["Statement"]}
+        except lambda_client.exceptions.ResourceNotFoundException:
+            pass
 
-        # Guardar en DynamoDB
-        table.put_item(Item=anuncio)
+    if INVOKE_STATEMENT_ID not in statement_ids:
+        def add():
+            lambda_client.add_permission(
+                FunctionName=function_name,
+                StatementId=INVOKE_STATEMENT_ID,
+                Action="lambda:InvokeFunction",
+                Principal="apigateway.amazonaws.com",
+                SourceArn=f"arn:aws:execute-api:{AWS_REGION}:{account_id}:*/*/*/*",
+                **extra
+            )
+            print(f"✅ Permisos de invocación añadidos a {target}.")
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps(anuncio)
-        }
-    except Exception as e:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": str(e)})
-        }
-''',
-    "listar_comentarios": '''
-import json
-import boto3
+        apply_change("+", f"permiso de invocación de {target} para API Gateway", add)
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Comentarios')
+    for statement_id in sorted(statement_ids):
+        if statement_id.startswith(f"{INVOKE_STATEMENT_ID}-{function_name}-"):
+            apply_change("-", f"permiso repetido {statement_id} de {target}",
+                         lambda statement_id=statement_id: lambda_client.remove_permission(
+                             FunctionName=function_name, StatementId=statement_id, **extra))
 
-def lambda_handler(event, context):
-    try:
-        anuncio_id = event.get('pathParameters', {}).get('id')
-        
-        if not anuncio_id:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "El ID del anuncio no fue proporcionado correctamente"})
-            }
-        
-        response = table.query(
-            KeyConditionExpression='anuncio_id = :anuncio_id',
-            ExpressionAttributeValues={':anuncio_id': anuncio_id}
-        )
+# Código de cada función Lambda: se lee de LAMBDA_FOLDER y el handler se empaqueta
+# como lambda_function.py junto a los módulos compartidos.
+LAMBDA_NAMES = [
+    "listar_anuncios",
+    "ver_anuncio",
+    "crear_anuncio",
+    "listar_comentarios",
+    "crear_comentario",
+    "exportar_anuncios",
+    "crear_anuncios_lote",
+    "buscar_anuncios",
+    "listar_comentarios_usuario",
+]
+SHARED_MODULES = ["comun.py", "codec_json.py", "decodificador.py", "busqueda.py"]
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps(response.get('Items', []))
-        }
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
-''',
-    "crear_comentario": '''
-import json
-import boto3
-import uuid
-from datetime import datetime
+# Paquetes que se empaquetan junto al código: orjson hace que codec_json serialice las
+# respuestas unas 3 veces más rápido que el módulo json estándar. Se descargan con pip las
+# ruedas binarias de la arquitectura y la versión de Python de Lambda (no las de esta
+# máquina). LAMBDA_PACKAGES va separado por espacios; con LAMBDA_PACKAGES="" no se
+# empaqueta nada.
+LAMBDA_PACKAGES = os.environ.get("LAMBDA_PACKAGES", "orjson>=3.9,<4").split()
+PIP_PLATFORMS = {"arm64": "manylinux2014_aarch64", "x86_64": "manylinux2014_x86_64"}
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Comentarios')
+packages_lock = threading.Lock()
+packages_files = {}
 
-def lambda_handler(event, context):
-    try:
-        anuncio_id = event.get('pathParameters', {}).get('id')
-        if not anuncio_id:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "El ID del anuncio no fue proporcionado correctamente"})
-            }
-
-        body = event.get('body', {})
-        if isinstance(body, str):
-            data = json.loads(body)  # Si es string, convertir a diccionario
-        else:
-            data = body  # Si ya es diccionario, usarlo directamente
-
-        usuario = data.get('usuario')
-        mensaje = data.get('mensaje')
-        if not usuario or not mensaje:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "Faltan datos en la solicitud"})
-            }
-
-        comentario = {
-            'anuncio_id': anuncio_id,
-            'comentario_id': str(uuid.uuid4()),
-            'usuario': usuario,
-            'mensaje': mensaje,
-            'fecha': datetime.utcnow().isoformat()
-        }
+def read_lambda_packages(architecture):
+    """
+    Ficheros de LAMBDA_PACKAGES para `architecture`: {ruta en el zip: bytes}. Se descargan
+    una sola vez por arquitectura; si pip falla, las funciones se despliegan sin ellos
+    (codec_json usa entonces el módulo json estándar) y se avisa.
+    """
+    with packages_lock:
+        if architecture in packages_files:
+            return packages_files[architecture]
+        files = {}
+        if LAMBDA_PACKAGES:
+            folder = tempfile.mkdtemp(prefix=f"lambda-packages-{architecture}-")
+            try:
+                subprocess.run(
+                    [sys.executable, "-m", "pip", "download", "--quiet", "--no-deps", "--only-binary=:all:",
+                     "--platform", PIP_PLATFORMS[architecture], "--implementation", "cp",
+                     "--python-version", LAMBDA_RUNTIME.removeprefix("python"), "--dest", folder, *LAMBDA_PACKAGES],
+                    check=True, capture_output=True, text=True)
+                for wheel in sorted(os.listdir(folder)):
+                    if wheel.endswith(".whl"):
+                        with zipfile.ZipFile(os.path.join(folder, wheel)) as z:
+                            files.update({name: z.read(name) for name in z.namelist() if not name.endswith("/")})
+            except (subprocess.CalledProcessError, OSError, zipfile.BadZipFile) as e:
+                print(f"⚠️ No se pudieron descargar {' '.join(LAMBDA_PACKAGES)} para {architecture}; "
+                      f"se despliega sin ellos: {getattr(e, 'stderr', None) or e}")
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+        packages_files[architecture] = files
+        return files
 
-        #Guardar en DynamoDB
-        table.put_item(Item=comentario)
+def read_lambda_code(function_name, architecture=None):
+    """Código de la función y, si se indica su arquitectura, los LAMBDA_PACKAGES."""
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), LAMBDA_FOLDER)
+    files = {"lambda_function.py": f"{function_name}.py"}
+    files.update({module: module for module in SHARED_MODULES})
+    code = {}
+    for file_name, source in files.items():
+        with open(os.path.join(folder, source), encoding="utf-8") as f:
+            code[file_name] = f.read()
+    if architecture:
+        code.update(read_lambda_packages(architecture))
+    return code
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps(comentario)
-        }
+# 📌 Perfil de cada función Lambda, que deploy.py aplica tanto al crearla como al actualizarla:
+#   memory: MB de memoria; Lambda asigna la CPU en proporción (1769 MB = 1 vCPU)
+#   architecture: "arm64" (Graviton, más barata por ms) o "x86_64"
+#   timeout: segundos; API Gateway corta las peticiones a los 29
+#   ephemeral_storage: MB de /tmp (512 es lo incluido en el precio)
+#   reserved_concurrency: máximo de ejecuciones a la vez reservado para la función (None: sin reserva)
+#   provisioned_concurrency: entornos siempre iniciados, sin arranques en frío (0: ninguno).
+#       Con más de 0 se publica una versión, el alias LIVE_ALIAS apunta a ella y API
+#       Gateway invoca el alias. Se paga por hora aunque no haya tráfico.
+#   environment: variables de entorno
+DEFAULT_PROFILE = {
+    "memory": 128,
+    "architecture": "arm64",
+    "timeout": 10,
+    "ephemeral_storage": 512,
+    "reserved_concurrency": None,
+    "provisioned_concurrency": 0,
+    "environment": {},
+}
 
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
-'''
+# Las lecturas serializan mucho JSON y agradecen más CPU; las escrituras se quedan en lo mínimo
+LAMBDA_PROFILES = {
+    "listar_anuncios": {
+        "memory": 512,
+        "environment": {"CURSOR_SECRET": CURSOR_SECRET, "DYNAMODB_RUTA_RAPIDA": DYNAMODB_RUTA_RAPIDA},
+    },
+    "ver_anuncio": {
+        "memory": 256,
+        "environment": {"CACHE_TTL_SEGUNDOS": CACHE_TTL_SEGUNDOS, "CACHE_MAX_BYTES": CACHE_MAX_BYTES},
+    },
+    "listar_comentarios": {
+        "memory": 512,
+        "environment": {
+            "CACHE_TTL_SEGUNDOS": CACHE_TTL_SEGUNDOS,
+            "CACHE_MAX_BYTES": CACHE_MAX_BYTES,
+            "DYNAMODB_RUTA_RAPIDA": DYNAMODB_RUTA_RAPIDA,
+        },
+    },
+    "exportar_anuncios": {"memory": 1024, "timeout": 29, "environment": {"CURSOR_SECRET": CURSOR_SECRET}},
+    "crear_anuncios_lote": {"memory": 256, "timeout": 29},
+    # Cruza en memoria las entradas de los términos, que pueden ser miles
+    "buscar_anuncios": {"memory": 512},
+    "listar_comentarios_usuario": {"environment": {"CURSOR_SECRET": CURSOR_SECRET}},
 }
 
-# Crear cada función Lambda
-all_lambdas_created = True
-for function_name, code in lambda_functions.items():
-    all_lambdas_created &= create_lambda_function(function_name, code)
+# Alias que invoca API Gateway en las funciones con concurrencia aprovisionada
+LIVE_ALIAS = "live"
 
-if not all_lambdas_created:
-    print("❌ Error al crear/actualizar algunas funciones Lambda. Continuando con precaución...")
+def lambda_profile(function_name):
+    return dict(DEFAULT_PROFILE, **LAMBDA_PROFILES.get(function_name, {}))
 
 # 📌 4️⃣ Crear API Gateway con manejo de errores mejorado
 def create_api_gateway():
     try:
         # Verificar si la API ya existe
-        apis = apigateway_client.get_rest_apis()
-        for api in apis.get('items', []):
-            if api['name'] == API_NAME:
-                print(f"⚠️ API Gateway {API_NAME} ya existe. Usando existente.")
-                return api['id']
+        for page in apigateway_client.get_paginator("get_rest_apis").paginate():
+            for api in page.get('items', []):
+                if api['name'] == API_NAME:
+                    configure_compression(api)
+                    return api['id']
 
         # Crear nueva API
-        print(f"🔹 Creando API Gateway {API_NAME}...")
-        response = apigateway_client.create_rest_api(
-            name=API_NAME, 
-            description="API para anuncios con comentarios", 
-            endpointConfiguration={"types": ["REGIONAL"]}
-        )
-        print(f"✅ API Gateway {API_NAME} creada con ID: {response['id']}")
-        return response["id"]
+        def create():
+            print(f"🔹 Creando API Gateway {API_NAME}...")
+            response = apigateway_client.create_rest_api(
+                name=API_NAME,
+                description="API para anuncios con comentarios",
+                endpointConfiguration={"types": ["REGIONAL"]},
+                **({"minimumCompressionSize": MINIMUM_COMPRESSION_SIZE} if MINIMUM_COMPRESSION_SIZE >= 0 else {})
+            )
+            print(f"✅ API Gateway {API_NAME} creada con ID: {response['id']}")
+            return response["id"]
+
+        return apply_change("+", f"API Gateway {API_NAME}", create, api=True)
     except Exception as e:
         print(f"❌ Error al crear API Gateway: {e}")
         return None
 
-api_id = create_api_gateway()
-if not api_id:
-    print("❌ Error al crear API Gateway. Abortando despliegue.")
-    exit(1)
-
-print(f"⏳ Esperando a que la API esté lista...")
-time.sleep(10)
-
-# Obtener el ID raíz de la API
-try:
-    api_resources = apigateway_client.get_resources(restApiId=api_id)
-    root_id = [res["id"] for res in api_resources["items"] if res["path"] == "/"][0]
-    print(f"✅ Recurso raíz de la API encontrado: {root_id}")
-except Exception as e:
-    print(f"❌ Error al obtener recurso raíz de la API: {e}")
-    exit(1)
+def configure_compression(api):
+    """Aplica MINIMUM_COMPRESSION_SIZE a una API ya existente si ha cambiado."""
+    actual = api.get('minimumCompressionSize')
+    deseado = MINIMUM_COMPRESSION_SIZE if MINIMUM_COMPRESSION_SIZE >= 0 else None
+    if actual == deseado:
+        return
+    apply_change("~", f"compresión de respuestas de {API_NAME} ({actual} -> {deseado})", lambda: apigateway_client.update_rest_api(
+        restApiId=api['id'],
+        patchOperations=[{
+            "op": "replace",
+            "path": "/minimumCompressionSize",
+            # Un valor vacío desactiva la compresión
+            "value": "" if deseado is None else str(deseado)
+        }]
+    ), api=True)
 
-def create_resource(parent_id, path_part):
-    try:
-        # Verificar si el recurso ya existe
-        resources = apigateway_client.get_resources(restApiId=api_id)
-        for resource in resources['items']:
-            if resource.get('parentId') == parent_id and resource.get('pathPart') == path_part:
-                print(f"⚠️ Recurso /{path_part} ya existe. Usando existente.")
-                return resource['id']
-        
-        # Crear nuevo recurso
-        print(f"🔹 Creando recurso /{path_part}...")
+def create_resource(api_id, parent_id, path):
+    def create():
+        print(f"🔹 Creando recurso {path}...")
         response = apigateway_client.create_resource(
-            restApiId=api_id, 
-            parentId=parent_id, 
-            pathPart=path_part
+            restApiId=api_id,
+            parentId=parent_id,
+            pathPart=path.rsplit("/", 1)[1]
         )
-        print(f"✅ Recurso /{path_part} creado con ID: {response['id']}")
+        print(f"✅ Recurso {path} creado con ID: {response['id']}")
         return response["id"]
+
+    try:
+        return apply_change("+", f"recurso {path}", create, api=True)
     except Exception as e:
-        print(f"❌ Error al crear recurso /{path_part}: {e}")
+        print(f"❌ Error al crear recurso {path}: {e}")
         return None
 
-# Crear recursos en API Gateway
-anuncios_id = create_resource(root_id, "anuncios")
-if not anuncios_id:
-    print("❌ Error al crear recurso /anuncios. Abortando despliegue.")
-    exit(1)
-
-anuncio_id = create_resource(anuncios_id, "{id}")
-if not anuncio_id:
-    print("❌ Error al crear recurso /anuncios/{id}. Abortando despliegue.")
-    exit(1)
+def create_resources(api_id, paths):
+    """
+    Lee una sola vez el árbol de recursos de la API, con sus métodos, y crea los que faltan.
+    Devuelve {ruta: recurso}: el id de cada recurso y los métodos que ya tiene configurados.
+    """
+    existing = {}
+    if api_id != PENDING:
+        try:
+            pages = apigateway_client.get_paginator("get_resources").paginate(restApiId=api_id, embed=["methods"])
+            existing = {resource["path"]: resource for page in pages for resource in page["items"]}
+        except Exception as e:
+            print(f"❌ Error al obtener los recursos de la API: {e}")
+            return None
 
-comentarios_id = create_resource(anuncio_id, "comentarios")
-if not comentarios_id:
-    print("❌ Error al crear recurso /anuncios/{id}/comentarios. Abortando despliegue.")
-    exit(1)
+    # Cada ruta y sus tramos intermedios, de los padres a los hijos
+    all_paths = {path[:i] for path in paths for i, char in enumerate(path + "/") if char == "/" and i}
+    resources = {"": existing.get("/", {"id": PENDING})}
+    for path in sorted(all_paths, key=lambda path: path.count("/")):
+        if path in existing:
+            resources[path] = existing[path]
+            continue
+        resource_id = create_resource(api_id, resources[path.rsplit("/", 1)[0]]["id"], path)
+        if not resource_id:
+            print(f"❌ Error al crear recurso {path}. Abortando la configuración de la API.")
+            return None
+        resources[path] = {"id": resource_id}
+    return resources
 
 # 📌 5️⃣ Configurar Métodos y Aplicar la Plantilla de Mapeo con manejo de errores mejorado
-def create_method(resource_id, method, function_name, request_template):
+# Plantilla de respuesta de los GET condicionales: en lugar de devolver tal cual el
+# {"statusCode", "headers", "body"} de la Lambda, usa su statusCode (200 o 304) y su
+# cabecera ETag como los de la respuesta HTTP y devuelve solo el body
+CONDITIONAL_RESPONSE_TEMPLATE = '''#set($respuesta = $input.path('$'))
+#set($context.responseOverride.status = $respuesta.statusCode)
+#if($respuesta.headers.ETag)
+#set($context.responseOverride.header.ETag = $respuesta.headers.ETag)
+#end
+$respuesta.body'''
+
+def put_conditional_responses(api_id, resource_id, method):
+    """Declara las respuestas 200 y 304 con cabecera ETag de un GET condicional."""
+    for status_code in ("200", "304"):
+        try:
+            apigateway_client.put_method_response(
+                restApiId=api_id,
+                resourceId=resource_id,
+                httpMethod=method,
+                statusCode=status_code,
+                responseParameters={"method.response.header.ETag": False},
+                responseModels={"application/json": "Empty"}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConflictException':
+                raise e
+            # Ya existe: asegurarse de que declara la cabecera ETag
+            apigateway_client.update_method_response(
+                restApiId=api_id,
+                resourceId=resource_id,
+                httpMethod=method,
+                statusCode=status_code,
+                patchOperations=[{"op": "add", "path": "/responseParameters/method.response.header.ETag", "value": "false"}]
+            )
+
+def conditional_responses_ready(existing, response_template):
+    """Si un método ya desplegado tiene las respuestas 200/304 con ETag y la plantilla condicional."""
+    responses = existing.get("methodResponses") or {}
+    if any("method.response.header.ETag" not in (responses.get(code, {}).get("responseParameters") or {})
+           for code in ("200", "304")):
+        return False
+    integration_responses = (existing.get("methodIntegration") or {}).get("integrationResponses") or {}
+    templates = integration_responses.get("200", {}).get("responseTemplates") or {}
+    return (templates.get("application/json") or "") == response_template
+
+def create_method(api_id, account_id, path, resource, method, function_name, request_template, conditional=False):
     """
     Crea un método HTTP en API Gateway, lo asocia con una función Lambda
     y aplica una plantilla de asignación para el request.
+    Con conditional=True la respuesta lleva el statusCode y el ETag de la Lambda
+    (para responder 304 a If-None-Match).
+    Si el método ya existe, solo actualiza lo que haya cambiado.
     """
+    resource_id = resource["id"]
+    response_template = CONDITIONAL_RESPONSE_TEMPLATE if conditional else ""
+    integration_uri = (f"arn:aws:apigateway:{AWS_REGION}:lambda:path/2015-03-31/functions/"
+                       f"{function_arn(account_id, function_name)}/invocations")
+    # Parámetros que forman la clave de la caché de la etapa (los de ruta, obligatorios)
+    cache_keys = [f"method.request.{key}" for key in CACHED_ROUTES.get((method, path), (0, []))[1]]
+    request_parameters = {key: key.startswith("method.request.path.") for key in cache_keys}
+    existing = (resource.get("resourceMethods") or {}).get(method)
     try:
-        # Verificar si el método ya existe
-        try:
-            apigateway_client.get_method(
+        if existing is not None:
+            integration = existing.get("methodIntegration") or {}
+            missing = [key for key in cache_keys if key not in (integration.get("cacheKeyParameters") or [])]
+            if missing:
+                def update_cache_keys():
+                    declared = existing.get("requestParameters") or {}
+                    undeclared = [key for key in missing if key not in declared]
+                    if undeclared:
+                        apigateway_client.update_method(
+                            restApiId=api_id,
+                            resourceId=resource_id,
+                            httpMethod=method,
+                            patchOperations=[{"op": "add", "path": f"/requestParameters/{key}",
+                                              "value": str(request_parameters[key]).lower()}
+                                             for key in undeclared]
+                        )
+                    apigateway_client.update_integration(
+                        restApiId=api_id,
+                        resourceId=resource_id,
+                        httpMethod=method,
+                        patchOperations=[{"op": "add", "path": f"/cacheKeyParameters/{key}"} for key in missing]
+                    )
+
+                apply_change("~", f"clave de caché de {method} {path} (+{', '.join(missing)})",
+                             update_cache_keys, api=True)
+            # La función o su alias (al activar o quitar la concurrencia aprovisionada)
+            if integration.get("uri") != integration_uri:
+                apply_change("~", f"integración de {method} {path} -> {function_arn(account_id, function_name)}",
+                             lambda: apigateway_client.update_integration(
+                                 restApiId=api_id,
+                                 resourceId=resource_id,
+                                 httpMethod=method,
+                                 patchOperations=[{"op": "replace", "path": "/uri", "value": integration_uri}]
+                             ), api=True)
+            if (integration.get("requestTemplates") or {}).get("application/json") != request_template:
+                apply_change("~", f"plantilla de mapeo de {method} {path}", lambda: apigateway_client.update_integration(
+                    restApiId=api_id,
+                    resourceId=resource_id,
+                    httpMethod=method,
+                    patchOperations=[{
+                        "op": "replace",
+                        "path": "/requestTemplates/application~1json",
+                        "value": request_template
+                    }]
+                ), api=True)
+
+            if conditional and not conditional_responses_ready(existing, response_template):
+                def update_responses():
+                    put_conditional_responses(api_id, resource_id, method)
+                    apigateway_client.update_integration_response(
+                        restApiId=api_id,
+                        resourceId=resource_id,
+                        httpMethod=method,
+                        statusCode="200",
+                        patchOperations=[{
+                            "op": "replace",
+                            "path": "/responseTemplates/application~1json",
+                            "value": response_template
+                        }]
+                    )
+
+                apply_change("~", f"respuestas con ETag de {method} {path}", update_responses, api=True)
+            return True
+
+        def create():
+            print(f"🔹 Creando método {method} {path}...")
+
+            # Crear método
+            apigateway_client.put_method(
                 restApiId=api_id,
                 resourceId=resource_id,
-                httpMethod=method
+                httpMethod=method,
+                authorizationType="NONE",
+                apiKeyRequired=False,
+                requestParameters=request_parameters
             )
-            print(f"⚠️ Método {method} ya existe en el recurso. Omitiendo creación.")
-            return True
-        except ClientError as e:
-            if e.response['Error']['Code'] != 'NotFoundException':
-                raise e
-        
-        print(f"🔹 Creando método {method}...")
-        
-        # Crear método
+
+            # Crear integración con Lambda
+            apigateway_client.put_integration(
+                restApiId=api_id,
+                resourceId=resource_id,
+                httpMethod=method,
+                type="AWS",
+                integrationHttpMethod="POST",
+                uri=integration_uri,
+                requestTemplates={"application/json": request_template},
+                cacheKeyParameters=cache_keys
+            )
+
+            # Configurar respuesta del método
+            if conditional:
+                put_conditional_responses(api_id, resource_id, method)
+            else:
+                apigateway_client.put_method_response(
+                    restApiId=api_id,
+                    resourceId=resource_id,
+                    httpMethod=method,
+                    statusCode="200",
+                    responseModels={"application/json": "Empty"}
+                )
+
+            # Configurar respuesta de la integración (con la plantilla vacía, la respuesta pasa sin cambios)
+            apigateway_client.put_integration_response(
+                restApiId=api_id,
+                resourceId=resource_id,
+                httpMethod=method,
+                statusCode="200",
+                responseTemplates={"application/json": response_template}
+            )
+
+            print(f"✅ Método {method} {path} creado y configurado correctamente.")
+
+        apply_change("+", f"método {method} {path} -> {function_name}", create, api=True)
+        return True
+    except Exception as e:
+        print(f"❌ Error al crear método {method} {path}: {e}")
+        return False
+
+def create_cors_method(api_id, path, resource):
+    """Método OPTIONS (MOCK) de CORS de un recurso, para el acceso desde navegadores."""
+    if "OPTIONS" in (resource.get("resourceMethods") or {}):
+        return True
+    resource_id = resource["id"]
+
+    def create():
+        # Crear método OPTIONS para CORS
         apigateway_client.put_method(
             restApiId=api_id,
             resourceId=resource_id,
-            httpMethod=method,
-            authorizationType="NONE",
-            apiKeyRequired=False
+            httpMethod="OPTIONS",
+            authorizationType="NONE"
         )
-        
-        # Crear integración con Lambda
-        lambda_arn = f"arn:aws:lambda:{AWS_REGION}:{account_id}:function:{function_name}"
-        
-        apigateway_client.put_integration(
-            restApiId=api_id,
-            resourceId=resource_id,
-            httpMethod=method,
-            type="AWS",
-            integrationHttpMethod="POST",
-            uri=f"arn:aws:apigateway:{AWS_REGION}:lambda:path/2015-03-31/functions/{lambda_arn}/invocations",
-            requestTemplates={"application/json": request_template}
-        )
-        
-        # Configurar respuesta del método
+
         apigateway_client.put_method_response(
             restApiId=api_id,
             resourceId=resource_id,
-            httpMethod=method,
+            httpMethod="OPTIONS",
             statusCode="200",
+            responseParameters={
+                "method.response.header.Access-Control-Allow-Origin": True,
+                "method.response.header.Access-Control-Allow-Methods": True,
+                "method.response.header.Access-Control-Allow-Headers": True
+            },
             responseModels={"application/json": "Empty"}
         )
-        
-        # Configurar respuesta de la integración
+
+        apigateway_client.put_integration(
+            restApiId=api_id,
+            resourceId=resource_id,
+            httpMethod="OPTIONS",
+            type="MOCK",
+            requestTemplates={"application/json": '{"statusCode": 200}'}
+        )
+
         apigateway_client.put_integration_response(
             restApiId=api_id,
             resourceId=resource_id,
-            httpMethod=method,
+            httpMethod="OPTIONS",
             statusCode="200",
-            responseTemplates={"application/json": ""}  # Plantilla vacía para no modificar la respuesta
+            responseParameters={
+                "method.response.header.Access-Control-Allow-Origin": "'*'",
+                "method.response.header.Access-Control-Allow-Methods": "'GET,POST,OPTIONS'",
+                "method.response.header.Access-Control-Allow-Headers": "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'"
+            },
+            responseTemplates={"application/json": ""}
         )
-        
-        # Añadir CORS (importante para acceso desde navegadores)
-        try:
-            # Verificar si OPTIONS ya existe
+
+    try:
+        apply_change("+", f"CORS (OPTIONS) de {path}", create, api=True)
+    except Exception as e:
+        print(f"⚠️ Error al configurar CORS de {path}: {e}")
+    return True
+
+# Fragmento de plantilla que reenvía todos los parámetros de la query string.
+# $util.escapeJavaScript escapa el apóstrofo como \' (no es JSON válido): replaceAll lo deshace
+QUERYSTRING_TEMPLATE = '''"queryStringParameters": {
+#foreach($param in $input.params().querystring.keySet())
+"$param": "$util.escapeJavaScript($input.params().querystring.get($param)).replaceAll("\\\\'","'")"#if($foreach.hasNext),#end
+#end
+}'''
+
+# Fragmento de plantilla que reenvía las cabeceras de la petición
+HEADERS_TEMPLATE = '''"headers": {
+#foreach($header in $input.params().header.keySet())
+"$header": "$util.escapeJavaScript($input.params().header.get($header)).replaceAll("\\\\'","'")"#if($foreach.hasNext),#end
+#end
+}'''
+
+# Fragmento de plantilla de un parámetro de ruta: los valores, como {usuario}, son texto
+# libre y pueden traer comillas o barras, así que se escapan igual que la query string
+PATH_PARAMETER_TEMPLATE = '''"{name}": "$util.escapeJavaScript($input.params('{name}')).replaceAll("\\\\'","'")"'''
+
+def request_template(path, parts):
+    """Plantilla de mapeo del request con las partes del evento que usa la función."""
+    fragments = []
+    if "path" in parts:
+        names = [part[1:-1] for part in path.split("/") if part.startswith("{")]
+        fragments.append('"pathParameters": { ' + ", ".join(PATH_PARAMETER_TEMPLATE.format(name=name) for name in names) + ' }')
+    if "body" in parts:
+        fragments.append('"body": $input.json("$")')
+    if "querystring" in parts:
+        fragments.append(QUERYSTRING_TEMPLATE)
+    if "headers" in parts:
+        fragments.append(HEADERS_TEMPLATE)
+    return '{ ' + ', '.join(fragments) + ' }'
+
+# 📌 6️⃣ Implementar la API con manejo de errores
+def stage_cache_operations(stage):
+    """
+    Operaciones de update_stage que dejan la caché de la etapa como piden API_CACHE_SIZE
+    y CACHED_ROUTES: el resto de métodos, sin caché, y los clientes pueden pedir una
+    respuesta nueva con Cache-Control: max-age=0 sin necesidad de autorización.
+    """
+    enabled = bool(API_CACHE_SIZE)
+    operations = []
+    if bool(stage.get("cacheClusterEnabled")) != enabled:
+        operations.append(("/cacheClusterEnabled", str(enabled).lower()))
+    if enabled and stage.get("cacheClusterSize") != API_CACHE_SIZE:
+        operations.append(("/cacheClusterSize", API_CACHE_SIZE))
+
+    settings_paths = {
+        "cachingEnabled": "caching/enabled",
+        "cacheTtlInSeconds": "caching/ttlInSeconds",
+        "requireAuthorizationForCacheControl": "caching/requireAuthorizationForCacheControl",
+    }
+    desired = {"*/*": {"cachingEnabled": False}}
+    for (method, path), (ttl, _) in CACHED_ROUTES.items():
+        desired[f"{path.replace('/', '~1')}/{method}"] = {
+            "cachingEnabled": True,
+            "cacheTtlInSeconds": ttl,
+            "requireAuthorizationForCacheControl": False,
+        } if enabled else {"cachingEnabled": False}
+    current_settings = stage.get("methodSettings") or {}
+    for key, settings in desired.items():
+        current = current_settings.get(key)
+        # Sin caché, los métodos que nunca la tuvieron no necesitan ajustes
+        if current is None and not enabled:
+            continue
+        for name, value in settings.items():
+            if (current or {}).get(name) != value:
+                operations.append((f"/{key}/{settings_paths[name]}", str(value).lower()))
+    return operations
+
+def configure_stage_cache(api_id, stage):
+    operations = stage_cache_operations(stage)
+    if not operations:
+        return
+    description = (f"caché de la etapa 'prod' ({API_CACHE_SIZE} GB, {len(CACHED_ROUTES)} GET)" if API_CACHE_SIZE
+                   else "caché de la etapa 'prod' (desactivar)")
+    apply_change("~" if stage else "+", description, lambda: apigateway_client.update_stage(
+        restApiId=api_id,
+        stageName="prod",
+        patchOperations=[{"op": "replace", "path": path, "value": value} for path, value in operations]
+    ))
+
+def create_deployment(api_id):
+    """
+    Despliega la etapa 'prod' si ha cambiado algo de la API o si la etapa aún no existe,
+    y ajusta su caché.
+    """
+    try:
+        stage = {}
+        if api_id != PENDING:
             try:
-                apigateway_client.get_method(
-                    restApiId=api_id,
-                    resourceId=resource_id,
-                    httpMethod="OPTIONS"
-                )
-                print(f"⚠️ Método OPTIONS ya existe para este recurso.")
+                stage = apigateway_client.get_stage(restApiId=api_id, stageName="prod")
             except ClientError as e:
-                if e.response['Error']['Code'] == 'NotFoundException':
-                    # Crear método OPTIONS para CORS
-                    apigateway_client.put_method(
-                        restApiId=api_id,
-                        resourceId=resource_id,
-                        httpMethod="OPTIONS",
-                        authorizationType="NONE"
-                    )
-                    
-                    apigateway_client.put_method_response(
-                        restApiId=api_id,
-                        resourceId=resource_id,
-                        httpMethod="OPTIONS",
-                        statusCode="200",
-                        responseParameters={
-                            "method.response.header.Access-Control-Allow-Origin": True,
-                            "method.response.header.Access-Control-Allow-Methods": True,
-                            "method.response.header.Access-Control-Allow-Headers": True
-                        },
-                        responseModels={"application/json": "Empty"}
-                    )
-                    
-                    apigateway_client.put_integration(
-                        restApiId=api_id,
-                        resourceId=resource_id,
-                        httpMethod="OPTIONS",
-                        type="MOCK",
-                        requestTemplates={"application/json": '{"statusCode": 200}'}
-                    )
-                    
-                    apigateway_client.put_integration_response(
-                        restApiId=api_id,
-                        resourceId=resource_id,
-                        httpMethod="OPTIONS",
-                        statusCode="200",
-                        responseParameters={
-                            "method.response.header.Access-Control-Allow-Origin": "'*'",
-                            "method.response.header.Access-Control-Allow-Methods": "'GET,POST,OPTIONS'",
-                            "method.response.header.Access-Control-Allow-Headers": "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'"
-                        },
-                        responseTemplates={"application/json": ""}
-                    )
-                else:
+                if e.response['Error']['Code'] != 'NotFoundException':
                     raise e
-            
-        except Exception as e:
-            print(f"⚠️ Error al configurar CORS para {method}: {e}")
-        
-        print(f"✅ Método {method} creado y configurado correctamente.")
+        if stage and not any(api for _, _, api in _changes):
+            configure_stage_cache(api_id, stage)
+            return True
+
+        def deploy():
+            print("🔹 Desplegando API en la etapa 'prod'...")
+            deployment = apigateway_client.create_deployment(
+                restApiId=api_id,
+                stageName="prod",
+                description="API de anuncios con comentarios"
+            )
+            print(f"✅ API desplegada en la etapa 'prod' con ID de despliegue: {deployment['id']}")
+
+        apply_change("+", "despliegue de la etapa 'prod'", deploy)
+        configure_stage_cache(api_id, stage)
         return True
     except Exception as e:
-        print(f"❌ Error al crear método {method}: {e}")
+        print(f"❌ Error al desplegar la API: {e}")
         return False
 
-# Configurar métodos y plantillas - con control de errores
-all_methods_created = True
-
-# Para /anuncios
-all_methods_created &= create_method(
-    anuncios_id, 
-    "GET", 
-    "listar_anuncios", 
-    '{ "body": $input.json("$") }'
-)
-all_methods_created &= create_method(
-    anuncios_id, 
-    "POST", 
-    "crear_anuncio", 
-    '{ "body": $input.json("$") }'
-)
-
-# Para /anuncios/{id}
-all_methods_created &= create_method(
-    anuncio_id, 
-    "GET", 
-    "ver_anuncio", 
-    '{ "pathParameters": { "id": "$input.params(\'id\')" } }'
-)
-
-# Para /anuncios/{id}/comentarios
-all_methods_created &= create_method(
-    comentarios_id, 
-    "GET", 
-    "listar_comentarios", 
-    '{ "pathParameters": { "id": "$input.params(\'id\')" } }'
-)
-all_methods_created &= create_method(
-    comentarios_id, 
-    "POST", 
-    "crear_comentario", 
-    '{ "pathParameters": { "id": "$input.params(\'id\')" }, "body": $input.json("$") }'
-)
-
-if not all_methods_created:
-    print("⚠️ Algunos métodos no se pudieron crear correctamente. Continuando con precaución...")
+# 📌 4️⃣-6️⃣ Alternativa: HTTP API con integración proxy (payload 2.0)
+# Cada ruta llega a su función con el evento de la petición tal cual y la respuesta de
+# la función (statusCode, headers y body) es la respuesta HTTP: no hay plantillas de
+# mapeo, los GET condicionales responden 304 sin plantilla propia y el CORS lo responde
+# la propia API. Las funciones aceptan los dos tipos de evento (comun.normalizar_evento).
+def create_http_api():
+    try:
+        for page in apigatewayv2_client.get_paginator("get_apis").paginate():
+            for api in page.get("Items", []):
+                if api["Name"] == API_NAME and api["ProtocolType"] == "HTTP":
+                    if api.get("CorsConfiguration") != HTTP_API_CORS:
+                        apply_change("~", f"CORS de la HTTP API {API_NAME}", lambda: apigatewayv2_client.update_api(
+                            ApiId=api["ApiId"], CorsConfiguration=HTTP_API_CORS))
+                    return api["ApiId"]
 
-# 📌 6️⃣ Implementar la API con manejo de errores
-try:
-    print("🔹 Desplegando API en la etapa 'prod'...")
-    deployment = apigateway_client.create_deployment(
-        restApiId=api_id, 
-        stageName="prod", 
-        description="API de anuncios con comentarios"
-    )
-    print(f"✅ API desplegada en la etapa 'prod' con ID de despliegue: {deployment['id']}")
-except Exception as e:
-    print(f"❌ Error al desplegar la API: {e}")
-
-# Mostrar información final
-print("\n" + "="*50)
-print(" **Despliegue completado** ")
-print("="*50)
-print(f"📌 API_ID: {api_id}")
-print(f"📌 URL de la API: https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/")
-print("📌 Endpoints disponibles:")
-print(f"   - GET    https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios")
-print(f"   - POST   https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios")
-print(f"   - GET    https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios/{{id}}")
-print(f"   - GET    https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios/{{id}}/comentarios")
-print(f"   - POST   https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios/{{id}}/comentarios")
-print("="*50)
-print("Ejemplos de uso con curl:")
-print('Crear anuncio')
-print(f"curl -X POST \"https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios\" -H \"Content-Type: application/json\" -d \"{{\\\"titulo\\\": \\\"Prueba 1\\\", \\\"descripcion\\\": \\\"Esta es una descripción de prueba.\\\"}}\"")
-print('Obtener anuncios')
-print(f"curl -X GET \"https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios\"")
-print('Extraer anuncio por id de este')
-print(f"curl -X GET \"https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios/[ID_DEL_ANUNCIO]\"")
-print('Crear un comentario en un anuncio dado sgún su id')
-print(f"curl -X POST \"https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios/[ID_DEL_ANUNCIO]/comentarios\" -H \"Content-Type: application/json\" -d \"{{\\\"usuario\\\": \\\"pepe\\\", \\\"mensaje\\\": \\\"comentario de prueba de pepe\\\"}}\"")
-print('Extraer todos los comentarios de un anuncio según su id')
-print(f"curl -X GET \"https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod/anuncios/[ID_DEL_ANUNCIO]/comentarios\"")
+        def create():
+            print(f"🔹 Creando HTTP API {API_NAME}...")
+            response = apigatewayv2_client.create_api(
+                Name=API_NAME,
+                ProtocolType="HTTP",
+                Description="API para anuncios con comentarios",
+                CorsConfiguration=HTTP_API_CORS
+            )
+            print(f"✅ HTTP API {API_NAME} creada con ID: {response['ApiId']}")
+            return response["ApiId"]
+
+        return apply_change("+", f"HTTP API {API_NAME}", create)
+    except Exception as e:
+        print(f"❌ Error al crear la HTTP API: {e}")
+        return None
+
+def read_http_api(api_id):
+    """Lee una sola vez las integraciones y las rutas de la HTTP API: {"integrations": ..., "routes": ...}."""
+    if api_id == PENDING:
+        return {"integrations": [], "routes": {}}
+    try:
+        integrations = [integration
+                        for page in apigatewayv2_client.get_paginator("get_integrations").paginate(ApiId=api_id)
+                        for integration in page.get("Items", [])]
+        routes = {route["RouteKey"]: route
+                  for page in apigatewayv2_client.get_paginator("get_routes").paginate(ApiId=api_id)
+                  for route in page.get("Items", [])}
+        return {"integrations": integrations, "routes": routes}
+    except Exception as e:
+        print(f"❌ Error al leer la HTTP API: {e}")
+        return None
+
+def create_http_integration(api_id, existing, account_id, function_name):
+    """Integración proxy (payload 2.0) de una función; devuelve su ID."""
+    arn = f"arn:aws:lambda:{AWS_REGION}:{account_id}:function:{function_name}"
+    uri = function_arn(account_id, function_name)
+    try:
+        for integration in existing["integrations"]:
+            # La misma función, con o sin el alias de la concurrencia aprovisionada
+            if integration.get("IntegrationUri", "").split(f":{LIVE_ALIAS}")[0] != arn:
+                continue
+            if integration["IntegrationUri"] != uri or integration.get("PayloadFormatVersion") != "2.0":
+                apply_change("~", f"integración de {function_name} -> {uri}",
+                             lambda: apigatewayv2_client.update_integration(
+                                 ApiId=api_id,
+                                 IntegrationId=integration["IntegrationId"],
+                                 IntegrationUri=uri,
+                                 PayloadFormatVersion="2.0"
+                             ))
+            return integration["IntegrationId"]
+
+        def create():
+            response = apigatewayv2_client.create_integration(
+                ApiId=api_id,
+                IntegrationType="AWS_PROXY",
+                IntegrationMethod="POST",
+                IntegrationUri=uri,
+                PayloadFormatVersion="2.0"
+            )
+            print(f"✅ Integración de {function_name} creada.")
+            return response["IntegrationId"]
+
+        return apply_change("+", f"integración proxy de {function_name}", create)
+    except Exception as e:
+        print(f"❌ Error al crear la integración de {function_name}: {e}")
+        return None
+
+def create_http_route(api_id, existing, method, path, integration_id):
+    """Ruta "MÉTODO /ruta" de la HTTP API hacia su integración."""
+    route_key = f"{method} {path}"
+    target = f"integrations/{integration_id}"
+    try:
+        route = existing["routes"].get(route_key)
+        if route is None:
+            apply_change("+", f"ruta {route_key}", lambda: apigatewayv2_client.create_route(
+                ApiId=api_id, RouteKey=route_key, Target=target))
+        elif route.get("Target") != target:
+            apply_change("~", f"ruta {route_key} -> {target}", lambda: apigatewayv2_client.update_route(
+                ApiId=api_id, RouteId=route["RouteId"], Target=target))
+        return True
+    except Exception as e:
+        print(f"❌ Error al crear la ruta {route_key}: {e}")
+        return False
+
+def create_http_stage(api_id):
+    """Etapa 'prod' con despliegue automático: cada cambio de rutas o integraciones se publica solo."""
+    if API_CACHE_SIZE:
+        print("⚠️ La HTTP API no tiene caché de etapa: API_CACHE_SIZE no se aplica.")
+    try:
+        if api_id != PENDING:
+            try:
+                stage = apigatewayv2_client.get_stage(ApiId=api_id, StageName="prod")
+                if not stage.get("AutoDeploy"):
+                    apply_change("~", "despliegue automático de la etapa 'prod'", lambda: apigatewayv2_client.update_stage(
+                        ApiId=api_id, StageName="prod", AutoDeploy=True))
+                return True
+            except apigatewayv2_client.exceptions.NotFoundException:
+                pass
+
+        apply_change("+", "etapa 'prod' (despliegue automático)", lambda: apigatewayv2_client.create_stage(
+            ApiId=api_id, StageName="prod", AutoDeploy=True))
+        return True
+    except Exception as e:
+        print(f"❌ Error al crear la etapa 'prod': {e}")
+        return False
+
+def http_api_steps(account_id):
+    """Pasos propios de la HTTP API: la API, una integración por función y una ruta por entrada de ROUTES."""
+    steps = {
+        "api": ((), lambda results: create_http_api()),
+        "routes": (("api",), lambda results: read_http_api(results["api"])),
+    }
+    for function_name in sorted({route[2] for route in ROUTES}):
+        steps[f"integration:{function_name}"] = (
+            ("api", "routes", f"lambda:{function_name}"),
+            lambda results, f=function_name: create_http_integration(results["api"], results["routes"], account_id, f))
+    for method, path, function_name, *_ in ROUTES:
+        steps[f"route:{method} {path}"] = (
+            ("api", "routes", f"integration:{function_name}"),
+            lambda results, m=method, p=path, f=function_name: create_http_route(
+                results["api"], results["routes"], m, p, results[f"integration:{f}"]))
+    # Con el despliegue automático la etapa no tiene que esperar a las rutas
+    steps["deployment"] = (
+        ("api",) + tuple(f"table:{table_name}" for table_name in TABLES),
+        lambda results: create_http_stage(results["api"]))
+    return steps
+
+def rest_api_steps(account_id):
+    """Pasos propios de la API REST: recursos, métodos con sus plantillas, CORS y despliegue de la etapa."""
+    steps = {
+        "api": ((), lambda results: create_api_gateway()),
+        "resources": (("api",), lambda results: create_resources(results["api"], [route[1] for route in ROUTES])),
+    }
+    for method, path, function_name, parts, conditional in ROUTES:
+        steps[f"method:{method} {path}"] = (
+            ("api", "resources", f"lambda:{function_name}"),
+            lambda results, m=method, p=path, f=function_name, t=request_template(path, parts), c=conditional:
+                create_method(results["api"], account_id, p, results["resources"][p], m, f, t, c))
+    for path in sorted({route[1] for route in ROUTES}):
+        steps[f"cors:{path}"] = (("api", "resources"), lambda results, p=path: create_cors_method(
+            results["api"], p, results["resources"][p]))
+
+    # La etapa necesita la API y las tablas; los métodos solo tienen que haber terminado
+    # (si alguno falla, se despliega el resto, como antes)
+    steps["deployment"] = (
+        ("api", "resources") + tuple(f"table:{table_name}" for table_name in TABLES),
+        lambda results: create_deployment(results["api"]),
+        tuple(name for name in steps if name.startswith(("method:", "cors:"))))
+    return steps
+
+def deployment_steps(account_id, api_type="rest"):
+    """
+    Pasos del despliegue y sus dependencias: las tablas, el rol y la API se crean a
+    la vez; cada función, en cuanto está el rol; cada método (o ruta de la HTTP API),
+    en cuanto están su recurso y su función; y el despliegue de la etapa, al final.
+    """
+    steps = {"role": ((), lambda results: create_iam_role())}
+    for table_name, definition in TABLES.items():
+        steps[f"table:{table_name}"] = ((), lambda results, t=table_name, d=definition: create_dynamodb_table(t, d))
+
+    for function_name in LAMBDA_NAMES:
+        steps[f"lambda:{function_name}"] = (("role",), lambda results, f=function_name: create_lambda_function(
+            f, read_lambda_code(f, lambda_profile(f)["architecture"]), results["role"], account_id,
+            lambda_profile(f)))
+
+    steps.update(http_api_steps(account_id) if api_type == "http" else rest_api_steps(account_id))
+    return steps
+
+def print_summary(api_id, api_type="rest"):
+    # Mostrar información final
+    base_url = f"https://{api_id}.execute-api.{AWS_REGION}.amazonaws.com/prod"
+    print("\n" + "="*50)
+    print(" **Despliegue completado** ")
+    print("="*50)
+    print(f"📌 API_ID: {api_id}")
+    print(f"📌 URL de la API: {base_url}/")
+    print("📌 Endpoints disponibles:")
+    for method, path, *_ in ROUTES:
+        print(f"   - {method:<6} {base_url}{path}")
+    print("="*50)
+    print("Ejemplos de uso con curl:")
+    print('Crear anuncio')
+    print(f"curl -X POST \"{base_url}/anuncios\" -H \"Content-Type: application/json\" -d \"{{\\\"titulo\\\": \\\"Prueba 1\\\", \\\"descripcion\\\": \\\"Esta es una descripción de prueba.\\\"}}\"")
+    print('Crear varios anuncios en una sola petición')
+    print(f"curl -X POST \"{base_url}/anuncios/batch\" -H \"Content-Type: application/json\" -d \"[{{\\\"titulo\\\": \\\"Prueba 1\\\"}}, {{\\\"titulo\\\": \\\"Prueba 2\\\"}}]\"")
+    print('Obtener anuncios')
+    print(f"curl -X GET \"{base_url}/anuncios\"")
+    print('Obtener solo el id y el título de los anuncios')
+    print(f"curl -X GET \"{base_url}/anuncios?fields=id,titulo\"")
+    print('Obtener varios anuncios por su id')
+    print(f"curl -X GET \"{base_url}/anuncios?ids=[ID_1],[ID_2]\"")
+    print('Obtener los anuncios más recientes primero')
+    print(f"curl -X GET \"{base_url}/anuncios?order=recent&limit=20\"")
+    print('Obtener la siguiente página de anuncios (usar el next_cursor de la respuesta anterior)')
+    print(f"curl -X GET \"{base_url}/anuncios?limit=20&cursor=[NEXT_CURSOR]\"")
+    print('Buscar anuncios por palabras (sin distinguir tildes ni mayúsculas)')
+    print(f"curl -G \"{base_url}/anuncios/search\" --data-urlencode \"q=bicicleta montaña\"")
+    print('Exportar un segmento de anuncios con sus comentarios en NDJSON (si no cabe en una respuesta,')
+    print('repetir la petición con &cursor= y el valor de la cabecera X-Next-Cursor)')
+    print(f"curl -X GET \"{base_url}/anuncios/export?segment=0&total_segments=8&comentarios=true\"")
+    print('Extraer anuncio por id de este')
+    print(f"curl -X GET \"{base_url}/anuncios/[ID_DEL_ANUNCIO]\"")
+    print('Extraer un anuncio junto con sus comentarios en una sola petición')
+    print(f"curl -X GET \"{base_url}/anuncios/[ID_DEL_ANUNCIO]?include=comentarios\"")
+    print('Volver a pedir un anuncio solo si ha cambiado (304 si el ETag coincide)')
+    print(f"curl -i -X GET \"{base_url}/anuncios/[ID_DEL_ANUNCIO]\" -H 'If-None-Match: [ETAG]'")
+    print('Crear un comentario en un anuncio dado sgún su id')
+    print(f"curl -X POST \"{base_url}/anuncios/[ID_DEL_ANUNCIO]/comentarios\" -H \"Content-Type: application/json\" -d \"{{\\\"usuario\\\": \\\"pepe\\\", \\\"mensaje\\\": \\\"comentario de prueba de pepe\\\"}}\"")
+    print('Extraer todos los comentarios de un anuncio según su id')
+    print(f"curl -X GET \"{base_url}/anuncios/[ID_DEL_ANUNCIO]/comentarios\"")
+    print('Extraer los comentarios de un usuario, los más recientes primero')
+    print(f"curl -X GET \"{base_url}/usuarios/pepe/comentarios?limit=20\"")
+    if api_type == "rest":
+        # La HTTP API no comprime las respuestas
+        print('Extraer los comentarios de un anuncio comprimidos con gzip')
+        print(f"curl --compressed -X GET \"{base_url}/anuncios/[ID_DEL_ANUNCIO]/comentarios\"")
+    print('Extraer los 20 comentarios más recientes de un anuncio')
+    print(f"curl -X GET \"{base_url}/anuncios/[ID_DEL_ANUNCIO]/comentarios?order=desc&limit=20\"")
+
+def main(argv=None):
+    global PLAN_ONLY
+    parser = argparse.ArgumentParser(description="Despliega la API de anuncios, aplicando solo lo que ha cambiado.")
+    parser.add_argument("--plan", action="store_true", help="mostrar los cambios pendientes sin aplicarlos")
+    parser.add_argument("--api", choices=["rest", "http"], default=API_TYPE,
+                        help="API REST con plantillas de mapeo o HTTP API con integración proxy (payload 2.0)")
+    args = parser.parse_args(argv)
+    PLAN_ONLY = args.plan
+    _changes.clear()
+
+    # Obtener ID de cuenta dinámicamente
+    account_id = sts_client.get_caller_identity()['Account']
+
+    start = time.perf_counter()
+    print("🔹 Comparando lo desplegado con el código y la configuración locales...")
+    results = run_steps(deployment_steps(account_id, args.api))
+
+    if PLAN_ONLY:
+        print(f"📌 Plan: {len(_changes)} cambios." if _changes else "✅ Sin cambios: todo está al día.")
+        return
+
+    failed = [name for name, result in results.items() if result in (None, False)]
+    if not results["api"] or not results["deployment"]:
+        print(f"❌ Despliegue incompleto. Pasos fallidos u omitidos: {', '.join(failed)}")
+        exit(1)
+    if failed:
+        print(f"⚠️ Algunos pasos no se completaron: {', '.join(failed)}. Continuando con precaución...")
+    if not _changes:
+        print("✅ Sin cambios: todo estaba al día.")
+    print(f"⏱️ Despliegue en {time.perf_counter() - start:.1f} s ({len(_changes)} cambios)")
+    print_summary(results["api"], args.api)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import comun
+import busqueda
+
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+MAXIMO_TERMINOS = 8             # términos por búsqueda
+MAXIMO_ENTRADAS = 10000         # entradas leídas como máximo de la partición de un término
+
+_pool = None
+
+
+def pool():
+    """Pool reutilizado entre invocaciones para consultar los términos a la vez."""
+    global _pool
+    if _pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _pool = ThreadPoolExecutor(max_workers=MAXIMO_TERMINOS)
+    return _pool
+
+
+def entradas_de(termino):
+    """
+    ({anuncio_id: peso}, hasta) de un término, recorriendo las páginas de su partición (en
+    otro hilo). Se leen como mucho MAXIMO_ENTRADAS: si el término tiene más, `hasta` es el
+    último anuncio_id leído y las entradas son solo las de los IDs hasta él (la partición
+    está ordenada por anuncio_id); si se ha leído entero, `hasta` es None.
+    """
+    kwargs = {
+        'KeyConditionExpression': 'termino = :termino',
+        'ExpressionAttributeValues': {':termino': termino},
+        'ProjectionExpression': 'anuncio_id, peso',
+    }
+    resultado = {}
+    while True:
+        # Sin Limit, una página de 1 MB puede traer muchas más de MAXIMO_ENTRADAS
+        response = comun.tabla(busqueda.TABLE_NAME).query(Limit=MAXIMO_ENTRADAS - len(resultado), **kwargs)
+        for entrada in response.get('Items', []):
+            resultado[entrada['anuncio_id']] = int(entrada['peso'])
+        if 'LastEvaluatedKey' not in response:
+            return resultado, None
+        if len(resultado) >= MAXIMO_ENTRADAS:
+            return resultado, response['LastEvaluatedKey']['anuncio_id']
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def leer_pesos(termino, ids):
+    """{anuncio_id: peso} de los `ids` que tienen entrada para el término, con BatchGetItem."""
+    encontrados = {}
+    for inicio in range(0, len(ids), comun.TAMANO_LOTE_LECTURA):
+        pendientes = {busqueda.TABLE_NAME: {
+            'Keys': [{'termino': termino, 'anuncio_id': i} for i in ids[inicio:inicio + comun.TAMANO_LOTE_LECTURA]],
+            'ProjectionExpression': 'anuncio_id, peso',
+        }}
+        for intento in range(comun.MAXIMO_REINTENTOS + 1):
+            if intento:
+                comun.esperar(intento)
+            response = comun.recurso().batch_get_item(RequestItems=pendientes)
+            for entrada in response.get('Responses', {}).get(busqueda.TABLE_NAME, []):
+                encontrados[entrada['anuncio_id']] = int(entrada['peso'])
+            pendientes = response.get('UnprocessedKeys')
+            if not pendientes:
+                break
+        else:
+            raise RuntimeError("DynamoDB no pudo procesar todas las claves solicitadas")
+    return encontrados
+
+
+def buscar(terminos):
+    """
+    IDs de los anuncios que contienen todos los términos, de mayor a menor suma de pesos,
+    sus puntuaciones y si el resultado está truncado. Las consultas de los términos van en
+    paralelo y los candidatos salen del término más raro leído entero; en los términos que
+    no se han leído enteros, los candidatos que quedan fuera de lo leído se comprueban con
+    BatchGetItem. Solo si todos los términos pasan de MAXIMO_ENTRADAS el resultado se limita
+    a los anuncios hasta el último ID leído del más raro, y queda truncado.
+    """
+    futuros = [pool().submit(comun.propagar(entradas_de), termino) for termino in terminos]
+    leidos = [(termino, *futuro.result()) for termino, futuro in zip(terminos, futuros)]
+    # Primero los leídos enteros, del más raro al más común; después, los que llegan más lejos
+    leidos.sort(key=lambda leido: (0, len(leido[1]), '') if leido[2] is None else (1, 0, leido[2]))
+    truncado = leidos[0][2] is not None
+    if truncado:
+        leidos.insert(0, leidos.pop())
+
+    puntuaciones = dict(leidos[0][1])
+    for termino, entradas, hasta in leidos[1:]:
+        # Los que faltan en lo leído solo pueden tener entrada más allá de `hasta`
+        dudosos = sorted(i for i in puntuaciones if i not in entradas and hasta is not None and i > hasta)
+        pesos = {i: entradas[i] for i in puntuaciones if i in entradas}
+        if dudosos:
+            pesos.update(leer_pesos(termino, dudosos))
+        puntuaciones = {i: puntuaciones[i] + peso for i, peso in pesos.items()}
+    return sorted(puntuaciones, key=lambda i: (-puntuaciones[i], i)), puntuaciones, truncado
+
+
+@comun.manejador
+def lambda_handler(event, context):
+    params = comun.parametros_query(event)
+    terminos = list(dict.fromkeys(busqueda.terminos(params.get('q'))))
+    if not terminos:
+        raise comun.ErrorHTTP(400, "El parámetro q debe contener al menos una palabra que buscar")
+    if len(terminos) > MAXIMO_TERMINOS:
+        raise comun.ErrorHTTP(400, f"Máximo {MAXIMO_TERMINOS} palabras por búsqueda")
+    limite = comun.entero(params, 'limit', LIMITE_POR_DEFECTO, LIMITE_MAXIMO)
+    campos = comun.campos_pedidos(params, comun.CAMPOS_ANUNCIOS)
+
+    ids, puntuaciones, truncado = buscar(terminos)
+    # Solo se leen de Anuncios los que se devuelven
+    encontrados = comun.leer_anuncios(ids[:limite], campos)
+    items = [dict(encontrados[i], puntuacion=puntuaciones[i]) for i in ids[:limite] if i in encontrados]
+    comun.metricas().items = len(items)
+
+    # Con truncado, total es solo un mínimo: hay más anuncios que coinciden
+    return comun.respuesta(200, {
+        "items": items,
+        "total": len(ids),
+        "truncado": truncado,
+        "terminos": terminos
+    })
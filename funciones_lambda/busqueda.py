@@ -0,0 +1,132 @@
+"""
+Índice invertido de los anuncios para la búsqueda por palabras: en la tabla
+IndiceAnuncios cada término normalizado es una partición con un item por anuncio
+que lo contiene ({'termino', 'anuncio_id', 'peso'}). crear_anuncio y
+crear_anuncios_lote lo mantienen al escribir y buscar_anuncios lo consulta, así
+que una búsqueda lee solo las entradas de sus términos, no la tabla Anuncios.
+
+Los anuncios anteriores al índice se indexan ejecutando este módulo:
+
+    python funciones_lambda/busqueda.py --segmentos 8
+"""
+import re
+import unicodedata
+import comun
+
+TABLE_NAME = 'IndiceAnuncios'
+
+TAMANO_LOTE = 25            # máximo de elementos por BatchWriteItem
+MAXIMO_TERMINOS = 50        # términos indexados por anuncio (los de más peso)
+LONGITUD_MAXIMA = 40        # los términos más largos no son palabras que se busquen
+PESO_TITULO = 3             # una palabra del título cuenta como tres de la descripción
+
+# Palabras demasiado frecuentes para distinguir un anuncio de otro (ya sin tildes)
+PALABRAS_VACIAS = frozenset('''
+    al como con de del el en es esta este esto la las le les lo los mas me mi muy no nos o
+    para pero por que se sin sobre su sus te tu un una unas uno unos y ya
+'''.split())
+
+_PALABRA = re.compile(r'[^\W_]+')
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes ni diéresis: 'Camión' y 'camion' son el mismo término (ñ -> n)."""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(caracter for caracter in descompuesto if not unicodedata.combining(caracter))
+
+
+def terminos(texto):
+    """Términos de un texto en orden, sin palabras vacías ni de una sola letra (ninguno si no es texto)."""
+    if not isinstance(texto, str):
+        return []
+    return [
+        palabra for palabra in _PALABRA.findall(normalizar(texto))
+        if 1 < len(palabra) <= LONGITUD_MAXIMA and palabra not in PALABRAS_VACIAS
+    ]
+
+
+def pesos(anuncio):
+    """{término: peso} de un anuncio: apariciones en la descripción más PESO_TITULO por cada una en el título."""
+    resultado = {}
+    for termino in terminos(anuncio.get('titulo')):
+        resultado[termino] = resultado.get(termino, 0) + PESO_TITULO
+    for termino in terminos(anuncio.get('descripcion')):
+        resultado[termino] = resultado.get(termino, 0) + 1
+    mayores = sorted(resultado.items(), key=lambda par: (-par[1], par[0]))[:MAXIMO_TERMINOS]
+    return dict(mayores)
+
+
+def entradas(anuncio):
+    """Items de IndiceAnuncios de un anuncio."""
+    return [{'termino': termino, 'anuncio_id': anuncio['id'], 'peso': peso}
+            for termino, peso in pesos(anuncio).items()]
+
+
+def escribir(anuncios):
+    """
+    Indexa los anuncios con BatchWriteItem en lotes de 25, reintentando los
+    UnprocessedItems. Devuelve los IDs de los anuncios que no quedaron indexados del todo.
+    """
+    pendientes = [{'PutRequest': {'Item': entrada}} for anuncio in anuncios for entrada in entradas(anuncio)]
+    fallidos = set()
+    for inicio in range(0, len(pendientes), TAMANO_LOTE):
+        lote = pendientes[inicio:inicio + TAMANO_LOTE]
+        for intento in range(comun.MAXIMO_REINTENTOS + 1):
+            if intento:
+                comun.esperar(intento)
+            response = comun.recurso().batch_write_item(RequestItems={TABLE_NAME: lote})
+            lote = response.get('UnprocessedItems', {}).get(TABLE_NAME, [])
+            if not lote:
+                break
+        fallidos |= {peticion['PutRequest']['Item']['anuncio_id'] for peticion in lote}
+    return fallidos
+
+
+def indexar(anuncios):
+    """
+    Indexa los anuncios recién escritos. El anuncio ya está guardado: si alguna entrada
+    no se puede escribir se avisa en el log en lugar de fallar la petición, y volver a
+    ejecutar este módulo lo corrige.
+    """
+    try:
+        fallidos = escribir(anuncios)
+    except Exception as e:
+        fallidos = {anuncio['id'] for anuncio in anuncios}
+        print(f"⚠️ Error al indexar para la búsqueda: {type(e).__name__}: {e}")
+    if fallidos:
+        print(f"⚠️ Índice de búsqueda incompleto para {len(fallidos)} anuncios: {', '.join(sorted(fallidos))}")
+    return fallidos
+
+
+def main(argv=None):
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+    parser = argparse.ArgumentParser(description="Indexa para la búsqueda todos los anuncios existentes.")
+    parser.add_argument('--segmentos', type=int, default=8, help="número de segmentos del escaneo paralelo")
+    args = parser.parse_args(argv)
+
+    def indexar_segmento(segmento):
+        kwargs = {
+            'Segment': segmento,
+            'TotalSegments': args.segmentos,
+            'ProjectionExpression': 'id, titulo, descripcion',
+        }
+        indexados = fallidos = 0
+        while True:
+            response = comun.tabla('Anuncios').scan(**kwargs)
+            anuncios = response.get('Items', [])
+            errores = escribir(anuncios)
+            indexados += len(anuncios) - len(errores)
+            fallidos += len(errores)
+            if 'LastEvaluatedKey' not in response:
+                return indexados, fallidos
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=args.segmentos) as pool:
+        resultados = list(pool.map(indexar_segmento, range(args.segmentos)))
+    print(f"✅ {sum(r[0] for r in resultados)} anuncios indexados"
+          + (f", ⚠️ {sum(r[1] for r in resultados)} con errores" if any(r[1] for r in resultados) else "."))
+
+
+if __name__ == '__main__':
+    main()
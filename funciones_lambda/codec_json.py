@@ -0,0 +1,44 @@
+"""
+Serialización JSON de las respuestas. Usa orjson si está disponible (por ejemplo,
+en una capa de Lambda) y, si no, el módulo json de la biblioteca estándar. En los
+dos casos los tipos que devuelve DynamoDB (Decimal, set, bytes/Binary) se
+convierten igual, y la salida es JSON compacto en UTF-8.
+"""
+import json
+import base64
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def convertir(valor):
+    """Conversión de los tipos que json/orjson no saben serializar por sí mismos."""
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    if isinstance(valor, (set, frozenset)):
+        # Los conjuntos de DynamoDB (SS, NS, BS) son homogéneos: se pueden ordenar
+        return sorted(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return base64.b64encode(valor).decode('ascii')
+    if isinstance(getattr(valor, 'value', None), (bytes, bytearray)):
+        # boto3.dynamodb.types.Binary
+        return base64.b64encode(valor.value).decode('ascii')
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def dumps_estandar(datos):
+    return json.dumps(datos, default=convertir, ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps(datos):
+    """Serializa `datos` a texto JSON."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(datos, default=convertir).decode()
+        except TypeError:
+            # Por ejemplo, enteros de más de 64 bits: el módulo estándar sí los admite
+            pass
+    return dumps_estandar(datos)
@@ -0,0 +1,656 @@
+"""
+Código compartido por todas las funciones Lambda: acceso a DynamoDB, lectura de
+la petición, formato de las respuestas y de los errores, métricas, cursores, ULID
+y la caché en memoria. deploy.py lo añade a cada zip junto a la función.
+
+Los módulos que no hacen falta en todas las peticiones se importan al usarlos,
+para que cada arranque en frío cargue solo lo imprescindible.
+"""
+import time
+
+# Momento en que empieza a cargarse el código de la función (arranque en frío)
+INICIO_IMPORTACION = time.perf_counter()
+
+import os
+import json
+import functools
+import threading
+import contextvars
+
+import codec_json
+
+# Ajustes del cliente de DynamoDB: conexiones persistentes, pool suficiente para los
+# hilos de cada función, timeouts cortos (Lambda tiene poco tiempo) y reintentos adaptativos.
+CONFIG_DYNAMODB = {
+    'connect_timeout': float(os.environ.get('DYNAMODB_CONNECT_TIMEOUT', '1')),
+    'read_timeout': float(os.environ.get('DYNAMODB_READ_TIMEOUT', '3')),
+    'max_pool_connections': 16,
+    'tcp_keepalive': True,
+    'retries': {'mode': 'adaptive', 'max_attempts': 4},
+}
+
+# Endpoint alternativo de DynamoDB (DynamoDB Local, moto_server); sin él, el de AWS
+ENDPOINT_DYNAMODB = os.environ.get('DYNAMODB_ENDPOINT_URL') or None
+
+# Ruta rápida de las lecturas grandes: cliente de bajo nivel y decodificador propio
+# (decodificador.py) en lugar del recurso de boto3 y su TypeDeserializer.
+RUTA_RAPIDA = os.environ.get('DYNAMODB_RUTA_RAPIDA', '0') == '1'
+
+# Espacio de nombres de las métricas de CloudWatch (formato EMF)
+NAMESPACE_METRICAS = os.environ.get('METRICAS_NAMESPACE', 'AnunciosAPI')
+
+# Operaciones de DynamoDB de las que se pide y se anota la capacidad consumida
+OPERACIONES_LECTURA = ('GetItem', 'Query', 'Scan', 'BatchGetItem', 'TransactGetItems')
+OPERACIONES_ESCRITURA = ('PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems')
+
+MAXIMO_REINTENTOS = 6
+ESPERA_BASE = 0.05          # segundos
+ESPERA_MAXIMA = 2.0
+
+_local = threading.local()
+_lock = threading.Lock()
+_almacen = None
+_cliente = None
+_arranque_en_frio = True
+# Métricas de la invocación en curso (las ven también los hilos lanzados con propagar())
+_metricas = contextvars.ContextVar('metricas', default=None)
+
+
+# 📌 Acceso a DynamoDB
+
+def configuracion():
+    from botocore.config import Config
+    return Config(**CONFIG_DYNAMODB)
+
+
+def usar_almacen(almacen):
+    """
+    Sustituye DynamoDB por un almacén local con la misma interfaz que el cliente y el
+    recurso de boto3 (lo usa servidor_local.py). Hay que llamarla antes de importar
+    los handlers, que obtienen sus tablas al cargarse.
+    """
+    global _almacen
+    _almacen = almacen
+    instrumentar(almacen)
+
+
+def _pedir_capacidad(params, **kwargs):
+    params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def _anotar_capacidad(parsed, model, **kwargs):
+    """Suma a la invocación en curso las RCU o WCU que devuelve DynamoDB."""
+    metricas = _metricas.get()
+    consumida = parsed.get('ConsumedCapacity')
+    if metricas is None or not consumida:
+        return
+    if isinstance(consumida, dict):
+        consumida = [consumida]
+    unidades = sum(parte.get('CapacityUnits', 0) for parte in consumida)
+    metricas.sumar('rcu' if model.name in OPERACIONES_LECTURA else 'wcu', unidades)
+
+
+def instrumentar(cliente):
+    """Pide ReturnConsumedCapacity='TOTAL' en todas las llamadas del cliente y anota lo consumido."""
+    for operacion in OPERACIONES_LECTURA + OPERACIONES_ESCRITURA:
+        cliente.meta.events.register(f'provide-client-params.dynamodb.{operacion}', _pedir_capacidad)
+        cliente.meta.events.register(f'after-call.dynamodb.{operacion}', _anotar_capacidad)
+    return cliente
+
+
+def cliente():
+    """Cliente de bajo nivel de DynamoDB (thread-safe), uno por contenedor."""
+    global _cliente
+    if _almacen is not None:
+        return _almacen.cliente
+    if _cliente is None:
+        with _lock:
+            if _cliente is None:
+                import boto3
+                _cliente = instrumentar(boto3.session.Session().client(
+                    'dynamodb', config=configuracion(), endpoint_url=ENDPOINT_DYNAMODB))
+    return _cliente
+
+
+def recurso():
+    """Recurso DynamoDB del hilo actual: los recursos de boto3 no son thread-safe."""
+    if _almacen is not None:
+        return _almacen.recurso
+    if getattr(_local, 'recurso', None) is None:
+        import boto3
+        _local.recurso = boto3.session.Session().resource(
+            'dynamodb', config=configuracion(), endpoint_url=ENDPOINT_DYNAMODB)
+        instrumentar(_local.recurso.meta.client)
+    return _local.recurso
+
+
+def tabla(nombre):
+    """Tabla del recurso del hilo actual, reutilizada entre invocaciones."""
+    tablas = _local.__dict__.setdefault('tablas', {})
+    if nombre not in tablas:
+        tablas[nombre] = recurso().Table(nombre)
+    return tablas[nombre]
+
+
+def esperar(intento):
+    """Backoff exponencial con jitter completo entre reintentos."""
+    import random
+    time.sleep(random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * (2 ** intento))))
+
+
+# 📌 Peticiones y respuestas
+
+class ErrorHTTP(Exception):
+    """Error que se devuelve al cliente con su código de estado y su mensaje."""
+
+    def __init__(self, status, mensaje):
+        super().__init__(mensaje)
+        self.status = status
+        self.mensaje = mensaje
+
+
+def serializar(datos):
+    """
+    JSON de una respuesta, de una vez: Lambda necesita el body entero como un solo texto,
+    así que serializarlo por partes no reduce el pico de memoria.
+    """
+    return codec_json.dumps(datos)
+
+
+def respuesta(status, datos, headers=None):
+    return respuesta_serializada(status, serializar(datos), headers)
+
+
+def respuesta_serializada(status, body, headers=None):
+    """Respuesta con un body ya convertido a texto (por ejemplo, leído de la caché)."""
+    resultado = {"statusCode": status, "body": body}
+    if headers:
+        resultado["headers"] = headers
+    return resultado
+
+
+def error(status, mensaje):
+    return respuesta(status, {"error": mensaje})
+
+
+def leer_body(event):
+    """Devuelve el body como dict o lista, venga ya convertido o como string JSON."""
+    body = event.get('body')
+    if body is None or body == '':
+        return {}
+    if isinstance(body, str):
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise ErrorHTTP(400, "El body no es un JSON válido")
+    return body
+
+
+def parametro_ruta(event, nombre, mensaje):
+    valor = (event.get('pathParameters') or {}).get(nombre)
+    if not valor:
+        raise ErrorHTTP(400, mensaje)
+    return valor
+
+
+def parametros_query(event):
+    return event.get('queryStringParameters') or {}
+
+
+def cabeceras(event):
+    """Cabeceras de la petición con el nombre en minúsculas."""
+    return {clave.lower(): valor for clave, valor in (event.get('headers') or {}).items()}
+
+
+def normalizar_evento(event):
+    """
+    Deja el evento con la forma que generan las plantillas de mapeo de la API REST
+    (pathParameters, queryStringParameters, headers y body) aunque venga de una
+    integración proxy: HTTP API con payload 2.0, o proxy de la API REST. Devuelve
+    (evento, es_proxy); con proxy, API Gateway usa el statusCode y las cabeceras de
+    la respuesta tal cual, así que hay que devolverla con respuesta_proxy().
+    """
+    if 'requestContext' not in event:
+        return event, False
+    body = event.get('body')
+    if body and event.get('isBase64Encoded'):
+        import base64
+        body = base64.b64decode(body).decode('utf-8')
+    return {
+        'pathParameters': event.get('pathParameters') or {},
+        'queryStringParameters': event.get('queryStringParameters') or {},
+        # En el payload 2.0 ya vienen en minúsculas y las repetidas, unidas por comas
+        'headers': event.get('headers') or {},
+        'body': body,
+    }, True
+
+
+def respuesta_proxy(resultado):
+    """Respuesta para una integración proxy: con Content-Type aunque el handler no lo indique."""
+    headers = {"Content-Type": "application/json", **(resultado.get("headers") or {})}
+    return dict(resultado, headers=headers)
+
+
+def entero(params, nombre, por_defecto, maximo):
+    """Lee un parámetro entero positivo, limitado a `maximo`."""
+    try:
+        valor = int(params.get(nombre) or por_defecto)
+    except ValueError:
+        valor = 0
+    if valor < 1:
+        raise ErrorHTTP(400, f"El parámetro {nombre} debe ser un entero positivo")
+    return min(valor, maximo)
+
+
+# Campos que se pueden pedir con ?fields= en cada tabla
+CAMPOS_ANUNCIOS = ('id', 'titulo', 'descripcion', 'num_comentarios', 'ultimos_comentarios', 'version',
+                   'fecha_creacion')
+CAMPOS_COMENTARIOS = ('anuncio_id', 'comentario_id', 'usuario', 'mensaje', 'fecha')
+
+
+# Un item de DynamoDB no puede pasar de 400 KB: el resto queda para los demás atributos,
+# como el resumen de comentarios, que crece con los comentarios nuevos
+MAXIMO_BYTES_TEXTO_ANUNCIO = 350 * 1024
+
+
+def datos_anuncio(datos):
+    """
+    Título y descripción de un anuncio nuevo, con sus valores por defecto. Lanza
+    ValueError si no son texto o si son demasiado largos: se comprueba antes de
+    escribir nada en DynamoDB.
+    """
+    anuncio = {
+        'titulo': datos.get('titulo', 'Sin título'),
+        'descripcion': datos.get('descripcion', 'Sin descripción'),
+    }
+    if not all(isinstance(valor, str) for valor in anuncio.values()):
+        raise ValueError("titulo y descripcion deben ser texto")
+    if sum(len(valor.encode('utf-8')) for valor in anuncio.values()) > MAXIMO_BYTES_TEXTO_ANUNCIO:
+        raise ValueError(f"titulo y descripcion no pueden ocupar más de {MAXIMO_BYTES_TEXTO_ANUNCIO} bytes")
+    return anuncio
+
+
+def campos_pedidos(params, permitidos):
+    """Campos de ?fields=a,b validados contra `permitidos`; None si no se piden."""
+    if not params.get('fields'):
+        return None
+    campos = list(dict.fromkeys(campo.strip() for campo in params['fields'].split(',') if campo.strip()))
+    if not campos:
+        raise ErrorHTTP(400, "El parámetro fields no contiene ningún campo")
+    desconocidos = [campo for campo in campos if campo not in permitidos]
+    if desconocidos:
+        raise ErrorHTTP(400, f"Campos no permitidos en fields: {', '.join(desconocidos)}")
+    return campos
+
+
+def proyeccion(campos, obligatorios=()):
+    """
+    Argumentos ProjectionExpression/ExpressionAttributeNames para leer solo `campos`
+    más los `obligatorios` (los que el handler necesita aunque el cliente no los pida).
+    """
+    if campos is None:
+        return {}
+    nombres = {f'#c{i}': campo for i, campo in enumerate(dict.fromkeys([*campos, *obligatorios]))}
+    return {'ProjectionExpression': ', '.join(nombres), 'ExpressionAttributeNames': nombres}
+
+
+# Atributos de los items que no se devuelven nunca: particion_fecha solo sirve para
+# repartir el índice PorFecha
+CAMPOS_INTERNOS = ('particion_fecha',)
+
+
+def recortar(item, campos):
+    """
+    Deja en un item solo los campos pedidos, en el orden pedido; sin `campos`, todos
+    menos los internos (se quitan del propio item, recién leído).
+    """
+    if campos is None:
+        for campo in CAMPOS_INTERNOS:
+            item.pop(campo, None)
+        return item
+    return {campo: item[campo] for campo in campos if campo in item}
+
+
+# Índice PorFecha de Anuncios: partición del índice (particion_fecha, de 0 a
+# PARTICIONES_FECHA - 1) y fecha_creacion como clave de rango. Con una sola partición
+# todos los anuncios nuevos se escribirían en la misma; repartidos por el id, las
+# escrituras se reparten y los listados leen todas las particiones a la vez.
+# Cambiar PARTICIONES_FECHA obliga a repartir de nuevo los anuncios ya creados.
+INDICE_FECHA = 'PorFecha'
+PARTICIONES_FECHA = 8
+
+
+def particion_fecha(anuncio_id):
+    """Partición de PorFecha de un anuncio (también la usa migrar_fechas.py)."""
+    import zlib
+    return zlib.crc32(anuncio_id.encode()) % PARTICIONES_FECHA
+
+
+def atributos_creacion(anuncio_id):
+    """fecha_creacion y particion_fecha de un anuncio nuevo."""
+    from datetime import datetime
+    return {
+        'fecha_creacion': datetime.utcnow().isoformat(),
+        'particion_fecha': particion_fecha(anuncio_id),
+    }
+
+
+TAMANO_LOTE_LECTURA = 100   # máximo de claves por BatchGetItem
+
+
+def leer_anuncios(ids, campos=None):
+    """
+    Lee los anuncios indicados con BatchGetItem en lotes de 100, reintentando las
+    UnprocessedKeys. Devuelve un diccionario id -> anuncio con los que existen.
+    """
+    encontrados = {}
+    for inicio in range(0, len(ids), TAMANO_LOTE_LECTURA):
+        pendientes = {'Anuncios': {
+            'Keys': [{'id': i} for i in ids[inicio:inicio + TAMANO_LOTE_LECTURA]],
+            # El id hace falta para devolverlos en el orden pedido
+            **proyeccion(campos, obligatorios=('id',))
+        }}
+        for intento in range(MAXIMO_REINTENTOS + 1):
+            if intento:
+                esperar(intento)
+            response = recurso().batch_get_item(RequestItems=pendientes)
+            for anuncio in response.get('Responses', {}).get('Anuncios', []):
+                encontrados[anuncio['id']] = recortar(anuncio, campos)
+            pendientes = response.get('UnprocessedKeys')
+            if not pendientes:
+                break
+        else:
+            raise RuntimeError("DynamoDB no pudo procesar todas las claves solicitadas")
+    return encontrados
+
+
+def etag(*partes, variante=()):
+    """
+    ETag fuerte construido a partir de los valores que identifican una versión. `variante`
+    son los parámetros ya normalizados que cambian la representación (fields, include,
+    limit...): cada representación lleva su propio ETag, y la de por defecto (todos None)
+    conserva el de siempre.
+    """
+    if any(valor is not None for valor in variante):
+        import hashlib
+        partes += (hashlib.sha256(repr(tuple(variante)).encode()).hexdigest()[:12],)
+    return '"' + '-'.join(str(parte) for parte in partes) + '"'
+
+
+def no_modificado(event, valor_etag):
+    """True si la petición trae un If-None-Match que coincide con el ETag actual."""
+    pedidos = cabeceras(event).get('if-none-match')
+    if not pedidos:
+        return False
+    etiquetas = {etiqueta.strip() for etiqueta in pedidos.split(',')}
+    # La comparación de If-None-Match es débil: W/"x" equivale a "x"
+    return '*' in etiquetas or valor_etag in {e[2:] if e.startswith('W/') else e for e in etiquetas}
+
+
+def respuesta_condicional(event, valor_etag, body, headers=None):
+    """200 con el body y su ETag, o 304 sin body si el cliente ya tiene esa versión."""
+    headers = dict(headers or {}, ETag=valor_etag)
+    if no_modificado(event, valor_etag):
+        return respuesta_serializada(304, "", headers)
+    return respuesta_serializada(200, body, headers)
+
+
+# 📌 Métricas de cada invocación
+
+class Metricas:
+    """Contadores de una invocación; los hilos de la misma invocación suman a la vez."""
+
+    def __init__(self):
+        self.items = 0
+        self.rcu = 0.0
+        self.wcu = 0.0
+        self.aciertos_cache = 0
+        self.fallos_cache = 0
+        self.lock = threading.Lock()
+
+    def sumar(self, nombre, valor):
+        with self.lock:
+            setattr(self, nombre, getattr(self, nombre) + valor)
+
+
+def metricas():
+    """Métricas de la invocación en curso (unas sueltas si no hay ninguna)."""
+    return _metricas.get() or Metricas()
+
+
+def propagar(funcion):
+    """`funcion` preparada para ejecutarse en otro hilo sumando a las métricas de esta invocación."""
+    return functools.partial(contextvars.copy_context().run, funcion)
+
+
+def linea_emf(nombre_funcion, valores, propiedades):
+    """Línea en CloudWatch Embedded Metric Format: CloudWatch crea una métrica por cada valor."""
+    unidades = {
+        'Latencia': 'Milliseconds', 'BytesSerializados': 'Bytes', 'ArranqueEnFrio': 'Count',
+        'ItemsDevueltos': 'Count', 'RCU': 'Count', 'WCU': 'Count', 'Errores': 'Count',
+        'AciertosCache': 'Count', 'FallosCache': 'Count',
+    }
+    return json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE_METRICAS,
+                "Dimensions": [["funcion"]],
+                "Metrics": [{"Name": nombre, "Unit": unidades[nombre]} for nombre in valores]
+            }]
+        },
+        "funcion": nombre_funcion,
+        **valores,
+        **propiedades
+    }, ensure_ascii=False)
+
+
+def tamano_body(body):
+    return len(body) if body.isascii() else len(body.encode())
+
+
+def manejador(funcion):
+    """
+    Envuelve un lambda_handler: acepta los eventos de la API REST y los de una
+    integración proxy (normalizar_evento), convierte ErrorHTTP y cualquier otra
+    excepción en la respuesta de error y escribe una línea de métricas EMF por
+    invocación (latencia, arranque en frío, items, bytes, RCU/WCU, aciertos y fallos de
+    la caché del contenedor y clase del error).
+    """
+    @functools.wraps(funcion)
+    def lambda_handler(event, context):
+        global _arranque_en_frio
+        inicio = time.perf_counter()
+        event, es_proxy = normalizar_evento(event)
+        en_frio, _arranque_en_frio = _arranque_en_frio, False
+        datos = Metricas()
+        token = _metricas.set(datos)
+        clase_error = None
+        try:
+            resultado = funcion(event, context)
+        except ErrorHTTP as e:
+            clase_error = type(e).__name__
+            resultado = error(e.status, e.mensaje)
+        except Exception as e:
+            import traceback
+            clase_error = type(e).__name__
+            traceback.print_exc()
+            resultado = error(500, str(e))
+        finally:
+            _metricas.reset(token)
+
+        propiedades = {"status": resultado["statusCode"], "clase_error": clase_error}
+        if en_frio:
+            propiedades["inicializacion_ms"] = round((inicio - INICIO_IMPORTACION) * 1000, 1)
+        if context is not None and hasattr(context, 'aws_request_id'):
+            propiedades["request_id"] = context.aws_request_id
+        valores = {
+            "Latencia": round((time.perf_counter() - inicio) * 1000, 3),
+            "ArranqueEnFrio": int(en_frio),
+            # Un 304 o un error no devuelven items aunque el handler los haya leído
+            "ItemsDevueltos": datos.items if 200 <= resultado["statusCode"] < 300 else 0,
+            "BytesSerializados": tamano_body(resultado["body"]),
+            "RCU": round(datos.rcu, 3),
+            "WCU": round(datos.wcu, 3),
+            "Errores": int(resultado["statusCode"] >= 500),
+        }
+        # Solo en las invocaciones que consultan la caché: su suma da la tasa de aciertos
+        if datos.aciertos_cache or datos.fallos_cache:
+            valores.update(AciertosCache=datos.aciertos_cache, FallosCache=datos.fallos_cache)
+        print(linea_emf(os.environ.get('AWS_LAMBDA_FUNCTION_NAME', funcion.__module__), valores, propiedades))
+        return respuesta_proxy(resultado) if es_proxy else resultado
+    return lambda_handler
+
+
+# 📌 Cursores de paginación
+
+LONGITUD_FIRMA = 16
+
+
+def _firma(datos):
+    import hmac
+    import hashlib
+    secreto = os.environ.get('CURSOR_SECRET', '').encode()
+    # Con una clave vacía cualquiera podría fabricar cursores válidos
+    if not secreto:
+        raise RuntimeError("CURSOR_SECRET no está configurado: no se pueden firmar ni comprobar cursores")
+    return hmac.new(secreto, datos, hashlib.sha256).digest()[:LONGITUD_FIRMA]
+
+
+def codificar_cursor(clave):
+    """Convierte un LastEvaluatedKey en un token opaco, firmado y en base64."""
+    import base64
+    datos = json.dumps(clave, separators=(',', ':'), sort_keys=True, default=codec_json.convertir).encode()
+    return base64.urlsafe_b64encode(_firma(datos) + datos).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve el ExclusiveStartKey de un cursor; lanza ErrorHTTP(400) si no es válido."""
+    import hmac
+    import base64
+    try:
+        crudo = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        firma, datos = crudo[:LONGITUD_FIRMA], crudo[LONGITUD_FIRMA:]
+        if not hmac.compare_digest(firma, _firma(datos)):
+            raise ValueError()
+        return json.loads(datos)
+    except ValueError:
+        raise ErrorHTTP(400, "Cursor no válido")
+
+
+# 📌 ULID: IDs que, ordenados como texto, quedan ordenados por fecha
+
+# Alfabeto Crockford base32: el orden de los caracteres coincide con el orden ASCII
+ALFABETO_ULID = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+MAXIMO_ULID = (1 << 128) - 1
+
+
+def entero_a_ulid(valor):
+    caracteres = []
+    for _ in range(26):
+        caracteres.append(ALFABETO_ULID[valor & 31])
+        valor >>= 5
+    return ''.join(reversed(caracteres))
+
+
+def ulid_a_entero(ulid):
+    valor = 0
+    for caracter in ulid:
+        valor = (valor << 5) | ALFABETO_ULID.index(caracter)
+    return valor
+
+
+def es_ulid(texto):
+    return len(texto) == 26 and all(caracter in ALFABETO_ULID for caracter in texto)
+
+
+def milisegundos(fecha):
+    """Milisegundos desde 1970 de un datetime (sin zona horaria se asume UTC)."""
+    from datetime import timezone
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return int(fecha.timestamp() * 1000)
+
+
+_ultimo_ulid = 0
+_lock_ulid = threading.Lock()
+
+
+def generar_ulid(fecha):
+    """
+    48 bits con los milisegundos de `fecha` seguidos de 80 bits aleatorios. Monótono en el
+    contenedor: si el milisegundo se repite (o el reloj retrocede), se incrementa la parte
+    aleatoria del anterior, así que los IDs de un mismo milisegundo también quedan en orden.
+    """
+    global _ultimo_ulid
+    valor = (milisegundos(fecha) << 80) | int.from_bytes(os.urandom(10), 'big')
+    with _lock_ulid:
+        if valor >> 80 <= _ultimo_ulid >> 80:
+            valor = _ultimo_ulid + 1
+        _ultimo_ulid = valor
+    return entero_a_ulid(valor)
+
+
+# 📌 Caché en memoria del contenedor
+
+class CacheLRU:
+    """
+    Caché LRU en memoria del contenedor, con caducidad por entrada y un límite
+    de tamaño total en bytes. Guarda las respuestas ya serializadas: un texto o
+    una tupla como (etag, body, número de items); cuentan los textos.
+    """
+
+    def __init__(self, ttl, max_bytes):
+        from collections import OrderedDict
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entradas = OrderedDict()  # clave -> (caducidad, valor, tamaño)
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls):
+        """Caché configurada con CACHE_TTL_SEGUNDOS y CACHE_MAX_BYTES."""
+        return cls(
+            ttl=float(os.environ.get('CACHE_TTL_SEGUNDOS', '5')),
+            max_bytes=int(os.environ.get('CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+        )
+
+    def obtener(self, clave):
+        """El valor guardado o None; el acierto o el fallo cuenta en las métricas de la invocación."""
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is not None and entrada[0] <= time.monotonic():
+                self._quitar(clave)
+                entrada = None
+            if entrada is not None:
+                self.entradas.move_to_end(clave)
+        metricas().sumar('fallos_cache' if entrada is None else 'aciertos_cache', 1)
+        return None if entrada is None else entrada[1]
+
+    def guardar(self, clave, valor):
+        partes = valor if isinstance(valor, tuple) else (valor,)
+        tamano = sum(len(parte.encode()) for parte in partes if isinstance(parte, str))
+        if self.ttl <= 0 or tamano > self.max_bytes:
+            return
+        with self.lock:
+            if clave in self.entradas:
+                self._quitar(clave)
+            self.entradas[clave] = (time.monotonic() + self.ttl, valor, tamano)
+            self.bytes += tamano
+            # Expulsar las entradas usadas hace más tiempo hasta volver al límite
+            while self.bytes > self.max_bytes:
+                self._quitar(next(iter(self.entradas)))
+
+    def _quitar(self, clave):
+        self.bytes -= self.entradas.pop(clave)[2]
+
+
+def usar_cache(event):
+    """
+    El cliente puede saltarse la caché con Cache-Control: no-cache (o no-store), o con
+    max-age=0, que es lo que API Gateway atiende para refrescar la caché de la etapa.
+    """
+    control = cabeceras(event).get('cache-control', '').lower().replace(' ', '')
+    directivas = control.split(',')
+    return 'no-cache' not in directivas and 'no-store' not in directivas and 'max-age=0' not in directivas
@@ -1,35 +1,35 @@
-import json
-import boto3
 import uuid
+import comun
+import busqueda
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Anuncios')
+table = comun.tabla('Anuncios')
 
+
+@comun.manejador
 def lambda_handler(event, context):
+    data = comun.leer_body(event)
+    if not isinstance(data, dict):
+        raise comun.ErrorHTTP(400, "Se esperaba un objeto JSON")
     try:
-        # Revisar si el body ya es un diccionario o si es string JSON
-        if isinstance(event['body'], str):
-            data = json.loads(event['body'])  # Si es string, convertir a diccionario
-        else:
-            data = event['body']  # Si ya es diccionario, usarlo directamente
-
-        # Crear anuncio con ID único
-        anuncio = {
-            'id': str(uuid.uuid4()),
-            'titulo': data.get('titulo', 'Sin título'),
-            'descripcion': data.get('descripcion', 'Sin descripción')
-        }
+        contenido = comun.datos_anuncio(data)
+    except ValueError as e:
+        raise comun.ErrorHTTP(400, str(e))
 
-        # Guardar en DynamoDB
-        table.put_item(Item=anuncio)
+    # Crear anuncio con ID único
+    anuncio_id = str(uuid.uuid4())
+    anuncio = {
+        'id': anuncio_id,
+        **contenido,
+        # Se incrementa en cada escritura; ver_anuncio lo usa como ETag
+        'version': 1,
+        # Para GET /anuncios?order=recent (índice PorFecha)
+        **comun.atributos_creacion(anuncio_id)
+    }
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps(anuncio)
-        }
-    except Exception as e:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": str(e)})
-        }
+    # Guardar en DynamoDB
+    table.put_item(Item=anuncio)
+    # Y sus palabras en el índice de búsqueda
+    busqueda.indexar([anuncio])
+    comun.metricas().items = 1
 
+    return comun.respuesta(200, comun.recortar(anuncio, None))
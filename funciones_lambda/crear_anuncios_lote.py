@@ -0,0 +1,82 @@
+import uuid
+import comun
+import busqueda
+
+TABLE_NAME = 'Anuncios'
+
+TAMANO_LOTE = 25            # máximo de elementos por BatchWriteItem
+MAXIMO_ANUNCIOS = 1000      # máximo de anuncios por petición
+
+
+def escribir_lote(anuncios):
+    """
+    Escribe hasta 25 anuncios con BatchWriteItem, reintentando los UnprocessedItems.
+    Devuelve el conjunto de IDs que no se pudieron escribir. Si DynamoDB rechaza el lote
+    (por ejemplo, un item demasiado grande), quedan sin escribir los que faltaban, pero
+    los lotes anteriores ya escritos se siguen devolviendo como creados.
+    """
+    from botocore.exceptions import ClientError
+    pendientes = [{'PutRequest': {'Item': anuncio}} for anuncio in anuncios]
+    for intento in range(comun.MAXIMO_REINTENTOS + 1):
+        if intento:
+            comun.esperar(intento)
+        try:
+            response = comun.recurso().batch_write_item(RequestItems={TABLE_NAME: pendientes})
+        except ClientError as e:
+            print(f"⚠️ Lote de {len(pendientes)} anuncios rechazado: {e}")
+            break
+        pendientes = response.get('UnprocessedItems', {}).get(TABLE_NAME, [])
+        if not pendientes:
+            break
+    return {peticion['PutRequest']['Item']['id'] for peticion in pendientes}
+
+
+@comun.manejador
+def lambda_handler(event, context):
+    data = comun.leer_body(event)
+    if isinstance(data, dict):
+        data = data.get('anuncios')
+
+    if not isinstance(data, list) or not data:
+        raise comun.ErrorHTTP(400, "Se esperaba una lista de anuncios")
+    if len(data) > MAXIMO_ANUNCIOS:
+        raise comun.ErrorHTTP(400, f"Máximo {MAXIMO_ANUNCIOS} anuncios por petición")
+
+    # Preparar los anuncios válidos y anotar los que no lo son
+    resultados = []
+    anuncios = []
+    for indice, datos in enumerate(data):
+        try:
+            if not isinstance(datos, dict):
+                raise ValueError("Se esperaba un objeto JSON")
+            contenido = comun.datos_anuncio(datos)
+        except ValueError:
+            resultados.append({"indice": indice, "id": None, "estado": "invalido"})
+            continue
+        anuncio_id = str(uuid.uuid4())
+        anuncio = {
+            'id': anuncio_id,
+            **contenido,
+            'version': 1,
+            **comun.atributos_creacion(anuncio_id)
+        }
+        anuncios.append(anuncio)
+        resultados.append({"indice": indice, "id": anuncio['id'], "estado": "creado"})
+
+    # Guardar en DynamoDB en lotes de 25
+    fallidos = set()
+    for inicio in range(0, len(anuncios), TAMANO_LOTE):
+        fallidos |= escribir_lote(anuncios[inicio:inicio + TAMANO_LOTE])
+
+    for resultado in resultados:
+        if resultado['id'] in fallidos:
+            resultado['estado'] = "error"
+    busqueda.indexar([anuncio for anuncio in anuncios if anuncio['id'] not in fallidos])
+
+    creados = sum(1 for resultado in resultados if resultado['estado'] == "creado")
+    comun.metricas().items = creados
+    return comun.respuesta(200 if creados == len(resultados) else 207, {
+        "creados": creados,
+        "fallidos": len(resultados) - creados,
+        "resultados": resultados
+    })
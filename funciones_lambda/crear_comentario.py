@@ -1,55 +1,106 @@
-import json
-import boto3
-import uuid
 from datetime import datetime
+import comun
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Comentarios')
+table = comun.tabla('Comentarios')
+tabla_anuncios = comun.tabla('Anuncios')
 
-def lambda_handler(event, context):
-    try:
-        
-        anuncio_id = event.get('pathParameters', {}).get('id')
-        if not anuncio_id:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "El ID del anuncio no fue proporcionado correctamente"})
-            }
-
-
-        body = event.get('body', {})
-        if isinstance(body, str):
-            data = json.loads(body)  # Si es string, convertir a diccionario
+# Resumen que se mantiene en el anuncio: contador y últimos comentarios
+NUM_ULTIMOS_COMENTARIOS = 5
+LONGITUD_PREVIA = 280
+# usuario es la clave de partición del índice PorUsuario: DynamoDB no admite más de 2048 bytes
+MAXIMO_BYTES_USUARIO = 2048
+
+
+def guardar_comentario(comentario):
+    """
+    Guarda el comentario y actualiza num_comentarios y ultimos_comentarios del
+    anuncio (e incrementa su version) en una única transacción. La lista se recorta en Python, así que la
+    actualización se condiciona al contador leído (control optimista) y se
+    reintenta, con espera exponencial, si otro comentario se ha guardado entretanto.
+    Devuelve False si el anuncio no existe.
+    """
+    resumen = {
+        'comentario_id': comentario['comentario_id'],
+        'usuario': comentario['usuario'],
+        'mensaje': comentario['mensaje'][:LONGITUD_PREVIA],
+        'fecha': comentario['fecha']
+    }
+    # El cliente del recurso convierte los valores de Python igual que el recurso
+    cliente = comun.recurso().meta.client
+    for intento in range(comun.MAXIMO_REINTENTOS + 1):
+        if intento:
+            # Sin espera, los comentarios simultáneos de un anuncio muy activo vuelven a chocar
+            comun.esperar(intento)
+        anuncio = tabla_anuncios.get_item(
+            Key={'id': comentario['anuncio_id']},
+            ProjectionExpression='id, num_comentarios, ultimos_comentarios',
+            ConsistentRead=True
+        ).get('Item')
+        if anuncio is None:
+            return False
+
+        ultimos = [resumen] + anuncio.get('ultimos_comentarios', [])[:NUM_ULTIMOS_COMENTARIOS - 1]
+        valores = {':ultimos': ultimos, ':uno': 1}
+        if 'num_comentarios' in anuncio:
+            condicion = 'num_comentarios = :visto'
+            valores[':visto'] = anuncio['num_comentarios']
         else:
-            data = body  # Si ya es diccionario, usarlo directamente
-
-        usuario = data.get('usuario')
-        mensaje = data.get('mensaje')
-        if not usuario or not mensaje:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "Faltan datos en la solicitud"})
-            }
-
- 
-        comentario = {
-            'anuncio_id': anuncio_id,
-            'comentario_id': str(uuid.uuid4()),
-            'usuario': usuario,
-            'mensaje': mensaje,
-            'fecha': datetime.utcnow().isoformat()
-        }
-
-        #Guardar en DynamoDB
-        table.put_item(Item=comentario)
-
-        return {
-            "statusCode": 200,
-            "body": json.dumps(comentario)
-        }
-
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
+            condicion = 'attribute_exists(id) AND attribute_not_exists(num_comentarios)'
+
+        try:
+            cliente.transact_write_items(TransactItems=[
+                {'Put': {
+                    'TableName': table.name,
+                    'Item': comentario,
+                    'ConditionExpression': 'attribute_not_exists(comentario_id)'
+                }},
+                {'Update': {
+                    'TableName': tabla_anuncios.name,
+                    'Key': {'id': comentario['anuncio_id']},
+                    'UpdateExpression': 'SET ultimos_comentarios = :ultimos ADD num_comentarios :uno, version :uno',
+                    'ConditionExpression': condicion,
+                    'ExpressionAttributeValues': valores
+                }}
+            ])
+            return True
+        except cliente.exceptions.TransactionCanceledException as e:
+            codigos = [motivo.get('Code') for motivo in e.response.get('CancellationReasons', [])]
+            # Solo se reintenta si otro comentario concurrente cambió el anuncio
+            concurrente = len(codigos) == 2 and codigos[1] == 'ConditionalCheckFailed'
+            if not concurrente and 'TransactionConflict' not in codigos:
+                raise
+    raise comun.ErrorHTTP(503, "Demasiados comentarios simultáneos, inténtalo de nuevo")
+
+
+@comun.manejador
+def lambda_handler(event, context):
+    anuncio_id = comun.parametro_ruta(event, 'id', "El ID del anuncio no fue proporcionado correctamente")
+
+    data = comun.leer_body(event)
+    usuario = data.get('usuario') if isinstance(data, dict) else None
+    mensaje = data.get('mensaje') if isinstance(data, dict) else None
+    if not usuario or not mensaje:
+        raise comun.ErrorHTTP(400, "Faltan datos en la solicitud")
+    # Se guardan como texto: usuario es la clave (tipo S) del índice PorUsuario, y el
+    # mensaje se recorta para el resumen del anuncio
+    if not isinstance(usuario, str) or not isinstance(mensaje, str):
+        raise comun.ErrorHTTP(400, "usuario y mensaje deben ser texto")
+    if len(usuario.encode('utf-8')) > MAXIMO_BYTES_USUARIO:
+        raise comun.ErrorHTTP(400, f"El usuario no puede ocupar más de {MAXIMO_BYTES_USUARIO} bytes")
+
+    # El ID del comentario se ordena por fecha de creación
+    fecha = datetime.utcnow()
+    comentario = {
+        'anuncio_id': anuncio_id,
+        'comentario_id': comun.generar_ulid(fecha),
+        'usuario': usuario,
+        'mensaje': mensaje,
+        'fecha': fecha.isoformat()
+    }
+
+    #Guardar en DynamoDB junto con el resumen del anuncio
+    if not guardar_comentario(comentario):
+        raise comun.ErrorHTTP(404, "Anuncio no encontrado")
+
+    comun.metricas().items = 1
+    return comun.respuesta(200, comentario)
@@ -0,0 +1,109 @@
+"""
+Decodificación directa de los items en formato de cable de DynamoDB
+({'S': ...}, {'N': ...}, ...) que devuelve el cliente de bajo nivel.
+
+A diferencia del TypeDeserializer del recurso de boto3, que pasa cada atributo por
+un despacho genérico y crea un Decimal por número, aquí los atributos conocidos de
+Anuncios y Comentarios se leen con funciones específicas y el resultado ya está en
+los tipos que se envían al cliente (str, int, float, list, dict).
+"""
+import base64
+
+
+def numero(texto):
+    if '.' in texto or 'e' in texto or 'E' in texto:
+        return float(texto)
+    return int(texto)
+
+
+def _binario(dato):
+    return base64.b64encode(dato).decode('ascii')
+
+
+def valor(atributo):
+    """Decodificación genérica de un atributo, para los que no tienen función propia."""
+    for tipo, dato in atributo.items():
+        if tipo == 'S':
+            return dato
+        if tipo == 'N':
+            return numero(dato)
+        if tipo == 'M':
+            return {nombre: valor(v) for nombre, v in dato.items()}
+        if tipo == 'L':
+            return [valor(v) for v in dato]
+        if tipo == 'BOOL':
+            return dato
+        if tipo == 'NULL':
+            return None
+        if tipo == 'SS':
+            return sorted(dato)
+        if tipo == 'NS':
+            return sorted(numero(v) for v in dato)
+        if tipo == 'B':
+            return _binario(dato)
+        if tipo == 'BS':
+            return sorted(_binario(v) for v in dato)
+        raise ValueError(f"Tipo de DynamoDB desconocido: {tipo}")
+
+
+def _texto(atributo):
+    return atributo['S']
+
+
+def _numero(atributo):
+    return numero(atributo['N'])
+
+
+def _decodificador(esquema):
+    """Crea un decodificador de items para un esquema {atributo: función}."""
+    def decodificar(item):
+        resultado = {}
+        for nombre, atributo in item.items():
+            funcion = esquema.get(nombre)
+            if funcion is None:
+                resultado[nombre] = valor(atributo)
+                continue
+            try:
+                resultado[nombre] = funcion(atributo)
+            except KeyError:
+                # El atributo no tiene el tipo esperado: decodificación genérica
+                resultado[nombre] = valor(atributo)
+        return resultado
+    return decodificar
+
+
+ESQUEMA_RESUMEN_COMENTARIO = {
+    'comentario_id': _texto,
+    'usuario': _texto,
+    'mensaje': _texto,
+    'fecha': _texto,
+}
+decodificar_resumen = _decodificador(ESQUEMA_RESUMEN_COMENTARIO)
+
+ESQUEMA_COMENTARIO = dict(ESQUEMA_RESUMEN_COMENTARIO, anuncio_id=_texto)
+decodificar_comentario = _decodificador(ESQUEMA_COMENTARIO)
+
+ESQUEMA_ANUNCIO = {
+    'id': _texto,
+    'titulo': _texto,
+    'descripcion': _texto,
+    'num_comentarios': _numero,
+    'ultimos_comentarios': lambda atributo: [decodificar_resumen(v['M']) for v in atributo['L']],
+    'version': _numero,
+    'fecha_creacion': _texto,
+    'particion_fecha': _numero,
+}
+decodificar_anuncio = _decodificador(ESQUEMA_ANUNCIO)
+
+
+def decodificar_clave(clave):
+    """LastEvaluatedKey del cliente -> claves en tipos de Python (para los cursores)."""
+    return {nombre: valor(atributo) for nombre, atributo in clave.items()}
+
+
+def codificar_clave(clave):
+    """Claves en tipos de Python -> ExclusiveStartKey del cliente."""
+    return {
+        nombre: {'N': str(dato)} if isinstance(dato, (int, float)) else {'S': dato}
+        for nombre, dato in clave.items()
+    }
@@ -0,0 +1,258 @@
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import comun
+import codec_json
+
+SEGMENTOS_POR_DEFECTO = 8
+SEGMENTOS_MAXIMOS = 64
+# Registros en vuelo como máximo entre los hilos de escaneo y el consumidor
+TAMANO_COLA = 500
+# Body máximo de una respuesta del endpoint (Lambda no devuelve más de 6 MB): lo que
+# no cabe se pide después con el cursor de X-Next-Cursor
+MAXIMO_BYTES_RESPUESTA = 4 * 1024 * 1024
+TAMANO_PAGINA = 100         # anuncios por página del escaneo del endpoint
+# Anuncios como máximo por respuesta; con comentarios, cada uno es una consulta más
+MAXIMO_ANUNCIOS_RESPUESTA = 2000
+MAXIMO_ANUNCIOS_CON_COMENTARIOS = 500
+# API Gateway corta a los 29 s: la respuesta se cierra antes, aunque quede tiempo de Lambda
+TIEMPO_MAXIMO_MS = 20000
+MARGEN_TIEMPO_MS = 5000     # lo que se reserva para serializar y devolver la respuesta
+HILOS_COMENTARIOS = 8       # consultas de comentarios a la vez
+
+_FIN = object()
+_pool = None
+
+
+def pool():
+    """Pool reutilizado entre invocaciones para leer los comentarios de varios anuncios a la vez."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=HILOS_COMENTARIOS)
+    return _pool
+
+
+def comentarios_de(anuncio_id):
+    """Recorre todas las páginas de la partición de comentarios de un anuncio."""
+    kwargs = {
+        'KeyConditionExpression': 'anuncio_id = :anuncio_id',
+        'ExpressionAttributeValues': {':anuncio_id': anuncio_id}
+    }
+    while True:
+        response = comun.tabla('Comentarios').query(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def leer_comentarios(anuncio_id):
+    return list(comentarios_de(anuncio_id))
+
+
+def poner(cola, valor, parar):
+    """Encola un valor esperando mientras la cola esté llena y el consumidor siga activo."""
+    while not parar.is_set():
+        try:
+            cola.put(valor, timeout=0.5)
+            return
+        except queue.Full:
+            pass
+
+
+def escanear_segmento(segmento, total_segmentos, incluir_comentarios, cola, parar):
+    """Escanea un segmento página a página y deja cada anuncio en la cola (en su propio hilo)."""
+    try:
+        table = comun.tabla('Anuncios')
+        kwargs = {'Segment': segmento, 'TotalSegments': total_segmentos}
+        while not parar.is_set():
+            response = table.scan(**kwargs)
+            for anuncio in response.get('Items', []):
+                if incluir_comentarios:
+                    anuncio['comentarios'] = list(comentarios_de(anuncio['id']))
+                # Si la cola está llena el hilo espera: la memoria queda acotada
+                poner(cola, anuncio, parar)
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except Exception as e:
+        poner(cola, e, parar)
+    finally:
+        poner(cola, _FIN, parar)
+
+
+def exportar(total_segmentos=SEGMENTOS_POR_DEFECTO, segmentos=None, incluir_comentarios=False):
+    """
+    Generador de líneas NDJSON con todos los anuncios, usando un escaneo
+    paralelo (Segment/TotalSegments) en un pool de hilos. Por defecto se
+    recorren todos los segmentos; `segmentos` permite exportar solo algunos.
+    """
+    segmentos = list(range(total_segmentos)) if segmentos is None else list(segmentos)
+    cola = queue.Queue(maxsize=TAMANO_COLA)
+    parar = threading.Event()
+    pendientes = len(segmentos)
+
+    with ThreadPoolExecutor(max_workers=max(pendientes, 1)) as pool:
+        for segmento in segmentos:
+            # propagar(): la capacidad que consumen los hilos cuenta para esta invocación
+            pool.submit(comun.propagar(escanear_segmento), segmento, total_segmentos, incluir_comentarios, cola, parar)
+        try:
+            while pendientes:
+                registro = cola.get()
+                if registro is _FIN:
+                    pendientes -= 1
+                elif isinstance(registro, Exception):
+                    raise registro
+                else:
+                    yield codec_json.dumps(comun.recortar(registro, None)) + '\n'
+        finally:
+            # Si el consumidor abandona el generador, liberar los hilos
+            parar.set()
+
+
+def limite_tiempo(context):
+    """Instante (time.monotonic) en que hay que cerrar la respuesta, dejando MARGEN_TIEMPO_MS."""
+    disponible = TIEMPO_MAXIMO_MS
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        disponible = min(disponible, context.get_remaining_time_in_millis() - MARGEN_TIEMPO_MS)
+    return time.monotonic() + disponible / 1000
+
+
+def linea_anuncio(anuncio):
+    """
+    Línea NDJSON de un anuncio. Si con sus comentarios no cabe en una respuesta, se
+    exporta sin ellos y con comentarios_omitidos: se leen aparte, paginados, con
+    GET /anuncios/{id}/comentarios.
+    """
+    linea = codec_json.dumps(comun.recortar(anuncio, None)) + '\n'
+    if len(linea.encode('utf-8')) > MAXIMO_BYTES_RESPUESTA and 'comentarios' in anuncio:
+        anuncio = dict(anuncio, comentarios_omitidos=len(anuncio.pop('comentarios')))
+        print(f"⚠️ Los comentarios de {anuncio['id']} no caben en una respuesta: se exporta sin ellos")
+        linea = codec_json.dumps(anuncio) + '\n'
+    return linea
+
+
+def exportar_pagina(segmento, total_segmentos, incluir_comentarios=False, posicion=None, hasta=None):
+    """
+    Líneas NDJSON de un segmento, desde `posicion`. La respuesta se cierra al llegar a
+    MAXIMO_BYTES_RESPUESTA, al máximo de anuncios o al instante `hasta` (time.monotonic).
+    Devuelve las líneas y la posición desde la que seguir (None si el segmento ha terminado):
+    el inicio de la página del escaneo y cuántos anuncios de ella ya se han devuelto, así
+    que una respuesta puede cortarse a mitad de página. Siempre se devuelve al menos un
+    anuncio, para que el cursor avance.
+    """
+    table = comun.tabla('Anuncios')
+    inicio, saltar = (posicion['inicio'], posicion['saltar']) if posicion else (None, 0)
+    maximo = MAXIMO_ANUNCIOS_CON_COMENTARIOS if incluir_comentarios else MAXIMO_ANUNCIOS_RESPUESTA
+    lineas = []
+    total = 0
+    while True:
+        if lineas and hasta is not None and time.monotonic() >= hasta:
+            return lineas, {'inicio': inicio, 'saltar': saltar}
+        kwargs = {'Segment': segmento, 'TotalSegments': total_segmentos, 'Limit': TAMANO_PAGINA}
+        if inicio:
+            kwargs['ExclusiveStartKey'] = inicio
+        response = table.scan(**kwargs)
+        # Solo los anuncios que aún caben en la respuesta
+        items = response.get('Items', [])[saltar:saltar + maximo - len(lineas)]
+        if incluir_comentarios:
+            # Los comentarios de toda la página a la vez, no una consulta detrás de otra
+            futuros = [pool().submit(comun.propagar(leer_comentarios), anuncio['id']) for anuncio in items]
+            for anuncio, futuro in zip(items, futuros):
+                anuncio['comentarios'] = futuro.result()
+        for indice, anuncio in enumerate(items, start=saltar):
+            linea = linea_anuncio(anuncio)
+            tamano = len(linea.encode('utf-8'))
+            if lineas and (total + tamano > MAXIMO_BYTES_RESPUESTA
+                           or (hasta is not None and time.monotonic() >= hasta)):
+                return lineas, {'inicio': inicio, 'saltar': indice}
+            lineas.append(linea)
+            total += tamano
+            if len(lineas) >= maximo:
+                siguiente = indice + 1
+                if siguiente < len(response.get('Items', [])):
+                    return lineas, {'inicio': inicio, 'saltar': siguiente}
+                # Era el último de la página: se sigue por la página siguiente
+                return lineas, ({'inicio': response['LastEvaluatedKey'], 'saltar': 0}
+                                if response.get('LastEvaluatedKey') else None)
+        inicio, saltar = response.get('LastEvaluatedKey'), 0
+        if not inicio:
+            return lineas, None
+
+
+def leer_posicion(cursor, segmento, total_segmentos):
+    """Posición guardada en un cursor de este mismo segmento; lanza ErrorHTTP(400) si no lo es."""
+    posicion = comun.decodificar_cursor(cursor)
+    if (not isinstance(posicion, dict) or set(posicion) != {'segment', 'total_segments', 'inicio', 'saltar'}
+            or (posicion['segment'], posicion['total_segments']) != (segmento, total_segmentos)
+            or not isinstance(posicion['inicio'], (dict, type(None)))
+            or not isinstance(posicion['saltar'], int) or posicion['saltar'] < 0):
+        raise comun.ErrorHTTP(400, "Cursor no válido")
+    return posicion
+
+
+def leer_parametros(params):
+    """Valida los parámetros de exportación; lanza ValueError si no son correctos."""
+    total_segmentos = int(params.get('total_segments') or SEGMENTOS_POR_DEFECTO)
+    if not 1 <= total_segmentos <= SEGMENTOS_MAXIMOS:
+        raise ValueError(f"total_segments debe estar entre 1 y {SEGMENTOS_MAXIMOS}")
+
+    # Cada petición exporta un segmento: el volcado completo son total_segments peticiones
+    # en paralelo, no una respuesta con toda la tabla
+    if params.get('segment') in (None, ''):
+        raise ValueError("Falta el parámetro segment (de 0 a total_segments - 1)")
+    segmento = int(params['segment'])
+    if not 0 <= segmento < total_segmentos:
+        raise ValueError("segment debe estar entre 0 y total_segments - 1")
+
+    incluir_comentarios = str(params.get('comentarios', '')).lower() in ('1', 'true', 'si', 'sí')
+    return total_segmentos, segmento, incluir_comentarios
+
+
+@comun.manejador
+def lambda_handler(event, context):
+    params = comun.parametros_query(event)
+    try:
+        total_segmentos, segmento, incluir_comentarios = leer_parametros(params)
+    except ValueError as e:
+        raise comun.ErrorHTTP(400, str(e))
+    posicion = leer_posicion(params['cursor'], segmento, total_segmentos) if params.get('cursor') else None
+
+    # La respuesta queda acotada en bytes, anuncios y tiempo sea cual sea el tamaño de la
+    # tabla; el resto del segmento se pide con el cursor de X-Next-Cursor
+    lineas, siguiente = exportar_pagina(segmento, total_segmentos, incluir_comentarios, posicion,
+                                        hasta=limite_tiempo(context))
+    comun.metricas().items = len(lineas)
+    headers = {"Content-Type": "application/x-ndjson"}
+    if siguiente:
+        headers["X-Next-Cursor"] = comun.codificar_cursor(
+            dict(siguiente, segment=segmento, total_segments=total_segmentos))
+    return comun.respuesta_serializada(200, ''.join(lineas), headers)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Exporta los anuncios (y opcionalmente sus comentarios) en formato NDJSON."
+    )
+    parser.add_argument('--segmentos', type=int, default=SEGMENTOS_POR_DEFECTO,
+                        help="número de segmentos del escaneo paralelo")
+    parser.add_argument('--comentarios', action='store_true',
+                        help="incluir los comentarios de cada anuncio")
+    parser.add_argument('--salida', default='-',
+                        help="fichero de salida (por defecto, la salida estándar)")
+    args = parser.parse_args(argv)
+
+    salida = sys.stdout if args.salida == '-' else open(args.salida, 'w', encoding='utf-8')
+    try:
+        for linea in exportar(args.segmentos, incluir_comentarios=args.comentarios):
+            salida.write(linea)
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+
+
+if __name__ == '__main__':
+    main()
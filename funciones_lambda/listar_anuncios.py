@@ -1,12 +1,159 @@
-import json
-import boto3
+import heapq
+import itertools
+import comun
+import decodificador
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Anuncios')
+TABLE_NAME = 'Anuncios'
+table = comun.tabla(TABLE_NAME)
 
-def lambda_handler(event, context):
-    response = table.scan()
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 1000
+MAXIMO_IDS = 500
+
+_pool = None
+
+
+def pool():
+    """Pool reutilizado entre invocaciones para leer las particiones de PorFecha a la vez."""
+    global _pool
+    if _pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _pool = ThreadPoolExecutor(max_workers=comun.PARTICIONES_FECHA)
+    return _pool
+
+
+def escanear(limite, inicio, campos=None):
+    kwargs = {'Limit': limite, **comun.proyeccion(campos)}
+    if inicio:
+        kwargs['ExclusiveStartKey'] = inicio
+    response = table.scan(**kwargs)
+    return [comun.recortar(item, campos) for item in response.get('Items', [])], response.get('LastEvaluatedKey')
+
+
+def escanear_rapido(limite, inicio, campos=None):
+    """Igual que escanear(), con el cliente de bajo nivel y el decodificador de Anuncios."""
+    kwargs = {'TableName': TABLE_NAME, 'Limit': limite, **comun.proyeccion(campos)}
+    if inicio:
+        kwargs['ExclusiveStartKey'] = decodificador.codificar_clave(inicio)
+    response = comun.cliente().scan(**kwargs)
+    items = [comun.recortar(decodificador.decodificar_anuncio(item), campos) for item in response.get('Items', [])]
+    siguiente = response.get('LastEvaluatedKey')
+    return items, decodificador.decodificar_clave(siguiente) if siguiente else None
+
+
+def consulta_particion(particion, limite, hasta, campos=None):
+    """Argumentos de la consulta de una partición de PorFecha, de lo más reciente a lo más antiguo."""
+    condicion = 'particion_fecha = :particion'
+    valores = {':particion': particion}
+    if hasta is not None:
+        condicion += ' AND fecha_creacion <= :hasta'
+        valores[':hasta'] = hasta
     return {
-        "statusCode": 200,
-        "body": json.dumps(response['Items'])
+        'IndexName': comun.INDICE_FECHA,
+        'KeyConditionExpression': condicion,
+        'ExpressionAttributeValues': valores,
+        'ScanIndexForward': False,
+        'Limit': limite,
+        # id y fecha_creacion ordenan la mezcla de las particiones
+        **comun.proyeccion(campos, obligatorios=('id', 'fecha_creacion'))
     }
+
+
+def consultar(kwargs):
+    response = table.query(**kwargs)
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+def consultar_rapido(kwargs):
+    """Igual que consultar(), con el cliente de bajo nivel y el decodificador de Anuncios."""
+    response = comun.cliente().query(**kwargs)
+    items = [decodificador.decodificar_anuncio(item) for item in response.get('Items', [])]
+    return items, response.get('LastEvaluatedKey')
+
+
+def recorrer_particion(consulta, kwargs, items, siguiente):
+    """Los anuncios de una partición: la primera página ya leída y, si hacen falta, las siguientes."""
+    yield from items
+    while siguiente:
+        items, siguiente = consulta(dict(kwargs, ExclusiveStartKey=siguiente))
+        yield from items
+
+
+def recientes(limite, cursor, campos=None):
+    """
+    Los `limite` anuncios más recientes (tras el cursor, si lo hay): la primera página de
+    cada partición de PorFecha se lee en paralelo y las particiones, ya ordenadas, se
+    mezclan con heapq.merge. Devuelve los anuncios y el cursor de la página siguiente.
+    """
+    consulta = consultar_rapido if comun.RUTA_RAPIDA else consultar
+    hasta = cursor['fecha_creacion'] if cursor else None
+    consultas = []
+    for particion in range(comun.PARTICIONES_FECHA):
+        kwargs = consulta_particion(particion, limite + 1, hasta, campos)
+        if comun.RUTA_RAPIDA:
+            # El cliente de bajo nivel necesita la tabla y los valores en formato de DynamoDB
+            kwargs.update(TableName=TABLE_NAME, ExpressionAttributeValues=decodificador.codificar_clave(
+                kwargs['ExpressionAttributeValues']))
+        consultas.append(kwargs)
+    futuros = [pool().submit(comun.propagar(consulta), kwargs) for kwargs in consultas]
+    particiones = [recorrer_particion(consulta, kwargs, *futuro.result())
+                   for kwargs, futuro in zip(consultas, futuros)]
+
+    def orden(anuncio):
+        return anuncio['fecha_creacion'], anuncio['id']
+
+    mezcla = heapq.merge(*particiones, key=orden, reverse=True)
+    if cursor:
+        # fecha_creacion <= hasta vuelve a traer los de la misma fecha ya devueltos
+        mezcla = (anuncio for anuncio in mezcla if orden(anuncio) < (cursor['fecha_creacion'], cursor['id']))
+    pagina = list(itertools.islice(mezcla, limite + 1))
+    siguiente = None
+    if len(pagina) > limite:
+        pagina = pagina[:limite]
+        siguiente = {'fecha_creacion': pagina[-1]['fecha_creacion'], 'id': pagina[-1]['id']}
+    return [comun.recortar(anuncio, campos) for anuncio in pagina], siguiente
+
+
+@comun.manejador
+def lambda_handler(event, context):
+    params = comun.parametros_query(event)
+    # ?fields=id,titulo: leer y devolver solo esos atributos
+    campos = comun.campos_pedidos(params, comun.CAMPOS_ANUNCIOS)
+
+    # Lectura de varios anuncios concretos: ?ids=a,b,c
+    if params.get('ids'):
+        ids = list(dict.fromkeys(i.strip() for i in params['ids'].split(',') if i.strip()))
+        if len(ids) > MAXIMO_IDS:
+            raise comun.ErrorHTTP(400, f"Máximo {MAXIMO_IDS} IDs por petición")
+        encontrados = comun.leer_anuncios(ids, campos)
+        comun.metricas().items = len(encontrados)
+        # Mantener el orden en que se pidieron e informar de los que no existen
+        return comun.respuesta(200, {
+            "items": [encontrados[i] for i in ids if i in encontrados],
+            "missing": [i for i in ids if i not in encontrados]
+        })
+
+    limite = comun.entero(params, 'limit', LIMITE_POR_DEFECTO, LIMITE_MAXIMO)
+    inicio = comun.decodificar_cursor(params['cursor']) if params.get('cursor') else None
+    orden = (params.get('order') or '').lower()
+    if orden not in ('', 'recent'):
+        raise comun.ErrorHTTP(400, "El parámetro order solo admite el valor recent")
+    # Un cursor de order=recent no vale para el recorrido de la tabla, ni al revés
+    claves = {'fecha_creacion', 'id'} if orden == 'recent' else {'id'}
+    if inicio is not None and (not isinstance(inicio, dict) or set(inicio) != claves
+                               or not all(isinstance(valor, str) for valor in inicio.values())):
+        raise comun.ErrorHTTP(400, "Cursor no válido")
+
+    # Leer solo una página; el cliente pide la siguiente con next_cursor
+    if orden == 'recent':
+        items, siguiente = recientes(limite, inicio, campos)
+    elif comun.RUTA_RAPIDA:
+        items, siguiente = escanear_rapido(limite, inicio, campos)
+    else:
+        items, siguiente = escanear(limite, inicio, campos)
+    comun.metricas().items = len(items)
+
+    return comun.respuesta(200, {
+        "items": items,
+        "next_cursor": comun.codificar_cursor(siguiente) if siguiente else None
+    })
@@ -1,19 +1,141 @@
-import json
-import boto3
+import comun
+import decodificador
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Comentarios')
+TABLE_NAME = 'Comentarios'
+table = comun.tabla(TABLE_NAME)
+tabla_anuncios = comun.tabla('Anuncios')
 
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+# Vive en las variables globales, así que se conserva entre invocaciones del mismo contenedor
+cache = comun.CacheLRU.desde_entorno()
+
+
+def inicio_de_fecha(texto):
+    """Menor ULID posible para una fecha ISO 8601 (sin zona horaria se asume UTC)."""
+    from datetime import datetime
+    return comun.milisegundos(datetime.fromisoformat(texto.replace('Z', '+00:00'))) << 80
+
+
+def limite_inferior(valor):
+    """`since`: posterior al comentario indicado, o desde la fecha indicada (incluida)."""
+    if comun.es_ulid(valor.upper()):
+        return comun.ulid_a_entero(valor.upper()) + 1
+    return inicio_de_fecha(valor)
+
+
+def limite_superior(valor):
+    """`before`: anterior al comentario o a la fecha indicados (excluidos)."""
+    if comun.es_ulid(valor.upper()):
+        return comun.ulid_a_entero(valor.upper()) - 1
+    return inicio_de_fecha(valor) - 1
+
+
+def condicion_rango(params):
+    """
+    Traduce since/before a una KeyConditionExpression sobre comentario_id.
+    Devuelve None si el rango está vacío; lanza ValueError si un valor no es válido.
+    """
+    condicion = 'anuncio_id = :anuncio_id'
+    valores = {}
+    desde = limite_inferior(params['since']) if params.get('since') else None
+    hasta = limite_superior(params['before']) if params.get('before') else None
+
+    if desde is not None and hasta is not None:
+        if desde > hasta:
+            return None
+        condicion += ' AND comentario_id BETWEEN :desde AND :hasta'
+    elif desde is not None:
+        condicion += ' AND comentario_id >= :desde'
+    elif hasta is not None:
+        if hasta < 0:
+            return None
+        condicion += ' AND comentario_id <= :hasta'
+
+    if desde is not None:
+        valores[':desde'] = comun.entero_a_ulid(min(desde, comun.MAXIMO_ULID))
+    if hasta is not None:
+        valores[':hasta'] = comun.entero_a_ulid(max(hasta, 0))
+    return condicion, valores
+
+
+def etag_comentarios(anuncio_id, variante=()):
+    """
+    ETag de los comentarios de un anuncio: su número y el ID del último, leídos del
+    resumen que crear_comentario mantiene en el anuncio (un GetItem pequeño en lugar
+    de la consulta completa), y la `variante` de la respuesta (rango, límite, orden y campos).
+    """
+    anuncio = tabla_anuncios.get_item(
+        Key={'id': anuncio_id},
+        ProjectionExpression='num_comentarios, ultimos_comentarios[0].comentario_id'
+    ).get('Item') or {}
+    ultimos = anuncio.get('ultimos_comentarios') or [{}]
+    return comun.etag(anuncio.get('num_comentarios', 0), ultimos[0].get('comentario_id', ''), variante=variante)
+
+
+@comun.manejador
 def lambda_handler(event, context):
-    anuncio_id = event['pathParameters']['id']
-    
-    response = table.query(
-        KeyConditionExpression='anuncio_id = :anuncio_id',
-        ExpressionAttributeValues={':anuncio_id': anuncio_id}
+    anuncio_id = comun.parametro_ruta(event, 'id', "El ID del anuncio no fue proporcionado correctamente")
+
+    params = comun.parametros_query(event)
+    orden = (params.get('order') or 'asc').lower()
+    try:
+        limite = int(params.get('limit') or LIMITE_POR_DEFECTO)
+        if limite < 1 or orden not in ('asc', 'desc'):
+            raise ValueError()
+        rango = condicion_rango(params)
+    except ValueError:
+        raise comun.ErrorHTTP(400, "Parámetros since, before, limit u order no válidos")
+    # ?fields=usuario,mensaje: leer y devolver solo esos atributos
+    campos = comun.campos_pedidos(params, comun.CAMPOS_COMENTARIOS)
+
+    # Responder desde la caché del contenedor si la misma consulta se hizo hace poco
+    con_cache = comun.usar_cache(event)
+    clave = (anuncio_id, params.get('since'), params.get('before'), limite, orden, campos and tuple(campos))
+    guardado = cache.obtener(clave) if con_cache else None
+    if guardado is not None:
+        etag, body, comun.metricas().items = guardado
+        return comun.respuesta_condicional(event, etag, body, {"X-Cache": "HIT"})
+
+    # Si el cliente ya tiene la versión actual, responder 304 sin hacer la consulta.
+    # El ETag se lee antes que los comentarios, y estos con lectura consistente: como
+    # mucho el body será más nuevo que él.
+    # since/before ya traducidos al rango de IDs: dos formas de pedir el mismo rango comparten ETag
+    variante = (
+        'vacio' if rango is None else tuple(sorted(rango[1].items())) or None,
+        min(limite, LIMITE_MAXIMO) if limite != LIMITE_POR_DEFECTO else None,
+        orden if orden != 'asc' else None,
+        campos and tuple(campos),
     )
+    etag = etag_comentarios(anuncio_id, variante)
+    if comun.no_modificado(event, etag):
+        return comun.respuesta_serializada(304, "", {"ETag": etag})
 
-    return {
-        "statusCode": 200,
-        "body": json.dumps(response.get('Items', []))
-    }
+    if rango is None:
+        comentarios = []
+    else:
+        condicion, valores = rango
+        valores[':anuncio_id'] = anuncio_id
+        # El orden del ID es el orden cronológico: DynamoDB devuelve ya ordenado.
+        # Lectura consistente: el ETag ya leído puede venir de una réplica al día, y el
+        # body no debe ser más antiguo que él (el cliente lo guardaría y recibiría 304)
+        kwargs = {
+            'KeyConditionExpression': condicion,
+            'ScanIndexForward': orden == 'asc',
+            'Limit': min(limite, LIMITE_MAXIMO),
+            'ConsistentRead': True,
+            **comun.proyeccion(campos)
+        }
+        if comun.RUTA_RAPIDA:
+            valores = {nombre: {'S': dato} for nombre, dato in valores.items()}
+            response = comun.cliente().query(TableName=TABLE_NAME, ExpressionAttributeValues=valores, **kwargs)
+            comentarios = [decodificador.decodificar_comentario(item) for item in response.get('Items', [])]
+        else:
+            response = table.query(ExpressionAttributeValues=valores, **kwargs)
+            comentarios = response.get('Items', [])
 
+    body = comun.serializar(comentarios)
+    comun.metricas().items = len(comentarios)
+    cache.guardar(clave, (etag, body, len(comentarios)))
+    return comun.respuesta_serializada(200, body, {"ETag": etag, "X-Cache": "MISS" if con_cache else "BYPASS"})
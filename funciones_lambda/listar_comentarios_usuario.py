@@ -0,0 +1,49 @@
+import comun
+
+TABLE_NAME = 'Comentarios'
+INDICE_USUARIO = 'PorUsuario'
+table = comun.tabla(TABLE_NAME)
+
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+# Lo que necesita una página de perfil o de moderación: el usuario ya va en la ruta.
+# El índice proyecta solo sus claves y el mensaje, así que no hay más que leer.
+CAMPOS = ('anuncio_id', 'comentario_id', 'mensaje', 'fecha')
+
+
+@comun.manejador
+def lambda_handler(event, context):
+    usuario = comun.parametro_ruta(event, 'usuario', "El usuario no fue proporcionado correctamente")
+
+    params = comun.parametros_query(event)
+    limite = comun.entero(params, 'limit', LIMITE_POR_DEFECTO, LIMITE_MAXIMO)
+    orden = (params.get('order') or 'desc').lower()
+    if orden not in ('asc', 'desc'):
+        raise comun.ErrorHTTP(400, "El parámetro order debe ser asc o desc")
+
+    # Una sola consulta al índice PorUsuario (usuario, fecha), sin recorrer la tabla
+    kwargs = {
+        'IndexName': INDICE_USUARIO,
+        'KeyConditionExpression': 'usuario = :usuario',
+        'ExpressionAttributeValues': {':usuario': usuario},
+        'ScanIndexForward': orden == 'asc',
+        'Limit': limite,
+        **comun.proyeccion(CAMPOS)
+    }
+    if params.get('cursor'):
+        inicio = comun.decodificar_cursor(params['cursor'])
+        # Un cursor de otro usuario (o de otro listado) no vale aquí
+        if not isinstance(inicio, dict) or inicio.get('usuario') != usuario:
+            raise comun.ErrorHTTP(400, "Cursor no válido")
+        kwargs['ExclusiveStartKey'] = inicio
+    response = table.query(**kwargs)
+    comentarios = response.get('Items', [])
+    siguiente = response.get('LastEvaluatedKey')
+    comun.metricas().items = len(comentarios)
+
+    return comun.respuesta(200, {
+        "usuario": usuario,
+        "items": comentarios,
+        "next_cursor": comun.codificar_cursor(siguiente) if siguiente else None
+    })
@@ -1,37 +1,91 @@
-import json
-import boto3
+import comun
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Anuncios')
+table = comun.tabla('Anuncios')
 
+LIMITE_COMENTARIOS = 100
+
+# Vive en las variables globales, así que se conserva entre invocaciones del mismo contenedor
+cache = comun.CacheLRU.desde_entorno()
+_pool = None
+
+
+def pool():
+    """Pool reutilizado entre invocaciones para leer anuncio y comentarios a la vez."""
+    global _pool
+    if _pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _pool = ThreadPoolExecutor(max_workers=2)
+    return _pool
+
+
+def leer_anuncio(anuncio_id, campos=None):
+    """
+    Lee el anuncio con los campos pedidos más los que necesita el handler: el id
+    (un anuncio existente nunca llega vacío), la version para el ETag y el
+    contador para comprobar los comentarios leídos en paralelo.
+    """
+    obligatorios = ('id', 'version', 'num_comentarios')
+    return table.get_item(Key={'id': anuncio_id}, **comun.proyeccion(campos, obligatorios)).get('Item')
+
+
+def leer_comentarios(anuncio_id):
+    """Primeros comentarios del anuncio en orden cronológico (se ejecuta en otro hilo)."""
+    response = comun.tabla('Comentarios').query(
+        KeyConditionExpression='anuncio_id = :anuncio_id',
+        ExpressionAttributeValues={':anuncio_id': anuncio_id},
+        Limit=LIMITE_COMENTARIOS
+    )
+    return response.get('Items', [])
+
+
+@comun.manejador
 def lambda_handler(event, context):
-    try:
-        # 🔹 Verificar si 'pathParameters' está presente antes de acceder a 'id'
-        anuncio_id = event.get('pathParameters', {}).get('id')
-
-        if not anuncio_id:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "El ID del anuncio no fue proporcionado correctamente"})
-            }
-
-        # 🔹 Buscar el anuncio en DynamoDB
-        response = table.get_item(Key={'id': anuncio_id})
-
-        # 🔹 Si no existe, devolver un error 404
-        if 'Item' not in response:
-            return {
-                "statusCode": 404,
-                "body": json.dumps({"error": "Anuncio no encontrado"})
-            }
-
-        return {
-            "statusCode": 200,
-            "body": json.dumps(response['Item'])
-        }
-
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
+    # 🔹 Verificar si 'pathParameters' está presente antes de acceder a 'id'
+    anuncio_id = comun.parametro_ruta(event, 'id', "El ID del anuncio no fue proporcionado correctamente")
+
+    # 🔹 ?include=comentarios devuelve el anuncio y sus comentarios en un solo documento
+    params = comun.parametros_query(event)
+    incluir = {valor.strip() for valor in (params.get('include') or '').split(',')}
+    con_comentarios = 'comentarios' in incluir
+    # 🔹 ?fields=id,titulo: leer y devolver solo esos atributos del anuncio
+    campos = comun.campos_pedidos(params, comun.CAMPOS_ANUNCIOS)
+
+    # 🔹 Responder desde la caché del contenedor si el anuncio se leyó hace poco
+    con_cache = comun.usar_cache(event)
+    clave = (anuncio_id, con_comentarios, campos and tuple(campos))
+    guardado = cache.obtener(clave) if con_cache else None
+    if guardado is not None:
+        etag, body, comun.metricas().items = guardado
+        return comun.respuesta_condicional(event, etag, body, {"X-Cache": "HIT"})
+
+    # 🔹 Buscar el anuncio en DynamoDB (y sus comentarios a la vez, si se piden)
+    if con_comentarios:
+        futuro_comentarios = pool().submit(comun.propagar(leer_comentarios), anuncio_id)
+        anuncio = leer_anuncio(anuncio_id, campos)
+        comentarios = futuro_comentarios.result()
+    else:
+        anuncio = leer_anuncio(anuncio_id, campos)
+
+    # 🔹 Si no existe, devolver un error 404
+    if anuncio is None:
+        raise comun.ErrorHTTP(404, "Anuncio no encontrado")
+
+    # 🔹 Cada escritura incrementa la version (también cada comentario nuevo). Los anuncios
+    # anteriores a la columna version no se han modificado desde entonces.
+    etag = comun.etag(anuncio_id, anuncio.get('version', 0),
+                      variante=(con_comentarios or None, campos and tuple(campos)))
+    num_comentarios = anuncio.get('num_comentarios', 0)
+    anuncio = comun.recortar(anuncio, campos)
+    if con_comentarios:
+        anuncio['comentarios'] = comentarios
+    body = comun.serializar(anuncio)
+    comun.metricas().items = 1 + len(comentarios) if con_comentarios else 1
+    headers = {"X-Cache": "MISS" if con_cache else "BYPASS"}
+
+    # 🔹 Si la consulta de comentarios se hizo antes que un comentario que el anuncio ya
+    # cuenta, el body es anterior a la version: sin ETag ni caché, el siguiente sondeo lo corrige
+    if con_comentarios and len(comentarios) < min(num_comentarios, LIMITE_COMENTARIOS):
+        return comun.respuesta_serializada(200, body, headers)
+
+    cache.guardar(clave, (etag, body, comun.metricas().items))
+    return comun.respuesta_condicional(event, etag, body, headers)
@@ -0,0 +1,82 @@
+"""
+Migra los comentarios antiguos (comentario_id = UUID) a IDs ordenables por fecha (ULID).
+
+El nuevo ID se calcula a partir del campo `fecha` del comentario y de un hash del ID
+anterior, así que ejecutar la migración varias veces produce siempre los mismos IDs.
+El ID original se conserva en el atributo `comentario_id_anterior`.
+
+    python migrar_comentarios.py --simular   # solo muestra lo que haría
+    python migrar_comentarios.py
+"""
+import os
+import sys
+import argparse
+import hashlib
+from datetime import datetime
+
+import boto3
+
+# Los ULID se codifican con el mismo código que usan las funciones Lambda
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "funciones_lambda"))
+import comun
+
+AWS_REGION = "eu-west-1"
+TABLE_NAME = "Comentarios"
+
+
+def ulid_determinista(fecha_iso, id_anterior):
+    """ULID con los milisegundos de `fecha_iso` y 80 bits derivados del ID anterior."""
+    fecha = datetime.fromisoformat(fecha_iso.replace('Z', '+00:00'))
+    aleatorio = int.from_bytes(hashlib.sha256(id_anterior.encode()).digest()[:10], 'big')
+    return comun.entero_a_ulid((comun.milisegundos(fecha) << 80) | aleatorio)
+
+
+def comentarios_antiguos(table):
+    """Recorre la tabla y devuelve los comentarios cuyo ID no es un ULID."""
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get('Items', []):
+            if not comun.es_ulid(item['comentario_id']):
+                yield item
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def migrar(table, simular=False):
+    migrados = 0
+    with table.batch_writer() as batch:
+        for item in comentarios_antiguos(table):
+            id_anterior = item['comentario_id']
+            if 'fecha' not in item:
+                print(f"⚠️ Comentario {id_anterior} sin fecha. Se omite.")
+                continue
+
+            nuevo = dict(item)
+            nuevo['comentario_id'] = ulid_determinista(item['fecha'], id_anterior)
+            nuevo['comentario_id_anterior'] = id_anterior
+            print(f"🔹 {item['anuncio_id']}: {id_anterior} -> {nuevo['comentario_id']}")
+
+            if not simular:
+                # Primero el nuevo, después el antiguo: si se interrumpe, basta con repetir
+                batch.put_item(Item=nuevo)
+                batch.delete_item(Key={'anuncio_id': item['anuncio_id'], 'comentario_id': id_anterior})
+            migrados += 1
+    return migrados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migra los IDs de comentarios de UUID a ULID.")
+    parser.add_argument('--simular', action='store_true', help="no escribir, solo mostrar los cambios")
+    parser.add_argument('--region', default=AWS_REGION)
+    args = parser.parse_args(argv)
+
+    table = boto3.resource('dynamodb', region_name=args.region).Table(TABLE_NAME)
+    migrados = migrar(table, simular=args.simular)
+    accion = "a migrar" if args.simular else "migrados"
+    print(f"✅ Comentarios {accion}: {migrados}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Añade fecha_creacion (y particion_fecha) a los anuncios creados antes de que
+crear_anuncio las guardara, para que aparezcan en GET /anuncios?order=recent.
+
+La fecha de creación de un anuncio antiguo no se guardó: se usa la de su primer
+comentario (el anuncio existía ya entonces) o, si no tiene ninguno, la de --fecha.
+Solo se actualizan los anuncios sin fecha_creacion, así que se puede repetir.
+
+    python migrar_fechas.py --simular   # solo muestra lo que haría
+    python migrar_fechas.py --fecha 2024-01-01T00:00:00
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+
+import boto3
+
+# La partición de PorFecha se calcula con el mismo código que usan las funciones Lambda
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "funciones_lambda"))
+import comun
+
+AWS_REGION = "eu-west-1"
+TABLE_NAME = "Anuncios"
+COMMENTS_TABLE_NAME = "Comentarios"
+
+
+def anuncios_sin_fecha(table):
+    """Recorre la tabla y devuelve los IDs de los anuncios sin fecha_creacion."""
+    kwargs = {
+        'FilterExpression': 'attribute_not_exists(fecha_creacion)',
+        'ProjectionExpression': 'id',
+    }
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get('Items', []):
+            yield item['id']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def primer_comentario(comments_table, anuncio_id):
+    """Fecha del comentario más antiguo del anuncio (los IDs ULID van en orden de fecha)."""
+    response = comments_table.query(
+        KeyConditionExpression='anuncio_id = :anuncio_id',
+        ExpressionAttributeValues={':anuncio_id': anuncio_id},
+        ProjectionExpression='fecha',
+        Limit=1
+    )
+    items = response.get('Items', [])
+    return items[0].get('fecha') if items else None
+
+
+def migrar(table, comments_table, fecha_por_defecto, simular=False):
+    migrados = 0
+    for anuncio_id in anuncios_sin_fecha(table):
+        fecha = primer_comentario(comments_table, anuncio_id) or fecha_por_defecto
+        print(f"🔹 {anuncio_id}: {fecha}")
+        if not simular:
+            try:
+                # version cambia con el body del anuncio: los ETag anteriores dejan de valer
+                table.update_item(
+                    Key={'id': anuncio_id},
+                    UpdateExpression='SET fecha_creacion = :fecha, particion_fecha = :particion ADD version :uno',
+                    ConditionExpression='attribute_exists(id) AND attribute_not_exists(fecha_creacion)',
+                    ExpressionAttributeValues={
+                        ':fecha': fecha,
+                        ':particion': comun.particion_fecha(anuncio_id),
+                        ':uno': 1
+                    }
+                )
+            except table.meta.client.exceptions.ConditionalCheckFailedException:
+                # Borrado o migrado mientras tanto
+                continue
+        migrados += 1
+    return migrados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Añade la fecha de creación a los anuncios antiguos.")
+    parser.add_argument('--simular', action='store_true', help="no escribir, solo mostrar los cambios")
+    parser.add_argument('--fecha', default=datetime.utcnow().isoformat(),
+                        help="fecha ISO 8601 de los anuncios sin comentarios (por defecto, ahora)")
+    parser.add_argument('--region', default=AWS_REGION)
+    args = parser.parse_args(argv)
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    migrados = migrar(dynamodb.Table(TABLE_NAME), dynamodb.Table(COMMENTS_TABLE_NAME), args.fecha,
+                      simular=args.simular)
+    accion = "a migrar" if args.simular else "migrados"
+    print(f"✅ Anuncios {accion}: {migrados}")
+
+
+if __name__ == '__main__':
+    main()
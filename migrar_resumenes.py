@@ -0,0 +1,137 @@
+"""
+Rellena el resumen de comentarios (num_comentarios y ultimos_comentarios) de los anuncios,
+para que los que ya tenían comentarios antes de que crear_comentario lo mantuviera no
+empiecen a contar desde 0.
+
+Recuenta los comentarios de cada anuncio y corrige los que no coinciden con su resumen.
+La actualización se condiciona al contador leído: si entretanto llega un comentario, se
+vuelve a contar ese anuncio. Se puede repetir tantas veces como haga falta. Los
+comentarios con UUID deben migrarse antes con migrar_comentarios.py, para que los
+últimos se elijan por fecha.
+
+    python migrar_resumenes.py --simular   # solo muestra lo que haría
+    python migrar_resumenes.py
+"""
+import argparse
+
+import boto3
+
+AWS_REGION = "eu-west-1"
+TABLE_NAME = "Anuncios"
+COMMENTS_TABLE_NAME = "Comentarios"
+
+# Los mismos que NUM_ULTIMOS_COMENTARIOS y LONGITUD_PREVIA de funciones_lambda/crear_comentario.py
+NUM_ULTIMOS_COMENTARIOS = 5
+LONGITUD_PREVIA = 280
+MAXIMO_INTENTOS = 5
+
+
+def anuncios(table):
+    """Recorre la tabla y devuelve el ID y el contador actual de cada anuncio."""
+    kwargs = {'ProjectionExpression': 'id, num_comentarios'}
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def contar_comentarios(comments_table, anuncio_id):
+    kwargs = {
+        'KeyConditionExpression': 'anuncio_id = :anuncio_id',
+        'ExpressionAttributeValues': {':anuncio_id': anuncio_id},
+        'Select': 'COUNT',
+        'ConsistentRead': True,
+    }
+    total = 0
+    while True:
+        response = comments_table.query(**kwargs)
+        total += response['Count']
+        if 'LastEvaluatedKey' not in response:
+            return total
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def ultimos_comentarios(comments_table, anuncio_id):
+    """Los comentarios más recientes, con el mismo formato que guarda crear_comentario."""
+    response = comments_table.query(
+        KeyConditionExpression='anuncio_id = :anuncio_id',
+        ExpressionAttributeValues={':anuncio_id': anuncio_id},
+        ProjectionExpression='comentario_id, usuario, mensaje, fecha',
+        ScanIndexForward=False,
+        Limit=NUM_ULTIMOS_COMENTARIOS,
+        ConsistentRead=True
+    )
+    return [
+        {
+            'comentario_id': item['comentario_id'],
+            'usuario': item.get('usuario'),
+            'mensaje': str(item.get('mensaje', ''))[:LONGITUD_PREVIA],
+            'fecha': item.get('fecha')
+        }
+        for item in response.get('Items', [])
+    ]
+
+
+def corregir(table, comments_table, anuncio, simular=False):
+    """Corrige el resumen de un anuncio; devuelve el número de comentarios o None si no hacía falta."""
+    anuncio_id = anuncio['id']
+    for _ in range(MAXIMO_INTENTOS):
+        total = contar_comentarios(comments_table, anuncio_id)
+        visto = anuncio.get('num_comentarios')
+        # Sin el atributo, el anuncio ya cuenta como 0 comentarios
+        if int(visto or 0) == total:
+            return None
+        if simular:
+            return total
+
+        valores = {':total': total, ':ultimos': ultimos_comentarios(comments_table, anuncio_id), ':uno': 1}
+        if visto is None:
+            condicion = 'attribute_exists(id) AND attribute_not_exists(num_comentarios)'
+        else:
+            condicion = 'num_comentarios = :visto'
+            valores[':visto'] = visto
+        try:
+            # version cambia con el body del anuncio: los ETag anteriores dejan de valer
+            table.update_item(
+                Key={'id': anuncio_id},
+                UpdateExpression='SET num_comentarios = :total, ultimos_comentarios = :ultimos ADD version :uno',
+                ConditionExpression=condicion,
+                ExpressionAttributeValues=valores
+            )
+            return total
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            # Un comentario nuevo (o un anuncio borrado): leer otra vez el contador
+            anuncio = table.get_item(Key={'id': anuncio_id}, ProjectionExpression='id, num_comentarios',
+                                     ConsistentRead=True).get('Item')
+            if anuncio is None:
+                return None
+    print(f"⚠️ {anuncio_id}: demasiados comentarios simultáneos, vuelve a ejecutar la migración")
+    return None
+
+
+def migrar(table, comments_table, simular=False):
+    migrados = 0
+    for anuncio in anuncios(table):
+        total = corregir(table, comments_table, anuncio, simular=simular)
+        if total is not None:
+            print(f"🔹 {anuncio['id']}: {anuncio.get('num_comentarios', '-')} -> {total} comentarios")
+            migrados += 1
+    return migrados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rellena el resumen de comentarios de los anuncios.")
+    parser.add_argument('--simular', action='store_true', help="no escribir, solo mostrar los cambios")
+    parser.add_argument('--region', default=AWS_REGION)
+    args = parser.parse_args(argv)
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    migrados = migrar(dynamodb.Table(TABLE_NAME), dynamodb.Table(COMMENTS_TABLE_NAME), simular=args.simular)
+    accion = "a corregir" if args.simular else "corregidos"
+    print(f"✅ Anuncios {accion}: {migrados}")
+
+
+if __name__ == '__main__':
+    main()
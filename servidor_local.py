@@ -0,0 +1,273 @@
+"""
+Servidor HTTP local con las mismas rutas que crea deploy.py en API Gateway, para probar,
+perfilar y hacer pruebas de carga de las funciones Lambda sin desplegar nada en AWS.
+
+Cada petición se convierte en el mismo evento que generan las plantillas de mapeo de
+deploy.py y se pasa al lambda_handler de funciones_lambda/. La respuesta también
+reproduce la de API Gateway: el resultado de la Lambda tal cual, salvo en los GET con
+ETag, que responden con su statusCode, su ETag y solo el body. Con --api http se
+reproduce en cambio la HTTP API: evento de payload 2.0 y el statusCode, las cabeceras
+y el body de la Lambda como respuesta HTTP.
+
+Las tablas viven en un almacén local intercambiable:
+  - memoria: almacen_local.py, diccionarios en memoria sin pasar por botocore (el más rápido)
+  - moto: DynamoDB simulado en memoria, dentro del propio proceso (necesita `moto`)
+  - endpoint: un DynamoDB compatible ya en marcha (DynamoDB Local, moto_server...)
+
+    python servidor_local.py --puerto 8080 --anuncios 1000 --silencioso
+    python servidor_local.py --almacen endpoint --endpoint-url http://localhost:8000
+"""
+import os
+import sys
+import json
+import argparse
+import secrets
+import importlib
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Las mismas tablas y rutas que crea deploy.py. En RUTAS cada ruta es (método, ruta, función,
+# partes del evento, responde con statusCode y ETag); las partes del evento son las de su
+# plantilla de mapeo: path, body, querystring y headers.
+# Como en API Gateway, las rutas fijas (/anuncios/export) tienen prioridad sobre {id}.
+from deploy import TABLES as TABLAS, ROUTES as RUTAS
+
+LAMBDA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "funciones_lambda")
+AWS_REGION = "eu-west-1"
+
+CABECERAS_CORS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+}
+
+
+# 📌 Almacenes locales de las tablas
+def crear_tablas(cliente):
+    existentes = set(cliente.list_tables()["TableNames"])
+    for nombre, definicion in TABLAS.items():
+        if nombre not in existentes:
+            cliente.create_table(TableName=nombre, BillingMode="PAY_PER_REQUEST", **definicion)
+            print(f"✅ Tabla {nombre} creada.")
+
+
+def almacen_memoria(args):
+    """Tablas de almacen_local.py, con la interfaz de boto3 y sin red ni serialización."""
+    from almacen_local import AlmacenMemoria
+    almacen = AlmacenMemoria()
+    for nombre, definicion in TABLAS.items():
+        almacen.crear_tabla(TableName=nombre, **definicion)
+    sys.path.insert(0, LAMBDA_FOLDER)
+    import comun
+    comun.usar_almacen(almacen)
+    return None
+
+
+def almacen_moto(args):
+    """DynamoDB de moto en memoria. moto no es thread-safe: las peticiones se atienden de una en una."""
+    try:
+        from moto import mock_aws
+    except ImportError:
+        sys.exit("❌ El almacén 'moto' necesita el paquete moto: pip install 'moto[dynamodb]'")
+    mock_aws().start()
+    import boto3
+    crear_tablas(boto3.client("dynamodb"))
+    return threading.Lock()
+
+
+def almacen_endpoint(args):
+    """DynamoDB compatible en --endpoint-url; admite peticiones en paralelo."""
+    if not args.endpoint_url:
+        sys.exit("❌ El almacén 'endpoint' necesita --endpoint-url")
+    os.environ["DYNAMODB_ENDPOINT_URL"] = args.endpoint_url
+    import boto3
+    crear_tablas(boto3.client("dynamodb", endpoint_url=args.endpoint_url))
+    return None
+
+
+ALMACENES = {"memoria": almacen_memoria, "moto": almacen_moto, "endpoint": almacen_endpoint}
+
+
+# 📌 Traducción petición HTTP -> evento -> respuesta HTTP
+def compilar_rutas():
+    """Carga los handlers y separa las rutas en segmentos para compararlas."""
+    sys.path.insert(0, LAMBDA_FOLDER)
+    return [
+        (metodo, ruta.strip("/").split("/"), importlib.import_module(funcion).lambda_handler, partes, condicional)
+        for metodo, ruta, funcion, partes, condicional in RUTAS
+    ]
+
+
+def buscar_ruta(rutas, metodo, segmentos):
+    """Devuelve (ruta, parámetros de ruta) o (None, None); las rutas fijas van antes que {id}."""
+    candidatas = []
+    for ruta in rutas:
+        if ruta[0] != metodo or len(ruta[1]) != len(segmentos):
+            continue
+        parametros = {}
+        for patron, segmento in zip(ruta[1], segmentos):
+            if patron.startswith("{"):
+                parametros[patron[1:-1]] = segmento
+            elif patron != segmento:
+                break
+        else:
+            candidatas.append((len(parametros), ruta, parametros))
+    if not candidatas:
+        return None, None
+    _, ruta, parametros = min(candidatas, key=lambda candidata: candidata[0])
+    return ruta, parametros
+
+
+def crear_evento(partes, parametros, query, headers, body):
+    """El mismo evento que generan las plantillas de mapeo de deploy.py."""
+    evento = {}
+    if "path" in partes:
+        evento["pathParameters"] = parametros
+    if "body" in partes:
+        # $input.json("$"): el JSON de la petición ya interpretado ({} si no hay body)
+        evento["body"] = json.loads(body) if body.strip() else {}
+    if "querystring" in partes:
+        evento["queryStringParameters"] = query
+    if "headers" in partes:
+        evento["headers"] = headers
+    return evento
+
+
+def crear_evento_http(metodo, ruta, url, parametros, query, headers, body):
+    """El evento de payload 2.0 de una integración proxy de la HTTP API."""
+    return {
+        "version": "2.0",
+        "routeKey": f"{metodo} {ruta}",
+        "rawPath": url.path,
+        "rawQueryString": url.query,
+        "headers": {nombre.lower(): valor for nombre, valor in headers.items()},
+        "queryStringParameters": query or None,
+        "pathParameters": parametros or None,
+        "requestContext": {"http": {"method": metodo, "path": url.path}, "stage": "prod"},
+        "body": body or None,
+        "isBase64Encoded": False,
+    }
+
+
+class Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y body van en escrituras separadas: sin esto, cada respuesta de una
+    # conexión keep-alive espera ~40 ms al ACK retardado del cliente
+    disable_nagle_algorithm = True
+    rutas = []
+    bloqueo = None
+    silencioso = False
+    proxy = False
+
+    def do_GET(self):
+        self.atender("GET")
+
+    def do_POST(self):
+        self.atender("POST")
+
+    def do_OPTIONS(self):
+        self.enviar(200, "", CABECERAS_CORS)
+
+    def atender(self, metodo):
+        url = urlsplit(self.path)
+        segmentos = [segmento for segmento in url.path.split("/") if segmento]
+        # Como en la URL de la etapa de API Gateway, /prod/ es opcional
+        if segmentos[:1] == ["prod"]:
+            segmentos = segmentos[1:]
+        ruta, parametros = buscar_ruta(self.rutas, metodo, segmentos)
+        if ruta is None:
+            return self.enviar(403, json.dumps({"message": "Missing Authentication Token"}))
+
+        longitud = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(longitud).decode("utf-8") if longitud else ""
+        query = dict(parse_qsl(url.query))
+        if self.proxy:
+            evento = crear_evento_http(metodo, "/" + "/".join(ruta[1]), url, parametros, query,
+                                       dict(self.headers.items()), body)
+        else:
+            try:
+                evento = crear_evento(ruta[3], parametros, query, dict(self.headers.items()), body)
+            except ValueError:
+                return self.enviar(400, json.dumps({"message": "Could not parse request body into json"}))
+
+        try:
+            if self.bloqueo is not None:
+                with self.bloqueo:
+                    resultado = ruta[2](evento, None)
+            else:
+                resultado = ruta[2](evento, None)
+        except Exception as e:
+            # Lo que devuelve Lambda cuando la función lanza una excepción
+            resultado = {"errorMessage": str(e), "errorType": type(e).__name__}
+
+        if self.proxy:
+            if "statusCode" not in resultado:
+                return self.enviar(500, json.dumps({"message": "Internal Server Error"}))
+            return self.enviar(resultado["statusCode"], resultado.get("body", ""), resultado.get("headers"))
+        if not ruta[4]:
+            return self.enviar(200, json.dumps(resultado, ensure_ascii=False))
+        cabeceras = {"ETag": resultado["headers"]["ETag"]} if "ETag" in (resultado.get("headers") or {}) else {}
+        self.enviar(resultado.get("statusCode", 200), resultado.get("body", ""), cabeceras)
+
+    def enviar(self, status, body, cabeceras=None):
+        datos = body.encode("utf-8")
+        cabeceras = {"Content-Type": "application/json", **(cabeceras or {})}
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(datos)))
+        for nombre, valor in cabeceras.items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(datos)
+
+    def log_message(self, formato, *args):
+        if not self.silencioso:
+            super().log_message(formato, *args)
+
+
+def crear_anuncios_ejemplo(rutas, cantidad):
+    """Rellena Anuncios con `cantidad` anuncios a través de crear_anuncios_lote."""
+    ruta, _ = buscar_ruta(rutas, "POST", ["anuncios", "batch"])
+    for inicio in range(0, cantidad, 1000):
+        anuncios = [{"titulo": f"Anuncio {i}", "descripcion": f"Descripción del anuncio {i}"}
+                    for i in range(inicio, min(inicio + 1000, cantidad))]
+        ruta[2]({"body": anuncios}, None)
+    print(f"✅ {cantidad} anuncios de ejemplo creados.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API de anuncios en local, sin API Gateway ni AWS.")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--almacen", choices=sorted(ALMACENES), default="memoria")
+    parser.add_argument("--endpoint-url", help="URL del DynamoDB compatible (almacén 'endpoint')")
+    parser.add_argument("--anuncios", type=int, default=0, help="anuncios de ejemplo que crear al arrancar")
+    parser.add_argument("--silencioso", action="store_true", help="no registrar cada petición")
+    parser.add_argument("--api", choices=["rest", "http"], default="rest",
+                        help="reproducir la API REST (plantillas de mapeo) o la HTTP API (payload 2.0)")
+    args = parser.parse_args(argv)
+
+    # Credenciales y región ficticias: ningún almacén local las comprueba
+    os.environ.setdefault("AWS_DEFAULT_REGION", AWS_REGION)
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+    # Los cursores se firman con esta clave (sin ella, comun se niega a firmarlos)
+    os.environ.setdefault("CURSOR_SECRET", secrets.token_urlsafe(32))
+
+    Manejador.bloqueo = ALMACENES[args.almacen](args)
+    Manejador.rutas = compilar_rutas()
+    Manejador.silencioso = args.silencioso
+    Manejador.proxy = args.api == "http"
+    if args.anuncios:
+        crear_anuncios_ejemplo(Manejador.rutas, args.anuncios)
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", args.puerto), Manejador)
+    print(f"📌 API local en http://127.0.0.1:{args.puerto}/anuncios (almacén: {args.almacen}, API {args.api})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
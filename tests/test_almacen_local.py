@@ -0,0 +1,190 @@
+"""
+Pruebas de paridad de almacen_local.py con moto: las mismas operaciones sobre las tablas
+de deploy.py deben devolver lo mismo en los dos (páginas, LastEvaluatedKey, Count y
+errores), porque los benchmarks y servidor_local.py dan por buenos sus resultados.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("moto")
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from almacen_local import AlmacenMemoria
+from deploy import TABLES
+
+USUARIOS = ("ana", "luis", "eva")
+
+
+def comentarios():
+    """Comentarios de prueba: tres anuncios, tres usuarios y fechas distintas."""
+    for i in range(30):
+        yield {
+            "anuncio_id": f"a{i % 3}",
+            "comentario_id": f"c{i:03d}",
+            "usuario": USUARIOS[i % len(USUARIOS)],
+            "mensaje": f"mensaje {i}",
+            "fecha": f"2024-01-01T00:00:{i:02d}",
+            "puntos": i,
+        }
+
+
+def cargar(recurso):
+    for comentario in comentarios():
+        recurso.Table("Comentarios").put_item(Item=comentario)
+    for i in range(23):
+        recurso.Table("Anuncios").put_item(Item={"id": f"a{i:02d}", "titulo": f"Anuncio {i}", "version": 1})
+
+
+@pytest.fixture(scope="module")
+def recursos():
+    """Recurso de almacen_local y de moto, con las mismas tablas y los mismos datos."""
+    memoria = AlmacenMemoria()
+    for nombre, definicion in TABLES.items():
+        memoria.crear_tabla(TableName=nombre, **definicion)
+    with mock_aws():
+        moto = boto3.resource("dynamodb", region_name="eu-west-1")
+        for nombre, definicion in TABLES.items():
+            moto.create_table(TableName=nombre, BillingMode="PAY_PER_REQUEST", **definicion)
+        for recurso in (memoria.recurso, moto):
+            cargar(recurso)
+        yield memoria.recurso, moto
+
+
+def en_ambos(recursos, operacion):
+    """Resultado de `operacion(recurso)` en almacen_local y en moto; los errores, como (código, motivos)."""
+    resultados = []
+    for recurso in recursos:
+        try:
+            resultados.append(operacion(recurso))
+        except ClientError as e:
+            motivos = [motivo.get("Code") for motivo in e.response.get("CancellationReasons", [])]
+            resultados.append((e.response["Error"]["Code"], motivos))
+    return resultados
+
+
+def paginas(metodo, **kwargs):
+    """Todas las páginas de una query o un scan: (items, Count, ScannedCount, LastEvaluatedKey)."""
+    resultado = []
+    while True:
+        response = metodo(**kwargs)
+        siguiente = response.get("LastEvaluatedKey")
+        resultado.append((response["Items"], response["Count"], response["ScannedCount"], siguiente))
+        if not siguiente:
+            return resultado
+        kwargs["ExclusiveStartKey"] = siguiente
+
+
+# 📌 Query y Scan con Limit y ExclusiveStartKey
+
+@pytest.mark.parametrize("ascendente", [True, False])
+def test_query_paginada_de_la_tabla(recursos, ascendente):
+    memoria, moto = en_ambos(recursos, lambda recurso: paginas(
+        recurso.Table("Comentarios").query, KeyConditionExpression="anuncio_id = :a",
+        ExpressionAttributeValues={":a": "a1"}, ScanIndexForward=ascendente, Limit=3))
+    assert memoria == moto
+    assert len(memoria) == 4
+
+
+@pytest.mark.parametrize("ascendente", [True, False])
+def test_query_paginada_de_un_indice(recursos, ascendente):
+    memoria, moto = en_ambos(recursos, lambda recurso: paginas(
+        recurso.Table("Comentarios").query, IndexName="PorUsuario",
+        KeyConditionExpression="usuario = :u AND fecha >= :desde",
+        ExpressionAttributeValues={":u": "luis", ":desde": "2024-01-01T00:00:04"},
+        ScanIndexForward=ascendente, Limit=4))
+    assert memoria == moto
+    assert [pagina[1] for pagina in memoria] == [4, 4, 1]
+    # PorUsuario solo proyecta el mensaje, además de las claves
+    assert set(memoria[0][0][0]) == {"usuario", "fecha", "anuncio_id", "comentario_id", "mensaje"}
+    fechas = [item["fecha"] for items, *_ in memoria for item in items]
+    assert fechas == sorted(fechas, reverse=not ascendente)
+    # LastEvaluatedKey de un índice: sus claves y las de la tabla
+    assert set(memoria[0][3]) == {"usuario", "fecha", "anuncio_id", "comentario_id"}
+
+
+@pytest.mark.parametrize("tabla", ["Anuncios", "Comentarios"])
+def test_scan_paginado_sin_repetidos(recursos, tabla):
+    memoria, moto = en_ambos(recursos, lambda recurso: paginas(recurso.Table(tabla).scan, Limit=7))
+    claves = TABLES[tabla]["KeySchema"]
+
+    def ids(resultado):
+        return [tuple(item[clave["AttributeName"]] for clave in claves) for items, *_ in resultado for item in items]
+
+    # El orden del scan depende del hash de cada almacén: se comparan los items y las páginas
+    assert len(ids(memoria)) == len(set(ids(memoria)))
+    assert sorted(ids(memoria)) == sorted(ids(moto))
+    assert [pagina[1] for pagina in memoria] == [pagina[1] for pagina in moto]
+
+
+# 📌 FilterExpression frente a Limit
+
+def test_filtro_se_aplica_despues_de_limit(recursos):
+    memoria, moto = en_ambos(recursos, lambda recurso: paginas(
+        recurso.Table("Comentarios").query, KeyConditionExpression="anuncio_id = :a",
+        FilterExpression="puntos > :p", ExpressionAttributeValues={":a": "a0", ":p": 20}, Limit=4))
+    assert memoria == moto
+    # Limit cuenta los items leídos, no los que pasan el filtro: hay páginas vacías con cursor
+    assert memoria[0][1:3] == (0, 4) and memoria[0][3] is not None
+    assert sum(pagina[1] for pagina in memoria) == 3
+
+
+def test_select_count_con_filtro(recursos):
+    memoria, moto = en_ambos(recursos, lambda recurso: recurso.Table("Comentarios").query(
+        KeyConditionExpression="anuncio_id = :a", FilterExpression="usuario = :u",
+        ExpressionAttributeValues={":a": "a2", ":u": "eva"}, Select="COUNT"))
+    for resultado in (memoria, moto):
+        resultado.pop("ResponseMetadata", None)
+    assert memoria == moto
+
+
+# 📌 Escrituras condicionales y transacciones
+
+def transaccion(recurso, condicion, anuncio_id):
+    recurso.meta.client.transact_write_items(TransactItems=[
+        {"Put": {
+            "TableName": "Comentarios",
+            "Item": {"anuncio_id": anuncio_id, "comentario_id": "nuevo", "mensaje": "hola"},
+            "ConditionExpression": "attribute_not_exists(comentario_id)",
+        }},
+        {"Update": {
+            "TableName": "Anuncios",
+            "Key": {"id": anuncio_id},
+            "UpdateExpression": "ADD num_comentarios :uno, version :uno",
+            "ConditionExpression": condicion,
+            "ExpressionAttributeValues": {":uno": 1},
+        }},
+    ])
+    return recurso.Table("Anuncios").get_item(Key={"id": anuncio_id}, ConsistentRead=True)["Item"]
+
+
+def test_transaccion_con_condiciones_cumplidas(recursos):
+    memoria, moto = en_ambos(recursos, lambda recurso: transaccion(
+        recurso, "attribute_exists(id) AND attribute_not_exists(num_comentarios)", "a05"))
+    assert memoria == moto
+    assert memoria["num_comentarios"] == 1 and memoria["version"] == 2
+
+
+def test_transaccion_cancelada_no_escribe_nada(recursos):
+    memoria, moto = en_ambos(recursos, lambda recurso: transaccion(
+        recurso, "attribute_exists(num_comentarios)", "a06"))
+    assert memoria == moto == ("TransactionCanceledException", ["None", "ConditionalCheckFailed"])
+
+    memoria, moto = en_ambos(recursos, lambda recurso: recurso.Table("Comentarios").get_item(
+        Key={"anuncio_id": "a06", "comentario_id": "nuevo"}, ConsistentRead=True).get("Item"))
+    assert memoria is None and moto is None
+
+
+def test_put_condicional(recursos):
+    memoria, moto = en_ambos(recursos, lambda recurso: recurso.Table("Anuncios").put_item(
+        Item={"id": "a07", "titulo": "Otro"}, ConditionExpression="attribute_not_exists(id)"))
+    assert memoria == moto == ("ConditionalCheckFailedException", [])
@@ -0,0 +1,171 @@
+"""
+Pruebas de deploy.py sin AWS: el planificador run_steps y el alta y la actualización de
+funciones Lambda con las respuestas de botocore simuladas por Stubber.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+
+import pytest
+from botocore.stub import Stubber, ANY
+
+# Credenciales ficticias: Stubber responde antes de firmar, pero boto3 las busca al crear clientes
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import deploy
+
+ACCOUNT_ID = "123456789012"
+ROLE_ARN = f"arn:aws:iam::{ACCOUNT_ID}:role/{deploy.IAM_ROLE_NAME}"
+CODE = {"lambda_function.py": "def lambda_handler(event, context):\n    return {}\n"}
+PROFILE = dict(deploy.DEFAULT_PROFILE, environment={"CURSOR_SECRET": "secreto"})
+
+
+@pytest.fixture
+def lambda_stub():
+    with Stubber(deploy.lambda_client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def configuracion_desplegada(**cambios):
+    """Respuesta de GetFunctionConfiguration de una función igual al perfil y al código."""
+    configuracion = {
+        "FunctionName": "prueba",
+        "CodeSha256": deploy.code_sha256(deploy.build_zip(CODE)),
+        "Architectures": [PROFILE["architecture"]],
+        "Timeout": PROFILE["timeout"],
+        "MemorySize": PROFILE["memory"],
+        "EphemeralStorage": {"Size": PROFILE["ephemeral_storage"]},
+        "Environment": {"Variables": PROFILE["environment"]},
+    }
+    configuracion.update(cambios)
+    return configuracion
+
+
+def politica_con_permiso():
+    return {"Policy": '{"Statement": [{"Sid": "%s"}]}' % deploy.INVOKE_STATEMENT_ID}
+
+
+# 📌 run_steps
+
+def test_run_steps_pasa_los_resultados_de_las_dependencias():
+    steps = {
+        "tabla": ((), lambda results: "t"),
+        "rol": ((), lambda results: "r"),
+        "funcion": (("tabla", "rol"), lambda results: results["tabla"] + results["rol"]),
+    }
+    assert deploy.run_steps(steps) == {"tabla": "t", "rol": "r", "funcion": "tr"}
+
+
+def test_run_steps_omite_los_dependientes_de_un_paso_fallido():
+    ejecutados = []
+    lock = threading.Lock()
+
+    def paso(nombre, resultado):
+        def funcion(results):
+            with lock:
+                ejecutados.append(nombre)
+            if isinstance(resultado, Exception):
+                raise resultado
+            return resultado
+        return funcion
+
+    steps = {
+        "rol": ((), paso("rol", True)),
+        "tabla": ((), paso("tabla", False)),
+        "api": ((), paso("api", RuntimeError("sin permisos"))),
+        "funcion": (("rol",), paso("funcion", True)),
+        "indice": (("tabla",), paso("indice", True)),
+        "metodo": (("api", "funcion"), paso("metodo", True)),
+        # después_de solo espera a que terminen, aunque fallen
+        "despliegue": (("rol",), paso("despliegue", True), ("tabla", "api", "metodo")),
+    }
+    results = deploy.run_steps(steps)
+
+    assert results["funcion"] is True and results["despliegue"] is True
+    assert results["tabla"] is False
+    assert results["api"] is None
+    assert results["indice"] is None and results["metodo"] is None
+    assert "indice" not in ejecutados and "metodo" not in ejecutados
+    assert ejecutados[-1] == "despliegue"
+
+
+def test_run_steps_rechaza_dependencias_desconocidas():
+    with pytest.raises(ValueError):
+        deploy.run_steps({"funcion": (("rol",), lambda results: True)})
+
+
+# 📌 create_lambda_function con Stubber
+
+def test_create_lambda_function_crea_la_funcion_nueva(lambda_stub):
+    lambda_stub.add_client_error("get_function_configuration", "ResourceNotFoundException",
+                                 expected_params={"FunctionName": "prueba"})
+    lambda_stub.add_response("create_function", {"FunctionName": "prueba"}, {
+        "FunctionName": "prueba",
+        "Runtime": deploy.LAMBDA_RUNTIME,
+        "Role": ROLE_ARN,
+        "Handler": "lambda_function.lambda_handler",
+        "Code": {"ZipFile": deploy.build_zip(CODE)},
+        "Architectures": [PROFILE["architecture"]],
+        "Timeout": PROFILE["timeout"],
+        "MemorySize": PROFILE["memory"],
+        "EphemeralStorage": {"Size": PROFILE["ephemeral_storage"]},
+        "Environment": {"Variables": {"CURSOR_SECRET": "secreto"}},
+    })
+    lambda_stub.add_response("get_function", {"Configuration": {"State": "Active"}}, {"FunctionName": "prueba"})
+    lambda_stub.add_response("add_permission", {"Statement": "{}"}, {
+        "FunctionName": "prueba",
+        "StatementId": deploy.INVOKE_STATEMENT_ID,
+        "Action": "lambda:InvokeFunction",
+        "Principal": "apigateway.amazonaws.com",
+        "SourceArn": ANY,
+    })
+
+    assert deploy.create_lambda_function("prueba", CODE, ROLE_ARN, ACCOUNT_ID, PROFILE) is True
+
+
+def test_create_lambda_function_sin_cambios_no_actualiza_nada(lambda_stub):
+    lambda_stub.add_response("get_function_configuration", configuracion_desplegada())
+    lambda_stub.add_response("get_function_concurrency", {})
+    lambda_stub.add_client_error("get_alias", "ResourceNotFoundException")
+    lambda_stub.add_response("get_policy", politica_con_permiso())
+
+    # Cualquier update_* no previsto haría fallar a Stubber y la función devolvería False
+    assert deploy.create_lambda_function("prueba", CODE, ROLE_ARN, ACCOUNT_ID, PROFILE) is True
+
+
+def test_create_lambda_function_actualiza_solo_lo_que_cambia(lambda_stub):
+    lambda_stub.add_response("get_function_configuration", configuracion_desplegada(CodeSha256="otro", MemorySize=256))
+    lambda_stub.add_response("update_function_code", {}, {
+        "FunctionName": "prueba", "ZipFile": deploy.build_zip(CODE), "Architectures": [PROFILE["architecture"]]})
+    lambda_stub.add_response("get_function", {"Configuration": {"LastUpdateStatus": "Successful"}})
+    lambda_stub.add_response("get_function", {"Configuration": {"LastUpdateStatus": "Successful"}})
+    lambda_stub.add_response("update_function_configuration", {}, {
+        "FunctionName": "prueba",
+        "Timeout": PROFILE["timeout"],
+        "MemorySize": PROFILE["memory"],
+        "EphemeralStorage": {"Size": PROFILE["ephemeral_storage"]},
+        "Environment": {"Variables": PROFILE["environment"]},
+    })
+    lambda_stub.add_response("get_function", {"Configuration": {"LastUpdateStatus": "Successful"}})
+    lambda_stub.add_response("get_function_concurrency", {})
+    lambda_stub.add_client_error("get_alias", "ResourceNotFoundException")
+    lambda_stub.add_response("get_policy", politica_con_permiso())
+
+    assert deploy.create_lambda_function("prueba", CODE, ROLE_ARN, ACCOUNT_ID, PROFILE) is True
+
+
+def test_create_lambda_function_en_modo_plan_no_escribe(lambda_stub, monkeypatch):
+    monkeypatch.setattr(deploy, "PLAN_ONLY", True)
+    monkeypatch.setattr(deploy, "_changes", [])
+    lambda_stub.add_response("get_function_configuration", configuracion_desplegada(Timeout=3))
+    lambda_stub.add_response("get_function_concurrency", {})
+    lambda_stub.add_client_error("get_alias", "ResourceNotFoundException")
+    lambda_stub.add_response("get_policy", politica_con_permiso())
+
+    assert deploy.create_lambda_function("prueba", CODE, ROLE_ARN, ACCOUNT_ID, PROFILE) is True
+    assert [simbolo for simbolo, *_ in deploy._changes] == ["~"]
@@ -0,0 +1,101 @@
+"""
+Pruebas de la línea de métricas EMF que escribe comun.manejador: los handlers se ejecutan
+contra las tablas en memoria de almacen_local.py y se lee la línea impresa.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import json
+
+import pytest
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "funciones_lambda"))
+
+import comun
+from almacen_local import AlmacenMemoria
+from deploy import TABLES
+
+
+@pytest.fixture
+def almacen(monkeypatch):
+    almacen = AlmacenMemoria()
+    for nombre, definicion in TABLES.items():
+        almacen.crear_tabla(TableName=nombre, **definicion)
+    monkeypatch.setattr(comun, "_almacen", None)
+    monkeypatch.setattr(comun._local, "tablas", {}, raising=False)
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    comun.usar_almacen(almacen)
+    almacen.recurso.Table("Anuncios").put_item(Item={"id": "a1", "titulo": "Bici", "descripcion": "Usada"})
+    return almacen
+
+
+def lineas_emf(salida):
+    return [json.loads(linea) for linea in salida.splitlines() if linea.startswith('{"_aws"')]
+
+
+@comun.manejador
+def ver(event, context):
+    anuncio_id = comun.parametro_ruta(event, "id", "Falta el id")
+    item = comun.tabla("Anuncios").get_item(Key={"id": anuncio_id}, ConsistentRead=True)["Item"]
+    comun.metricas().items = 1
+    return comun.respuesta(200, item)
+
+
+@comun.manejador
+def ver_y_fallar(event, context):
+    comun.tabla("Anuncios").get_item(Key={"id": "a1"}, ConsistentRead=True)
+    comun.metricas().items = 1
+    raise RuntimeError("fallo inesperado")
+
+
+def test_linea_emf_de_una_invocacion_correcta(almacen, capsys):
+    resultado = ver({"pathParameters": {"id": "a1"}}, None)
+    assert resultado["statusCode"] == 200
+
+    emf, = lineas_emf(capsys.readouterr().out)
+    definicion, = emf["_aws"]["CloudWatchMetrics"]
+    assert definicion["Namespace"] == comun.NAMESPACE_METRICAS
+    assert definicion["Dimensions"] == [["funcion"]]
+    nombres = {metrica["Name"] for metrica in definicion["Metrics"]}
+    assert {"Latencia", "ItemsDevueltos", "RCU", "WCU", "Errores", "BytesSerializados"} <= nombres
+    # Cada métrica declarada tiene su valor en la raíz de la línea
+    assert nombres <= set(emf)
+
+    assert emf["funcion"] == __name__
+    assert isinstance(emf["Latencia"], (int, float)) and emf["Latencia"] >= 0
+    assert emf["ItemsDevueltos"] == 1
+    # Un item pequeño leído con consistencia fuerte: 1 RCU
+    assert emf["RCU"] == 1
+    assert emf["WCU"] == 0
+    assert emf["Errores"] == 0
+    assert emf["BytesSerializados"] == len(resultado["body"].encode())
+    assert emf["status"] == 200 and emf["clase_error"] is None
+
+
+def test_linea_emf_de_un_error_500(almacen, capsys):
+    resultado = ver_y_fallar({}, None)
+    assert resultado["statusCode"] == 500
+
+    emf, = lineas_emf(capsys.readouterr().out)
+    assert emf["_aws"]["CloudWatchMetrics"][0]["Namespace"] == comun.NAMESPACE_METRICAS
+    assert emf["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["funcion"]]
+    assert emf["Errores"] == 1
+    # Un error no devuelve items, pero la lectura ya hecha sí consume capacidad
+    assert emf["ItemsDevueltos"] == 0
+    assert emf["RCU"] == 1
+    assert emf["status"] == 500 and emf["clase_error"] == "RuntimeError"
+    assert emf["Latencia"] >= 0
+
+
+def test_linea_emf_de_un_error_http(almacen, capsys):
+    resultado = ver({"pathParameters": {}}, None)
+    assert resultado["statusCode"] == 400
+
+    emf, = lineas_emf(capsys.readouterr().out)
+    # Los errores del cliente no cuentan en Errores
+    assert emf["Errores"] == 0
+    assert emf["RCU"] == 0
+    assert emf["status"] == 400 and emf["clase_error"] == "ErrorHTTP"